@@ -0,0 +1,55 @@
+import asyncio
+from models.command_executor import CommandExecutor
+from models.metrics_sampler import MetricsSampler
+from models.process_table import ProcessTable
+from models.net_monitor import NetworkMonitor
+from models.disk_monitor import DiskMonitor
+from models.alert_system import AlertSystem
+from models.fleet_agent import FleetAgent
+from models.log_watcher import LogWatcher
+from config.config import SAMPLE_INTERVAL
+from utils.logger import logger
+
+def build_agent(sample_interval: float = SAMPLE_INTERVAL, **options) -> tuple:
+    """Crea el muestreo, las alertas locales y el agente; retorna (muestreador, agente)"""
+    sampler = MetricsSampler(sample_interval)
+    process_table = ProcessTable()
+    sampler.add_listener(process_table.update)
+    net_monitor = NetworkMonitor()
+    sampler.add_listener(net_monitor.update)
+    disk_monitor = DiskMonitor()
+    sampler.add_listener(disk_monitor.update)
+    alert_system = AlertSystem(sampler, process_table, net_monitor, disk_monitor)
+    # El agente se registra al final para leer las tasas ya actualizadas en el mismo tick
+    agent = FleetAgent(
+        sampler, process_table, net_monitor, disk_monitor, alert_system, CommandExecutor(), **options
+    )
+    return sampler, agent
+
+async def run_agent():
+    sampler, agent = build_agent()
+    # Las alertas de los logs locales llegan al hub junto con las demás
+    log_watcher = LogWatcher(agent.alert_system.report_log_alert)
+    sampler.start()
+    log_watcher.start()
+    agent.start()
+    try:
+        logger.info(f"Agente {agent.name} iniciado, hub: {agent.hub}")
+        while True:
+            await asyncio.sleep(60)
+    finally:
+        await agent.stop()
+        log_watcher.stop()
+        sampler.stop()
+
+def main():
+    """Agente de la flota: sin Telegram, solo muestreo, alertas locales y comandos pedidos por el hub"""
+    try:
+        asyncio.run(run_agent())
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logger.error(f"Error en el agente: {e}")
+
+if __name__ == '__main__':
+    main()
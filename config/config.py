@@ -8,10 +8,137 @@ load_dotenv()
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 TELEGRAM_GROUP = os.getenv('TELEGRAM_ADMIN')
 ALLOWED_GROUP_ID = os.getenv('ALLOWED_GROUP_ID')
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')  # Otro servidor de la API (p. ej. tools/fake_bot_api.py)
+
+# Configuración del cliente HTTP
+HTTP_VERSION = os.getenv('HTTP_VERSION', '1.1')  # '2' requiere python-telegram-bot[http2]
+HTTP_POOL_SIZE = 8  # Conexiones simultáneas para envíos (la cola de salida envía en paralelo por chat)
+HTTP_CONNECT_TIMEOUT = 5.0  # Segundos para establecer la conexión
+HTTP_READ_TIMEOUT = 10.0  # Segundos de espera de la respuesta
+HTTP_WRITE_TIMEOUT = 30.0  # Segundos para subir la petición (archivos comprimidos incluidos)
+HTTP_POOL_TIMEOUT = 5.0  # Segundos de espera por una conexión libre
+
+# Modo webhook: si WEBHOOK_URL está definida se usa en lugar del polling
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # URL pública, p. ej. https://ejemplo.com/telegram
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')  # Se comprueba en la cabecera de cada actualización
+
+# Métricas internas (/stats) y exportador de Prometheus: /metrics se publica si METRICS_PORT está definido
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # 0 = desactivado
+HANDLER_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # Segundos por comando de Telegram
+COMMAND_DURATION_BUCKETS = (0.1, 0.5, 1, 5, 15, 60, 120, 300)  # Segundos por comando de terminal
+STATS_WINDOW = 1000  # Observaciones recientes por serie para los percentiles de /stats
+LOOP_LAG_INTERVAL = 0.5  # Segundos entre mediciones del retraso del event loop
+LOOP_WATCHDOG_INTERVAL = 0.25  # Segundos entre comprobaciones del watchdog del event loop
+LOOP_BLOCK_THRESHOLD = float(os.getenv('LOOP_BLOCK_THRESHOLD', '1.0'))  # Segundos sin respuesta para volcar la pila
+LOOP_STACK_DEPTH = 15  # Marcos de la pila incluidos en el log y en la alerta
+LOOP_WATCHDOG_ALERT = os.getenv('LOOP_WATCHDOG_ALERT', '0') == '1'  # Enviar los bloqueos como alerta al admin
+
+# Modo flota: un bot central (hub) agrega los agentes de varias máquinas
+# Direcciones con el formato 'host:puerto' o 'unix:/ruta/al/socket'
+FLEET_LISTEN = os.getenv('FLEET_LISTEN')  # Hub: dirección donde esperar agentes; sin definir = desactivado
+FLEET_HUB = os.getenv('FLEET_HUB', '127.0.0.1:9200')  # Agente: dirección del hub
+FLEET_NAME = os.getenv('FLEET_NAME') or os.uname().nodename  # Agente: nombre con el que se identifica
+FLEET_TOKEN = os.getenv('FLEET_TOKEN', '')  # Secreto compartido con el que hub y agente se autentican (nunca viaja)
+FLEET_AGENT_RUN = os.getenv('FLEET_AGENT_RUN', '1') == '1'  # Agente: aceptar comandos del hub (solo con FLEET_TOKEN)
+FLEET_PUSH_INTERVAL = 10  # Segundos entre envíos agrupados de muestras y alertas al hub
+FLEET_KEYFRAME_INTERVAL = 30  # Muestras entre envíos completos; las demás solo llevan los cambios
+FLEET_HOST_TIMEOUT = 60  # Segundos sin datos de un agente para darlo por caído
+FLEET_REQUEST_TIMEOUT = 15  # Segundos de espera por la respuesta de un agente
+FLEET_MAX_FRAME = 1024 * 1024  # Bytes máximos de un mensaje del protocolo
+FLEET_RECONNECT_MAX = 30  # Segundos máximos entre reintentos de conexión del agente
+# Grupos de hosts para /runall, p. ej. 'cocina=pi-1,pi-2;taller=pi-3'
+FLEET_GROUPS = {
+    name.strip(): [host.strip() for host in hosts.split(',') if host.strip()]
+    for name, _, hosts in (group.partition('=') for group in os.getenv('FLEET_GROUPS', '').split(';') if '=' in group)
+}
+FANOUT_CONCURRENCY = 10  # Máquinas ejecutando a la vez un comando de /runall
+FANOUT_TIMEOUT = 60  # Segundos máximos del comando en cada máquina
 
 # Configuración de comandos
 BLACKLIST_COMMANDS = ["htop", "shutdown"]
 MAX_RETRIES = 3
+COMMAND_TIMEOUT = 300  # Segundos máximos de ejecución por comando
+COMMAND_KILL_GRACE = 3  # Segundos entre SIGTERM y SIGKILL al cortar un comando
+EDIT_INTERVAL = 3.0  # Segundos mínimos entre ediciones de un mismo mensaje
+SHELL_SESSIONS = os.getenv('SHELL_SESSIONS', '1') == '1'  # Shell persistente por chat en el modo terminal
+SHELL_PATH = os.getenv('SHELL_PATH', '/bin/bash')  # Shell de las sesiones
+SHELL_MAX_SESSIONS = int(os.getenv('SHELL_MAX_SESSIONS', '4'))  # Sesiones abiertas a la vez
+SHELL_IDLE_TIMEOUT = 1800  # Segundos sin uso tras los que se cierra una sesión
+# Estado por chat y usuario (modo terminal y directorio actual)
+SESSION_MAX_ENTRIES = 256  # Sesiones recordadas; se olvida la usada hace más tiempo
+SESSION_STATE_PATH = os.getenv('SESSION_STATE_PATH')  # Archivo JSON donde guardarlas; sin definir = solo en memoria
+SESSION_SAVE_DELAY = 2  # Segundos en que se agrupan los cambios antes de escribir el archivo
+
+# Configuración de la cola de envío (límites de la API de Telegram)
+SEND_GLOBAL_RATE = 30  # Mensajes por segundo en total
+SEND_CHAT_RATE = 1.0  # Mensajes por segundo a un mismo chat privado
+SEND_GROUP_RATE = 20 / 60  # Mensajes por segundo a un mismo grupo
+SEND_CHAT_BURST = 3  # Mensajes seguidos permitidos a un chat antes de aplicar su límite
+SEND_MAX_RETRIES = 5  # Reintentos ante errores de red
+SEND_BACKOFF_BASE = 1.0  # Segundos de la primera espera tras un error de red
+SEND_BACKOFF_MAX = 30.0  # Segundos máximos de espera entre reintentos
 
 # Configuración del sistema
-MAX_WORKERS = 3
+MAX_WORKERS = 3  # Comandos de terminal ejecutándose en paralelo
+SAMPLE_INTERVAL = 5  # Segundos entre muestras de métricas del sistema
+RESPONSE_CACHE_TTL = 3  # Segundos que se reutiliza la respuesta de /info, /net y /disk
+NET_DEFAULT_SPEED = 100  # Mbps asumidos cuando la interfaz no informa su velocidad (p. ej. WiFi)
+JOB_HISTORY_SIZE = 50  # Trabajos terminados que se conservan para /jobs
+
+# Configuración de la salida de comandos
+OUTPUT_PAGE_SIZE = 3500  # Bytes por página de salida
+OUTPUT_SPILL_SIZE = 64 * 1024  # Bytes en memoria antes de volcar la salida a disco
+OUTPUT_MAX_SIZE = 50 * 1024 * 1024  # Bytes máximos conservados por comando
+OUTPUT_DOCUMENT_THRESHOLD = 20  # Páginas a partir de las cuales se envía un archivo comprimido
+OUTPUT_STORE_SIZE = 20  # Salidas paginadas que se conservan para navegar
+
+# Configuración del historial de métricas: (resolución en segundos, cantidad de puntos)
+HISTORY_TIERS = [
+    (SAMPLE_INTERVAL, 720),  # Última hora a resolución de muestreo
+    (60, 1440),  # Últimas 24 horas por minuto
+    (300, 2016),  # Últimos 7 días cada 5 minutos
+    (3600, 720)  # Últimos 30 días por hora
+]
+
+# Configuración del almacenamiento persistente de métricas
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+METRICS_DB_PATH = os.getenv('METRICS_DB_PATH', os.path.join(BASE_DIR, 'data', 'metrics.db'))
+STORE_FLUSH_INTERVAL = 60  # Segundos entre escrituras en lote (menos escrituras en la SD)
+STORE_RETENTION_DAYS = 30  # Días de historial conservados
+STORE_COMPACT_INTERVAL = 6 * 3600  # Segundos entre compactaciones
+
+# Configuración de alertas
+ALERT_CHECK_INTERVAL = 10  # Segundos entre envíos de alertas pendientes
+# Reglas por recurso: (umbral de disparo %, umbral de recuperación %, segundos sostenidos)
+ALERT_RULES = {
+    'cpu': (80.0, 70.0, 120),
+    'memory': (80.0, 75.0, 60),
+    'disk': (80.0, 78.0, 0),
+    'network': (80.0, 70.0, 60),  # Porcentaje de uso del enlace más cargado
+    'disk_io': (90.0, 80.0, 120)  # Porcentaje de ocupación del dispositivo más cargado
+}
+TARGET_COOLDOWN = 300  # Segundos entre alertas de un mismo proceso, servicio o partición
+UNIT_CHECK_INTERVAL = 30  # Segundos entre consultas a systemd
+PARTITION_REFRESH_INTERVAL = 60  # Segundos entre búsquedas de nuevos puntos de montaje
+IGNORED_FSTYPES = ('squashfs', 'tmpfs', 'devtmpfs', 'overlay')
+DISK_INODE_THRESHOLD = 90  # Porcentaje de inodos usados que dispara la alerta de una partición
+DISK_PROBE_TIMEOUT = 2  # Segundos de espera antes de dar por colgado un punto de montaje
+
+# Vigilancia de logs: 'origen=reglas;...' con origen una ruta o 'journal' (journalctl -f)
+# Reglas: ssh (logins fallidos), oom (procesos terminados por falta de memoria),
+# io (errores de E/S y de sistemas de archivos) y errors (errores del log del bot)
+LOG_WATCH = {
+    source.strip(): [name.strip() for name in rules.split(',') if name.strip()]
+    for source, _, rules in (
+        entry.rpartition('=') for entry in os.getenv('LOG_WATCH', '/var/log/auth.log=ssh;journal=oom,io').split(';')
+        if '=' in entry
+    )
+}
+LOG_POLL_INTERVAL = 1.0  # Segundos entre lecturas de los archivos vigilados
+LOG_READ_LIMIT = 1024 * 1024  # Bytes máximos leídos por origen en cada vuelta; con más atraso se salta lo antiguo
+LOG_MAX_LINE = 4096  # Bytes máximos conservados de una línea sin terminar
+LOG_ALERT_WINDOW = 300  # Segundos en que se agrupan las repeticiones de una misma coincidencia
+LOG_RULE_BURST = 5  # Alertas por regla y ventana; las demás coincidencias se resumen en un aviso
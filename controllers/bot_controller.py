@@ -1,29 +1,183 @@
 from telegram import Update, error as telegram_error, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CallbackQueryHandler
+from models.chat_sessions import SessionRegistry
 from models.command_executor import CommandExecutor
-from models.system_info import SystemInfo
-from models.alert_system import AlertSystem
+from models.shell_session import ShellSessionManager
+from models.response_cache import ResponseCache
+from models.send_queue import SendQueue, PRIORITY_SECURITY, PRIORITY_ALERT
+from models.loop_monitor import LoopLagMonitor, LoopWatchdog
+from models.job_scheduler import JobScheduler
+from models.output_buffer import OutputBuffer, OutputStore
 from utils.logger import logger
-from config.config import TELEGRAM_GROUP
+from utils.metrics import REGISTRY, run_blocking
+from config.config import (
+    TELEGRAM_GROUP, EDIT_INTERVAL, OUTPUT_DOCUMENT_THRESHOLD, ALERT_CHECK_INTERVAL, RESPONSE_CACHE_TTL,
+    HANDLER_LATENCY_BUCKETS, STATS_WINDOW, FLEET_GROUPS, SHELL_SESSIONS
+)
 from functools import wraps
-import psutil
 import os
 from datetime import datetime
-import socket
-import platform
 import asyncio
+import itertools
+import math
+import re
+import time
+
+HANDLER_LATENCY = REGISTRY.histogram(
+    'bot_handler_duration_seconds', 'Tiempo de respuesta de los comandos y botones de Telegram', ('handler',),
+    buckets=HANDLER_LATENCY_BUCKETS, window=STATS_WINDOW
+)
+# Dónde se va el tiempo dentro de validate_access
+HANDLER_PHASE = REGISTRY.histogram(
+    'bot_handler_phase_seconds', 'Duración de cada fase de un comando', ('phase',), window=STATS_WINDOW
+)
+ALERT_CHECK_DURATION = REGISTRY.histogram(
+    'bot_alert_check_duration_seconds', 'Duración de cada vuelta del bucle de alertas', window=STATS_WINDOW
+)
+HANDLER_ERRORS = REGISTRY.counter('bot_handler_errors_total', 'Comandos que terminaron con error', ('handler',))
+
+# Nombre de esta máquina como destino de /runall
+LOCAL_TARGET = 'local'
+
+def observe_latency(func):
+    """Registra en HANDLER_LATENCY la duración de cada llamada al handler"""
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        with HANDLER_LATENCY.time(handler=func.__name__):
+            return await func(*args, **kwargs)
+    return wrapper
 
 class BotController:
     def __init__(self):
-        self.command_executor = CommandExecutor()
-        self.system_info = SystemInfo()
-        self.alert_system = AlertSystem()
-        self.modo_terminal = False
+        # Modo terminal y directorio actual por chat y usuario
+        self.sessions = SessionRegistry()
+        # Cada sesión en modo terminal usa su propia shell persistente
+        self.command_executor = CommandExecutor(ShellSessionManager() if SHELL_SESSIONS else None)
+        self.job_scheduler = JobScheduler(self.command_executor)
+        self.output_store = OutputStore()
+        # /runall en curso: identificador → (chat, tarea que recoge los resultados)
+        self._fanout_ids = itertools.count(1)
+        self._fanouts = {}
+        # El monitoreo (psutil, historial y alertas) se crea en start_monitoring, una vez
+        # que el bot ya recibe actualizaciones; los comandos que lo usan esperan a monitoring_ready
+        self.metrics_sampler = None
+        self.metrics_history = None
+        self.metrics_store = None
+        self.process_table = None
+        self.net_monitor = None
+        self.disk_monitor = None
+        self.system_info = None
+        self.alert_system = None
+        self.log_watcher = None
+        self.monitoring_ready = asyncio.Event()
+        self.monitoring_error = None  # Motivo si el monitoreo no pudo iniciarse
+        # Las respuestas de /info, /net y /disk se invalidan con cada nueva muestra
+        self.response_cache = ResponseCache(
+            RESPONSE_CACHE_TTL,
+            lambda: getattr(self.metrics_sampler.get_snapshot(), 'timestamp', None)
+        )
+        self.send_queue = SendQueue()
+        self.loop_monitor = LoopLagMonitor()
+        self.loop_watchdog = LoopWatchdog(on_block=self._on_loop_block)
+        # Hub de la flota: solo existe si FLEET_LISTEN está definido (ver main.py)
+        self.fleet = None
         self.max_retries = 3
         self.welcome_sent = False
         self._bot = None
         self._alert_check_task = None
-        
+
+    async def start_monitoring(self):
+        """Restaura las sesiones, crea los subsistemas de monitoreo fuera del event loop y habilita los comandos"""
+        # Las sesiones del modo terminal no dependen del monitoreo: se restauran aunque este falle
+        try:
+            await self.sessions.restore()
+        except Exception as e:
+            logger.error(f"Error restaurando las sesiones: {e}")
+        try:
+            await run_blocking('init_monitoring', self._init_monitoring)
+        except Exception as e:
+            # Los comandos de terminal siguen funcionando; los de monitoreo informan el error
+            logger.error(f"Error iniciando el monitoreo: {e}")
+            self.monitoring_error = str(e) or type(e).__name__
+        finally:
+            self.monitoring_ready.set()
+
+    def _init_monitoring(self):
+        """Importa y construye el monitoreo, recupera el historial e inicia el muestreo (bloqueante)"""
+        from models.metrics_sampler import MetricsSampler
+        from models.metrics_history import MetricsHistory
+        from models.metrics_store import MetricsStore
+        from models.process_table import ProcessTable
+        from models.net_monitor import NetworkMonitor
+        from models.disk_monitor import DiskMonitor
+        from models.system_info import SystemInfo
+        from models.alert_system import AlertSystem
+        from models.metrics_exporter import register_system_metrics
+        from models.log_watcher import LogWatcher
+
+        self.metrics_sampler = MetricsSampler()
+        self.metrics_history = MetricsHistory()
+        self.metrics_store = MetricsStore()
+        self.metrics_sampler.add_listener(self._record_snapshot)
+        # La tabla de procesos se actualiza antes de que AlertSystem evalúe el tick
+        self.process_table = ProcessTable()
+        self.metrics_sampler.add_listener(self.process_table.update)
+        self.net_monitor = NetworkMonitor()
+        self.metrics_sampler.add_listener(self.net_monitor.update)
+        self.disk_monitor = DiskMonitor()
+        self.metrics_sampler.add_listener(self.disk_monitor.update)
+        self.system_info = SystemInfo(self.metrics_sampler)
+        self.alert_system = AlertSystem(
+            self.metrics_sampler, self.process_table, self.net_monitor, self.disk_monitor
+        )
+        register_system_metrics(self.metrics_sampler, self.net_monitor, self.disk_monitor)
+        self.log_watcher = LogWatcher(self.alert_system.report_log_alert)
+        self.restore_state()
+        self.metrics_sampler.start()
+        self.log_watcher.start()
+
+    def stop_monitoring(self):
+        if self.metrics_sampler is not None:
+            self.metrics_sampler.stop()
+        if self.log_watcher is not None:
+            self.log_watcher.stop()
+        if self.metrics_store is not None:
+            self.metrics_store.close()
+
+    def _on_loop_block(self, duration, stack):
+        """Callback del watchdog (en su hilo): la alerta sale en la próxima vuelta del bucle de alertas"""
+        if self.alert_system is not None:
+            self.alert_system.report_blocked_loop(duration, stack)
+
+    def _on_fleet_alerts(self, host, alerts):
+        """Callback del hub: las alertas de un agente salen en la próxima vuelta del bucle de alertas"""
+        if self.alert_system is not None:
+            self.alert_system.report_remote_alerts(host, alerts)
+
+    def _on_fleet_host_state(self, host, online, last_seen):
+        if self.alert_system is not None:
+            self.alert_system.report_host_state(host, online, last_seen)
+
+    def _fleet_host(self, args):
+        """Nombre del host de la flota indicado como primer argumento (None si no es un host conocido)"""
+        if self.fleet is not None and args and self.fleet.get_host(args[0]) is not None:
+            return args[0]
+        return None
+
+    def restore_state(self):
+        """Abre el almacén persistente y recupera historial y enfriamientos de alertas (bloqueante)"""
+        try:
+            self.metrics_store.open()
+            self.metrics_history.load(self.metrics_store, time.time())
+            self.alert_system.restore_last_alerts(self.metrics_store.last_alert_times())
+        except Exception as e:
+            logger.error(f"Error restaurando el historial de métricas: {e}")
+
+    def _record_snapshot(self, snapshot):
+        """Listener del muestreador: agrega la muestra al historial y al almacén"""
+        values = self.metrics_history.add_snapshot(snapshot)
+        self.metrics_store.add_sample(snapshot.timestamp, values)
+
     async def send_welcome_message(self, bot):
         """Envía mensaje de bienvenida al iniciar el bot"""
         if not self.welcome_sent:
@@ -32,78 +186,89 @@ class BotController:
                 "El bot está listo para recibir comandos.\n\n"
                 "📌 *Comandos de Terminal:*\n"
                 "/run - 🖥️ Activar modo terminal\n"
-                "/exit - ⛔ Desactivar modo terminal\n\n"
+                "/exit - ⛔ Desactivar modo terminal\n"
+                "/kill - 🛑 Cancelar comando en ejecución\n"
+                "/jobs - 📋 Trabajos en cola y en ejecución\n\n"
                 "📊 *Comandos de Monitoreo:*\n"
                 "/info - 📋 Información del sistema\n"
                 "/ps - 📈 Lista de procesos activos\n"
                 "/net - 🌐 Estado de la red\n"
-                "/disk - 💾 Uso detallado del disco\n\n"
+                "/disk - 💾 Uso detallado del disco\n"
+                "/graph - 📉 Tendencia de una métrica\n\n"
             )
             try:
                 if TELEGRAM_GROUP:
-                    await bot.send_message(chat_id=TELEGRAM_GROUP, text=welcome_text, parse_mode='Markdown')
+                    await self.send_queue.send_message(bot, TELEGRAM_GROUP, welcome_text, parse_mode='Markdown')
                     self.welcome_sent = True
                     logger.info("Mensaje de bienvenida enviado")
             except Exception as e:
                 logger.error(f"Error al enviar mensaje de bienvenida: {e}")
 
-    async def send_message_with_retry(self, message, text, parse_mode=None):
-        """Envía un mensaje con reintentos en caso de timeout"""
-        for attempt in range(self.max_retries):
-            try:
-                return await message.reply_text(text, parse_mode=parse_mode)
-            except telegram_error.TimedOut:
-                if attempt == self.max_retries - 1:
-                    raise
-                await asyncio.sleep(1)
+    async def send_message_with_retry(self, message, text, parse_mode=None, reply_markup=None):
+        """Responde a un mensaje a través de la cola de envío (límites, RetryAfter y reintentos)"""
+        return await self.send_queue.reply(message, text, parse_mode=parse_mode, reply_markup=reply_markup)
 
-    async def edit_message_with_retry(self, message, text, parse_mode=None):
-        """Edita un mensaje con reintentos en caso de timeout"""
-        for attempt in range(self.max_retries):
-            try:
-                return await message.edit_text(text, parse_mode=parse_mode)
-            except telegram_error.TimedOut:
-                if attempt == self.max_retries - 1:
-                    raise
-                await asyncio.sleep(1)
-            except telegram_error.BadRequest:
-                return await self.send_message_with_retry(message.chat, text, parse_mode)
+    async def edit_message_with_retry(self, message, text, parse_mode=None, reply_markup=None):
+        """Edita un mensaje a través de la cola de envío; si ya no se puede editar, envía uno nuevo"""
+        try:
+            return await self.send_queue.edit(message, text, parse_mode=parse_mode, reply_markup=reply_markup)
+        except telegram_error.BadRequest as e:
+            if 'not modified' in str(e).lower():
+                return message
+            return await self.send_queue.send_message(
+                message.get_bot(), message.chat_id, text, parse_mode=parse_mode, reply_markup=reply_markup
+            )
+
+    async def delete_message_with_retry(self, message):
+        """Borra un mensaje a través de la cola de envío"""
+        return await self.send_queue.call(message.chat_id, message.delete, method='deleteMessage')
+
+    async def answer_callback(self, query, text=None):
+        """Responde a la pulsación de un botón a través de la cola de envío"""
+        return await self.send_queue.call(
+            query.message.chat_id, lambda: query.answer(text), method='answerCallbackQuery'
+        )
 
     def validate_access(func):
         @wraps(func)
         async def wrapper(self, update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
             user_id = str(update.effective_user.id)
             username = update.effective_user.username or "Sin username"
-            
+
             if not TELEGRAM_GROUP or user_id != TELEGRAM_GROUP:
                 logger.warning(f"Acceso denegado - Usuario: {username} (ID: {user_id})")
-                # Generar alerta de seguridad
-                alert = self.alert_system.check_unauthorized_access(user_id, username)
-                if alert:
-                    await self._send_alert(context.bot, alert)
                 await self.send_message_with_retry(update.message, "Acceso denegado")
+                # Generar alerta de seguridad (el sistema de alertas se inicia después del polling)
+                await self.monitoring_ready.wait()
+                if self.alert_system is not None:
+                    alert = self.alert_system.check_unauthorized_access(user_id, username)
+                    if alert:
+                        await self._send_alert(context.bot, alert)
                 return
             
             logger.info(f"Comando ejecutado por admin {username} (ID: {user_id})")
             
             # Mostrar mensaje de espera con reintentos
             try:
-                wait_message = await self.send_message_with_retry(
-                    update.message,
-                    "⏳ *Procesando su solicitud...*",
-                    parse_mode='Markdown'
-                )
+                with HANDLER_PHASE.time(phase='wait_message'):
+                    wait_message = await self.send_message_with_retry(
+                        update.message,
+                        "⏳ *Procesando su solicitud...*",
+                        parse_mode='Markdown'
+                    )
                 
                 try:
-                    result = await func(self, update, context, *args, **kwargs)
-                    await wait_message.delete()
+                    with HANDLER_PHASE.time(phase='handler'):
+                        result = await func(self, update, context, *args, **kwargs)
+                    with HANDLER_PHASE.time(phase='delete_wait_message'):
+                        await self.delete_message_with_retry(wait_message)
                     return result
                 except telegram_error.TimedOut:
                     # Reintento del comando
                     for attempt in range(self.max_retries - 1):
                         try:
                             result = await func(self, update, context, *args, **kwargs)
-                            await wait_message.delete()
+                            await self.delete_message_with_retry(wait_message)
                             return result
                         except telegram_error.TimedOut:
                             continue
@@ -113,6 +278,7 @@ class BotController:
                     )
                 except Exception as e:
                     logger.error(f"Error en comando: {str(e)}")
+                    HANDLER_ERRORS.inc(handler=func.__name__)
                     await self.edit_message_with_retry(
                         wait_message,
                         f"❌ Error: {str(e)}"
@@ -123,75 +289,218 @@ class BotController:
                     update.message,
                     "❌ Error de conexión. Intenta nuevamente."
                 )
+        return observe_latency(wrapper)
+
+    def requires_monitoring(func):
+        """Espera a que el monitoreo esté listo; si no pudo iniciarse responde con el motivo"""
+        @wraps(func)
+        async def wrapper(self, update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
+            with HANDLER_PHASE.time(phase='monitoring_wait'):
+                await self.monitoring_ready.wait()
+            if self.monitoring_error:
+                await self.send_message_with_retry(update.message, self._monitoring_error_text())
+                return
+            return await func(self, update, context, *args, **kwargs)
         return wrapper
 
+    def _monitoring_error_text(self):
+        return f"❌ El monitoreo no está disponible: {self.monitoring_error}"
+
     @validate_access
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         help_text = (
             "🤖 *Bot - Comandos Disponibles*\n\n"
             "\n📌 *Comandos de Terminal:*\n"
             "/run - 🖥️ Activar modo terminal\n"
-            "/exit - ⛔ Desactivar modo terminal\n\n"
+            "/exit - ⛔ Desactivar modo terminal\n"
+            "/kill - 🛑 Cancelar comando en ejecución\n"
+            "/jobs - 📋 Trabajos en cola y en ejecución\n"
+            "/runall - 🛰️ Ejecutar un comando en varias máquinas\n\n"
             "📊 *Comandos de Monitoreo:*\n"
             "/info - 📋 Información del sistema\n"
             "/ps - 📈 Lista de procesos activos\n"
             "/net - 🌐 Estado de la red\n"
-            "/disk - 💾 Uso detallado del disco\n\n"
+            "/disk - 💾 Uso detallado del disco\n"
+            "/graph - 📉 Tendencia de una métrica\n"
+            "/stats - ⏱️ Tiempos internos del bot\n"
+            "/hosts - 🖧 Máquinas de la flota (`/info <host>`, `/ps <host>`)\n\n"
             "⚙️ *Configuración de Alertas:*\n"
             "/alerts - 🔔 Gestionar alertas del sistema"
         )
-        await update.message.reply_text(help_text, parse_mode='Markdown')
+        await self.send_message_with_retry(update.message, help_text, parse_mode='Markdown')
+
+    def _session(self, update: Update):
+        """Sesión del usuario en el chat de la actualización"""
+        return self.sessions.get(update.effective_chat.id, update.effective_user.id)
 
     @validate_access
     async def run_commands(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        self.modo_terminal = True
-        await update.message.reply_text(
+        self._session(update).terminal = True
+        self.sessions.changed()
+        await self.send_message_with_retry(
+            update.message,
             "🖥️ *Modo Terminal Activado*\n"
             "Puedes ejecutar comandos directamente.\n"
+            "La shell conserva el directorio y las variables entre comandos.\n"
             "Usa /exit para salir.",
             parse_mode='Markdown'
         )
 
     @validate_access
     async def exit_commands(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        self.modo_terminal = False
-        await update.message.reply_text(
+        session = self._session(update)
+        session.terminal = False
+        await self.command_executor.close_session(session)
+        self.sessions.changed()
+        await self.send_message_with_retry(
+            update.message,
             "🚫 *Modo Terminal Desactivado*",
             parse_mode='Markdown'
         )
 
     @validate_access
+    @requires_monitoring
     async def info_system(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        host = self._fleet_host(context.args)
+        if host:
+            await self.send_message_with_retry(update.message, self._render_remote_info(host), parse_mode='Markdown')
+            return
         try:
-            uname = platform.uname()
-            boot_time = datetime.fromtimestamp(psutil.boot_time())
-            info = self.system_info.get_system_info()
-            
-            if info:
-                message = (
-                    "🖥️ *Información Detallada del Sistema*\n\n"
-                    f"*Sistema:* `{uname.system} {uname.release}`\n"
-                    f"*Hostname:* `{uname.node}`\n"
-                    f"*Arquitectura:* `{uname.machine}`\n"
-                    f"*CPU:* `{psutil.cpu_count()} cores ({info['cpu_usage']} uso)`\n"
-                    f"*RAM Total:* `{info['memory_total']}`\n"
-                    f"*RAM Usada:* `{info['memory_used']}` ({info['memory_percent']})\n"
-                    f"*Disco Total:* `{info['disk_total']}`\n"
-                    f"*Disco Usado:* `{info['disk_used']}` ({info['disk_percent']})\n"
-                    f"*Tiempo Activo:* `{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}`\n"
-                    f"*Inicio Sistema:* `{boot_time.strftime('%Y-%m-%d %H:%M:%S')}`\n"
-                    f"*Dir Actual:* `{info['current_dir']}`"
+            message = await self.response_cache.get(('info',), self._render_info)
+            # Los contadores se añaden fuera de la caché para que estén al día
+            cache = self.response_cache.stats()
+            message += f"\n*Caché:* `{cache['hits']} aciertos · {cache['misses']} fallos · {cache['coalesced']} agrupadas`"
+            message += f"\n*Dir Actual:* `{self._session(update).cwd}`"
+            await self.send_message_with_retry(update.message, message, parse_mode='Markdown')
+        except Exception as e:
+            await self.send_message_with_retry(update.message, f"❌ Error: {str(e)}")
+
+    async def _render_info(self) -> str:
+        import platform
+        import psutil
+        uname = platform.uname()
+        boot_time = datetime.fromtimestamp(psutil.boot_time())
+        info = self.system_info.get_system_info()
+
+        if not info:
+            return "❌ Error obteniendo información del sistema"
+
+        return (
+            "🖥️ *Información Detallada del Sistema*\n\n"
+            f"*Sistema:* `{uname.system} {uname.release}`\n"
+            f"*Hostname:* `{uname.node}`\n"
+            f"*Arquitectura:* `{uname.machine}`\n"
+            f"*CPU:* `{info['cpu_count']} cores ({info['cpu_usage']} uso)`\n"
+            f"*RAM Total:* `{info['memory_total']}`\n"
+            f"*RAM Usada:* `{info['memory_used']}` ({info['memory_percent']})\n"
+            f"*Disco Total:* `{info['disk_total']}`\n"
+            f"*Disco Usado:* `{info['disk_used']}` ({info['disk_percent']})\n"
+            f"*Promedio 24h:* `CPU {self._history_average('cpu', 86400)}` · `RAM {self._history_average('memory', 86400)}`\n"
+            f"*Tiempo Activo:* `{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}`\n"
+            f"*Inicio Sistema:* `{boot_time.strftime('%Y-%m-%d %H:%M:%S')}`"
+        )
+
+    def _render_remote_info(self, name) -> str:
+        """Información de un agente a partir de la última muestra recibida, sin consultarlo"""
+        host = self.fleet.get_host(name)
+        values = host.values
+        if not values:
+            return f"⏳ `{name}` aún no envió muestras"
+
+        info = host.info
+        state = "🟢 Conectado" if host.connected else "🔴 Sin conexión"
+        boot_time = datetime.fromtimestamp(info['boot_time']).strftime('%Y-%m-%d %H:%M:%S') if info.get('boot_time') else '-'
+        return (
+            f"🖥️ *Información de* `{name}` ({state})\n\n"
+            f"*Sistema:* `{info.get('system', '-')}`\n"
+            f"*Hostname:* `{info.get('hostname', '-')}`\n"
+            f"*Arquitectura:* `{info.get('machine', '-')}`\n"
+            f"*CPU:* `{values['cores']} cores ({values['cpu']}% uso)` · carga `{values['load']}`\n"
+            f"*RAM Total:* `{values['mem_total'] / (1024**3):.2f}GB`\n"
+            f"*RAM Usada:* `{values['mem_used'] / (1024**3):.2f}GB` ({values['mem']}%)\n"
+            f"*Disco Total:* `{values['disk_total'] / (1024**3):.2f}GB`\n"
+            f"*Disco Usado:* `{values['disk_used'] / (1024**3):.2f}GB` ({values['disk']}%)\n"
+            f"*Red:* `{values['net']}%` del enlace · *E/S:* `{values['io']}%` · *Procesos:* `{values['procs']}`\n"
+            f"*Inicio Sistema:* `{boot_time}`\n"
+            f"*Última muestra:* `{datetime.fromtimestamp(values['ts']).strftime('%Y-%m-%d %H:%M:%S')}`"
+        )
+
+    @validate_access
+    async def hosts_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Resumen de los agentes de la flota"""
+        if self.fleet is None:
+            await self.send_message_with_retry(
+                update.message, "❌ El modo flota no está activo (define `FLEET_LISTEN`)", parse_mode='Markdown'
+            )
+            return
+        hosts = self.fleet.list_hosts()
+        if not hosts:
+            await self.send_message_with_retry(update.message, "🖧 Aún no se conectó ningún agente")
+            return
+
+        now = time.time()
+        online = sum(1 for host in hosts if host.connected)
+        message = f"🖧 *Flota:* {online}/{len(hosts)} conectados\n\n"
+        for host in hosts:
+            state = "🟢" if host.connected else "🔴"
+            values = host.values
+            seen = f"hace {now - host.last_seen:.0f}s" if host.last_seen else "-"
+            if values:
+                message += (
+                    f"{state} `{host.name}` CPU `{values['cpu']:.0f}%` · RAM `{values['mem']:.0f}%` · "
+                    f"Disco `{values['disk']:.0f}%` · {seen}\n"
                 )
             else:
-                message = "❌ Error obteniendo información del sistema"
+                message += f"{state} `{host.name}` sin muestras · {seen}\n"
+        received = sum(host.bytes_received for host in hosts)
+        samples = sum(host.samples for host in hosts)
+        if samples:
+            message += f"\n📦 {self._format_size(received)} recibidos, {received / samples:.0f} B por muestra"
+        await self.send_message_with_retry(update.message, message, parse_mode='Markdown')
 
-            await update.message.reply_text(message, parse_mode='Markdown')
-        except Exception as e:
-            await update.message.reply_text(f"❌ Error: {str(e)}")
+    @validate_access
+    @requires_monitoring
+    async def graph_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Muestra la tendencia de una métrica como sparkline"""
+        from models.metrics_history import METRICS
+        args = context.args
+        metric = args[0].lower() if args else 'cpu'
+        window = self._parse_duration(args[1]) if len(args) > 1 else 3600
+
+        if metric not in METRICS or not window:
+            await self.send_message_with_retry(
+                update.message,
+                "❌ Uso: `/graph <métrica> <ventana>`\n"
+                f"Métricas: {', '.join(f'`{name}`' for name in METRICS)}\n"
+                "Ventana: por ejemplo `30m`, `6h`, `7d`",
+                parse_mode='Markdown'
+            )
+            return
+
+        points = self.metrics_history.query(metric, window, time.time())
+        if not points:
+            await self.send_message_with_retry(update.message, "📉 Aún no hay datos para esa ventana")
+            return
+
+        values = [value for _, value in points]
+        format_value = self._metric_formatter(metric)
+        start = datetime.fromtimestamp(points[0][0]).strftime('%Y-%m-%d %H:%M')
+        end = datetime.fromtimestamp(points[-1][0]).strftime('%Y-%m-%d %H:%M')
+        message = (
+            f"📈 `{metric}` ({args[1] if len(args) > 1 else '1h'})\n\n"
+            f"`{self._generate_sparkline(values)}`\n"
+            f"`{start}` → `{end}`\n\n"
+            f"*Mín:* `{format_value(min(values))}`  "
+            f"*Máx:* `{format_value(max(values))}`\n"
+            f"*Prom:* `{format_value(sum(values) / len(values))}`  "
+            f"*Último:* `{format_value(values[-1])}`"
+        )
+        await self.send_message_with_retry(update.message, message, parse_mode='Markdown')
 
     @validate_access
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        if not self.modo_terminal:
+        session = self._session(update)
+        if not session.terminal:
             await self.send_message_with_retry(
                 update.message,
                 "❌ Modo terminal no está activo. Usa /run para activarlo.",
@@ -201,34 +510,467 @@ class BotController:
 
         user_id = update.effective_user.id
         username = update.effective_user.username or "Sin username"
+        chat_id = update.effective_chat.id
         comando = update.message.text.strip()
-        
+
         logger.info(f"Comando recibido de {username} (ID: {user_id}): {comando}")
-        
+
         try:
             espera_message = await self.send_message_with_retry(
                 update.message,
                 "⏳ Ejecutando comando..."
             )
-            
-            output = await self.command_executor.execute_command(comando)
-            await espera_message.delete()
-            
-            if output:
-                await self.send_message_with_retry(update.message, f"`{output}`", parse_mode='Markdown')
+
+            # Mostrar la salida a medida que llega, respetando el límite de ediciones
+            tail = ""
+            last_edit = 0.0
+            edit_task = None
+
+            def on_output(chunk: str):
+                nonlocal tail, last_edit, edit_task
+                tail = (tail + chunk)[-3000:]
+                now = time.monotonic()
+                if now - last_edit < EDIT_INTERVAL or (edit_task and not edit_task.done()):
+                    return
+                last_edit = now
+                edit_task = asyncio.create_task(
+                    self._edit_live_output(espera_message, f"⏳ #{job.id} $ {comando}\n{tail}")
+                )
+
+            job = self.job_scheduler.submit(comando, chat_id, username, on_output=on_output, session=session)
+            position = self.job_scheduler.queue_position(job)
+            if position:
+                await self._edit_live_output(
+                    espera_message,
+                    f"🕒 Trabajo #{job.id} en cola (posición {position}). Usa /jobs para ver el estado."
+                )
+
+            await self.job_scheduler.wait(job)
+            # El comando pudo cambiar el directorio de la sesión
+            self.sessions.changed()
+            if edit_task:
+                await edit_task
+
+            if job.error:
+                logger.error(f"Error ejecutando comando de {username}: {job.error}")
+                header = f"❌ {job.error[:300]}\n$ {comando[:200]}"
             else:
-                await self.send_message_with_retry(update.message, "✅ Comando ejecutado sin salida")
-                
-        except Exception as e:
-            logger.error(f"Error ejecutando comando: {e}")
+                logger.info(f"Comando ejecutado exitosamente para {username}")
+                header = f"$ {comando[:200]}"
+
+            empty_text = None if job.error else "Comando ejecutado con éxito"
+            await self._deliver_output(espera_message, header, job.buffer, empty_text=empty_text)
+        except telegram_error.TimedOut:
+            logger.error(f"Error de timeout al procesar comando de {username}")
+            await self.send_message_with_retry(
+                update.message,
+                "❌ Error de conexión. Intenta nuevamente."
+            )
+
+    @validate_access
+    async def runall_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Ejecuta un comando en varias máquinas: /runall [@grupo|@host1,host2] <comando>"""
+        from models.fan_out import TargetResult, fan_out, group_results
+
+        # El comando se toma del texto original para conservar comillas y espacios
+        command = update.message.text.partition(' ')[2].strip()
+        selector = None
+        if command.startswith('@'):
+            selector, _, command = command[1:].partition(' ')
+            command = command.strip()
+        if not command:
             await self.send_message_with_retry(
                 update.message,
-                f"❌ Error: {str(e)}"
+                "❌ Uso: `/runall [@grupo|@host1,host2] <comando>`\n"
+                f"Grupos: {', '.join(f'`{name}`' for name in FLEET_GROUPS) or '-'}",
+                parse_mode='Markdown'
+            )
+            return
+
+        targets, unknown = self._fanout_targets(selector)
+        if unknown:
+            await self.send_message_with_retry(update.message, f"❌ Hosts desconocidos: {', '.join(unknown)}")
+            return
+
+        chat_id = update.effective_chat.id
+        username = update.effective_user.username
+
+        async def run_target(target, timeout):
+            if target == LOCAL_TARGET:
+                # Como trabajo: cuenta para MAX_WORKERS, aparece en /jobs y se corta con /kill
+                job = self.job_scheduler.submit(command, chat_id, username, timeout=timeout)
+                try:
+                    await self.job_scheduler.wait(job)
+                except asyncio.CancelledError:
+                    self.job_scheduler.kill(job.id)
+                    raise
+                output = await run_blocking('job_output', job.buffer.read_all)
+                return TargetResult(target, job.status, output, job.error, job.exit_code)
+            data = await self.fleet.request(target, 'run', timeout=timeout + 5, command=command, command_timeout=timeout)
+            return TargetResult(target, data['status'], data['output'], data['error'], data['exit_code'])
+
+        fanout_id = next(self._fanout_ids)
+        header = f"🛰️ #R{fanout_id} $ {command[:200]} ({len(targets)} máquinas)"
+        cancel_markup = InlineKeyboardMarkup([[InlineKeyboardButton("🛑 Cancelar", callback_data=f"runall_{fanout_id}")]])
+        status_message = await self.send_message_with_retry(
+            update.message, f"{header}\n⏳ Ejecutando...", reply_markup=cancel_markup
+        )
+        started = time.monotonic()
+        results = []
+
+        async def collect():
+            last_edit = time.monotonic()
+            async for result in fan_out(targets, run_target):
+                results.append(result)
+                # Progreso a medida que terminan, respetando el límite de ediciones
+                if len(results) < len(targets) and time.monotonic() - last_edit >= EDIT_INTERVAL:
+                    last_edit = time.monotonic()
+                    await self._edit_live_output(
+                        status_message,
+                        f"{header}\n⏳ {len(results)}/{len(targets)} terminadas\n{self._format_fanout_counts(results)}",
+                        reply_markup=cancel_markup
+                    )
+
+        # Cancelar la tarea cierra fan_out, que cancela cada destino: el trabajo local
+        # se corta y el hub pide a cada agente que corte su comando
+        task = asyncio.create_task(collect())
+        self._fanouts[fanout_id] = (chat_id, task)
+        try:
+            await asyncio.wait([task])
+        finally:
+            self._fanouts.pop(fanout_id, None)
+            if not task.done():
+                task.cancel()
+        if task.cancelled():
+            finished = {result.target for result in results}
+            results.extend(
+                TargetResult(target, 'killed', error="Comando cancelado")
+                for target in targets if target not in finished
+            )
+        elif task.exception() is not None:
+            raise task.exception()
+
+        buffer = OutputBuffer()
+        buffer.write(self._format_fanout_groups(group_results(results)))
+        await self._deliver_output(
+            status_message,
+            f"{header} en {time.monotonic() - started:.1f}s\n{self._format_fanout_counts(results)}",
+            buffer
+        )
+
+    def cancel_fanout(self, fanout_id: int, chat_id: int) -> bool:
+        """Cancela un /runall en curso del chat"""
+        entry = self._fanouts.get(fanout_id)
+        if entry is None or entry[0] != chat_id or entry[1].done():
+            return False
+        entry[1].cancel()
+        return True
+
+    @observe_latency
+    async def handle_runall_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Maneja el botón de cancelar un /runall en curso"""
+        query = update.callback_query
+        if not TELEGRAM_GROUP or str(update.effective_user.id) != TELEGRAM_GROUP:
+            await self.answer_callback(query, "Acceso denegado")
+            return
+        try:
+            fanout_id = int(query.data.split('_')[1])
+        except (IndexError, ValueError):
+            await self.answer_callback(query)
+            return
+        if self.cancel_fanout(fanout_id, query.message.chat_id):
+            await self.answer_callback(query, "🛑 Cancelando en todas las máquinas")
+        else:
+            await self.answer_callback(query, "La ejecución ya terminó")
+
+    def _fanout_targets(self, selector):
+        """Destinos de /runall y nombres desconocidos; sin selector, esta máquina y todos los agentes"""
+        known = {LOCAL_TARGET} | ({host.name for host in self.fleet.list_hosts()} if self.fleet else set())
+        if selector is None:
+            return [LOCAL_TARGET] + sorted(known - {LOCAL_TARGET}), []
+        names = FLEET_GROUPS.get(selector) or [name for name in selector.split(',') if name]
+        targets = list(dict.fromkeys(names))
+        return targets, [name for name in targets if name not in known]
+
+    def _format_fanout_counts(self, results):
+        """'✅ 12 · ❌ 2 · 🔌 1'"""
+        counts = {}
+        for result in results:
+            counts[result.status] = counts.get(result.status, 0) + 1
+        return " · ".join(f"{self._job_status_emoji(status)} {count}" for status, count in counts.items())
+
+    def _format_fanout_groups(self, groups):
+        """Una sección por resultado distinto; los grupos siguientes al primero se muestran como diferencias"""
+        from models.fan_out import diff_outputs
+        reference = groups[0].result.output if groups else ''
+        sections = []
+        for index, group in enumerate(groups):
+            result = group.result
+            names = ', '.join(group.targets[:8]) + (f" +{len(group.targets) - 8}" if len(group.targets) > 8 else '')
+            code = f" · código {result.exit_code}" if result.exit_code is not None else ''
+            section = f"{self._job_status_emoji(result.status)} {len(group.targets)} {result.status}{code}: {names}\n"
+            if result.status == 'unreachable' or not result.output:
+                section += (result.error or '(sin salida)').strip()[:500]
+            elif index == 0 or not reference:
+                section += result.output.rstrip()
+            else:
+                section += diff_outputs(reference, result.output) or '(misma salida, distinto resultado)'
+            sections.append(section)
+        return '\n\n'.join(sections)
+
+    async def _deliver_output(self, status_message, header: str, buffer: OutputBuffer, empty_text=None):
+        """Entrega la salida completa: en un mensaje, en páginas navegables o como archivo comprimido"""
+        if buffer.size == 0:
+            await self.edit_message_with_retry(status_message, f"{header}\n{empty_text}" if empty_text else header)
+            return
+
+        if buffer.page_count >= OUTPUT_DOCUMENT_THRESHOLD:
+            await self.edit_message_with_retry(
+                status_message,
+                f"{header}\n📎 Salida de {self._format_size(buffer.size)} enviada como archivo comprimido"
+            )
+            # La compresión se hace por bloques en un hilo para no bloquear el event loop
+            compressed = await run_blocking('gzip_output', buffer.to_gzip)
+            try:
+                async def send_document():
+                    compressed.seek(0)  # Los reintentos deben volver a enviar el archivo completo
+                    return await status_message.get_bot().send_document(
+                        chat_id=status_message.chat_id,
+                        document=compressed,
+                        filename='salida.txt.gz'
+                    )
+                await self.send_queue.call(status_message.chat_id, send_document, method='sendDocument')
+            finally:
+                compressed.close()
+                buffer.close()
+            return
+
+        if buffer.page_count == 1:
+            await self.edit_message_with_retry(status_message, f"{header}\n{buffer.read_page(0)}")
+            return
+
+        buffer.title = header
+        buffer_id = self.output_store.add(buffer)
+        text, reply_markup = self._render_output_page(buffer_id, buffer, 0)
+        await self.edit_message_with_retry(status_message, text, reply_markup=reply_markup)
+
+    def _render_output_page(self, buffer_id: int, buffer: OutputBuffer, page: int):
+        """Genera el texto y los botones de navegación de una página de salida"""
+        page = max(0, min(page, buffer.page_count - 1))
+        text = f"{buffer.title}\n{buffer.read_page(page)}"
+        if buffer.truncated and page == buffer.page_count - 1:
+            text += "\n… (salida truncada)"
+
+        buttons = []
+        if page > 0:
+            buttons.append(InlineKeyboardButton("⬅️", callback_data=f"page_{buffer_id}_{page - 1}"))
+        buttons.append(InlineKeyboardButton(f"{page + 1}/{buffer.page_count}", callback_data="page_noop"))
+        if page < buffer.page_count - 1:
+            buttons.append(InlineKeyboardButton("➡️", callback_data=f"page_{buffer_id}_{page + 1}"))
+        return text, InlineKeyboardMarkup([buttons])
+
+    @observe_latency
+    async def handle_page_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Maneja los botones de navegación entre páginas de salida"""
+        query = update.callback_query
+        if not TELEGRAM_GROUP or str(update.effective_user.id) != TELEGRAM_GROUP:
+            await self.answer_callback(query, "Acceso denegado")
+            return
+        if query.data == "page_noop":
+            await self.answer_callback(query)
+            return
+
+        try:
+            _, buffer_id, page = query.data.split('_')
+            buffer_id, page = int(buffer_id), int(page)
+        except ValueError:
+            await self.answer_callback(query)
+            return
+
+        buffer = self.output_store.get(buffer_id)
+        if buffer is None:
+            await self.answer_callback(query, "La salida ya no está disponible")
+            return
+
+        await self.answer_callback(query)
+        text, reply_markup = self._render_output_page(buffer_id, buffer, page)
+        await self.edit_message_with_retry(query.message, text, reply_markup=reply_markup)
+
+    async def _edit_live_output(self, message, text, reply_markup=None):
+        """Edita el mensaje de progreso; los errores se ignoran porque la salida final se enviará igual"""
+        try:
+            await self.send_queue.edit(message, text[:4000], reply_markup=reply_markup)
+        except telegram_error.TelegramError as e:
+            logger.debug(f"No se pudo actualizar la salida parcial: {e}")
+
+    @validate_access
+    async def kill_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Cancela un trabajo por ID, un /runall por su ID (R3) o, sin argumentos, el último trabajo del chat"""
+        if context.args and context.args[0].lstrip('#')[:1] in ('R', 'r'):
+            try:
+                fanout_id = int(context.args[0].lstrip('#')[1:])
+            except ValueError:
+                await self.send_message_with_retry(update.message, "❌ Uso: /kill [id|R<id>]")
+                return
+            if self.cancel_fanout(fanout_id, update.effective_chat.id):
+                await self.send_message_with_retry(update.message, f"🛑 /runall #R{fanout_id} cancelado en todas las máquinas")
+            else:
+                await self.send_message_with_retry(update.message, f"❌ El /runall #R{fanout_id} no existe o ya terminó")
+            return
+        if context.args:
+            try:
+                job_id = int(context.args[0].lstrip('#'))
+            except ValueError:
+                await self.send_message_with_retry(update.message, "❌ Uso: /kill [id|R<id>]")
+                return
+        else:
+            active = self.job_scheduler.active_jobs(update.effective_chat.id)
+            if not active:
+                await self.send_message_with_retry(update.message, "❌ No hay ningún comando en ejecución")
+                return
+            job_id = active[-1].id
+
+        if self.job_scheduler.kill(job_id):
+            await self.send_message_with_retry(update.message, f"🛑 Trabajo #{job_id} cancelado")
+        else:
+            await self.send_message_with_retry(update.message, f"❌ El trabajo #{job_id} no existe o ya terminó")
+
+    @validate_access
+    async def jobs_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Lista los trabajos en cola, en ejecución y terminados"""
+        jobs = self.job_scheduler.list_jobs()
+        if not jobs:
+            await self.send_message_with_retry(update.message, "📋 No hay trabajos registrados")
+            return
+
+        message = "📋 *Trabajos*\n\n"
+        for job in reversed(jobs[-20:]):
+            duration = f"{job.duration:.1f}s" if job.duration is not None else "-"
+            exit_code = f" (código {job.exit_code})" if job.exit_code is not None else ""
+            message += (
+                f"{self._job_status_emoji(job.status)} `#{job.id}` {job.status}{exit_code} {duration}\n"
+                f"└─ `{self._escape_code(job.command[:40])}`\n"
+            )
+        await self.send_message_with_retry(update.message, message, parse_mode='Markdown')
+
+    @validate_access
+    async def job_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Muestra el detalle de un trabajo"""
+        try:
+            job_id = int(context.args[0].lstrip('#'))
+        except (IndexError, ValueError):
+            await self.send_message_with_retry(update.message, "❌ Uso: /job <id>")
+            return
+
+        job = self.job_scheduler.get_job(job_id)
+        if job is None:
+            await self.send_message_with_retry(update.message, f"❌ El trabajo #{job_id} no existe")
+            return
+
+        created = datetime.fromtimestamp(job.created_at).strftime('%Y-%m-%d %H:%M:%S')
+        duration = f"{job.duration:.1f}s" if job.duration is not None else "-"
+        message = (
+            f"{self._job_status_emoji(job.status)} *Trabajo #{job.id}*\n\n"
+            f"*Comando:* `{self._escape_code(job.command)}`\n"
+            f"*Usuario:* `{job.username}`\n"
+            f"*Estado:* `{job.status}`\n"
+            f"*Código de salida:* `{job.exit_code if job.exit_code is not None else '-'}`\n"
+            f"*Creado:* `{created}`\n"
+            f"*Duración:* `{duration}`\n"
+        )
+        if job.output_tail:
+            message += f"\n```\n{self._escape_code(job.output_tail[-1500:])}\n```"
+        await self.send_message_with_retry(update.message, message, parse_mode='Markdown')
+
+    @validate_access
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Percentiles recientes de los tiempos internos del bot"""
+        from models.send_queue import API_DURATION, API_REQUESTS, QUEUE_WAIT
+        from models.loop_monitor import LOOP_LAG
+        from utils.metrics import EXECUTOR_WAIT, EXECUTOR_RUN
+
+        message = "📊 *Estadísticas internas* (p50 / p95 / p99)\n"
+
+        message += "\n⏱️ *Comandos*\n"
+        for labels, count, points in HANDLER_LATENCY.percentiles():
+            message += f"`{labels['handler']}`: {self._format_latencies(points)} ({count})\n"
+
+        message += "\n🧩 *Fases de los comandos*\n"
+        for labels, count, points in HANDLER_PHASE.percentiles():
+            message += f"`{labels['phase']}`: {self._format_latencies(points)}\n"
+
+        errors = {}
+        for _, labels, value in API_REQUESTS.samples():
+            if labels['outcome'] != 'ok':
+                errors[labels['method']] = errors.get(labels['method'], 0) + value
+        message += "\n📡 *API de Telegram*\n"
+        for labels, count, points in API_DURATION.percentiles():
+            message += (
+                f"`{labels['method']}`: {self._format_latencies(points)} ({count}, "
+                f"{int(errors.get(labels['method'], 0))} errores)\n"
+            )
+        for _, count, points in QUEUE_WAIT.percentiles():
+            message += f"Espera en cola: {self._format_latencies(points)}\n"
+
+        for _, count, points in LOOP_LAG.percentiles():
+            message += (
+                f"\n🔄 *Retraso del event loop:* {self._format_latencies(points)}, "
+                f"máx {self._format_latencies([self.loop_monitor.max_lag])}\n"
             )
+        message += f"🐢 *Bloqueos del loop:* {self.loop_watchdog.blocks}"
+        if self.loop_watchdog.last_block:
+            blocked_at, duration = self.loop_watchdog.last_block
+            message += f" (último: {duration:.2f}s a las {datetime.fromtimestamp(blocked_at).strftime('%H:%M:%S')})"
+        message += "\n"
+
+        run_times = {labels['task']: points for labels, _, points in EXECUTOR_RUN.percentiles()}
+        message += "\n🧵 *Pool de hilos* (espera en cola · ejecución)\n"
+        for labels, count, points in EXECUTOR_WAIT.percentiles():
+            task = labels['task']
+            message += (
+                f"`{task}`: {self._format_latencies(points)} · "
+                f"{self._format_latencies(run_times.get(task, []))} ({count})\n"
+            )
+
+        for _, count, points in ALERT_CHECK_DURATION.percentiles():
+            message += f"\n🔔 *Bucle de alertas:* {self._format_latencies(points)} ({count})\n"
+
+        queue = self.send_queue.stats()
+        message += (
+            f"\n📤 *Cola de envío:* {queue['pending']} pendientes, {queue['sent']} enviados, "
+            f"{queue['merged']} unidos, {queue['throttled']} limitados"
+        )
+        await self.send_message_with_retry(update.message, message, parse_mode='Markdown')
+
+    def _format_latencies(self, values):
+        """Segundos como milisegundos: '12 / 40 / 85 ms'"""
+        if not values:
+            return "-"
+        return " / ".join(
+            f"{value * 1000:.1f}" if value < 0.01 else f"{value * 1000:.0f}" for value in values
+        ) + " ms"
+
+    def _job_status_emoji(self, status):
+        return {
+            'queued': '🕒',
+            'running': '🟢',
+            'ok': '✅',
+            'error': '❌',
+            'timeout': '⌛',
+            'killed': '🛑',
+            'unreachable': '🔌'
+        }.get(status, '❔')
+
+    def _escape_code(self, text):
+        """Evita que la salida rompa los bloques de código Markdown"""
+        return text.replace('`', "'")
 
     async def setup_alert_check(self, bot):
         """Configura el bucle de verificación de alertas del sistema"""
         self._bot = bot
+        if self.alert_system is None:
+            logger.warning("Sin sistema de alertas: el monitoreo no pudo iniciarse")
+            return
         if self._alert_check_task is None:
             self._alert_check_task = asyncio.create_task(self._alert_check_loop())
 
@@ -236,67 +978,117 @@ class BotController:
         """Bucle principal para verificar alertas del sistema"""
         while True:
             try:
-                alert = self.alert_system.check_system_resources()
-                if alert:
-                    await self._send_alert(self._bot, alert)
+                with ALERT_CHECK_DURATION.time():
+                    alerts = self.alert_system.check_system_resources()
+                    if alerts:
+                        await self._send_alerts(self._bot, alerts)
             except Exception as e:
                 logger.error(f"Error en verificación de alertas: {e}")
-            await asyncio.sleep(60)  # Verificar cada minuto
+            await asyncio.sleep(ALERT_CHECK_INTERVAL)
 
     async def _send_alert(self, bot, alert):
         """Envía una alerta al grupo de Telegram"""
+        await self._send_alerts(bot, [alert])
+
+    async def _send_alerts(self, bot, alerts):
+        """Envía todas las alertas de una evaluación agrupadas en un único resumen"""
         if not TELEGRAM_GROUP:
             return
 
+        sections = [self._format_alert(alert) for alert in alerts]
+        for alert in alerts:
+            self.metrics_store.add_alert(alert)
+
+        if len(sections) == 1:
+            messages = sections
+        else:
+            # Resumen con todas las alertas, dividido solo si supera el límite de Telegram
+            messages = []
+            current = f"🚨 *{len(alerts)} alertas*"
+            for section in sections:
+                if len(current) + len(section) + 2 > 4000:
+                    messages.append(current)
+                    current = section
+                else:
+                    current += "\n\n" + section
+            messages.append(current)
+
+        # Las alertas de seguridad adelantan al resto de mensajes en la cola de envío
+        priority = PRIORITY_SECURITY if any(alert.type == 'security' for alert in alerts) else PRIORITY_ALERT
+        results = await asyncio.gather(*(
+            self.send_queue.send_message(
+                bot, TELEGRAM_GROUP, alert_text, parse_mode='Markdown', priority=priority, mergeable=True
+            )
+            for alert_text in messages
+        ), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Error enviando alerta: {result}")
+
+    def _format_alert(self, alert):
         emoji_map = {
             'info': 'ℹ️',
             'warning': '⚠️',
             'danger': '🚨'
         }
 
-        alert_text = (
+        return (
             f"{emoji_map.get(alert.severity, '❗')} *{alert.type.upper()}*\n"
             f"{alert.message}\n"
             f"📅 `{alert.timestamp.strftime('%Y-%m-%d %H:%M:%S')}`"
         )
 
-        try:
-            await bot.send_message(
-                chat_id=TELEGRAM_GROUP,
-                text=alert_text,
-                parse_mode='Markdown'
-            )
-        except Exception as e:
-            logger.error(f"Error enviando alerta: {e}")
-
-    @validate_access
-    async def alerts(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Maneja la configuración de alertas"""
-        keyboard = [
+    def _alerts_keyboard(self):
+        return [
             [InlineKeyboardButton("🔒 Seguridad", callback_data="alert_security")],
             [InlineKeyboardButton("💻 CPU", callback_data="alert_cpu")],
             [InlineKeyboardButton("💾 Memoria", callback_data="alert_memory")],
             [InlineKeyboardButton("💿 Disco", callback_data="alert_disk")],
-            [InlineKeyboardButton("⚙️ Umbrales", callback_data="alert_thresholds")]
+            [InlineKeyboardButton("🌐 Red", callback_data="alert_network")],
+            [InlineKeyboardButton("📀 E/S de disco", callback_data="alert_disk_io")],
+            [InlineKeyboardButton("⚙️ Procesos", callback_data="alert_process")],
+            [InlineKeyboardButton("🧩 Servicios", callback_data="alert_unit")],
+            [InlineKeyboardButton("📂 Particiones", callback_data="alert_mount")],
+            [InlineKeyboardButton("🐢 Bloqueos del bot", callback_data="alert_watchdog")],
+            [InlineKeyboardButton("🖧 Flota", callback_data="alert_fleet")],
+            [InlineKeyboardButton("📜 Logs", callback_data="alert_logs")],
+            [InlineKeyboardButton("⚙️ Umbrales", callback_data="alert_thresholds")],
+            [InlineKeyboardButton("🕘 Historial", callback_data="alert_history")]
         ]
 
-        alert_status = self.alert_system.get_alert_status()
+    def _format_alert_status(self):
+        from models.alert_system import ALERT_TYPE_LABELS
         status_text = "🔔 *Estado Actual de Alertas*\n\n"
-        for alert_type, enabled in alert_status.items():
+        for alert_type, enabled in self.alert_system.get_alert_status().items():
             status = "✅ Activada" if enabled else "❌ Desactivada"
-            status_text += f"• {alert_type.title()}: {status}\n"
+            _, label = ALERT_TYPE_LABELS.get(alert_type, (None, alert_type.replace('_', '\\_')))
+            status_text += f"• {label}: {status}\n"
+        return status_text
 
+    @validate_access
+    @requires_monitoring
+    async def alerts(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Maneja la configuración de alertas"""
+        keyboard = self._alerts_keyboard()
+
+        status_text = self._format_alert_status()
         reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(
+        await self.send_message_with_retry(
+            update.message,
             status_text,
             reply_markup=reply_markup,
             parse_mode='Markdown'
         )
 
+    @observe_latency
     async def handle_alert_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Maneja las interacciones con los botones de configuración de alertas"""
         query = update.callback_query
-        await query.answer()
+        await self.answer_callback(query)
+        await self.monitoring_ready.wait()
+        if self.monitoring_error:
+            await self.edit_message_with_retry(query.message, self._monitoring_error_text())
+            return
 
         if not query.data.startswith("alert_"):
             return
@@ -305,19 +1097,26 @@ class BotController:
         if alert_type == "thresholds":
             thresholds_text = (
                 "⚙️ *Configuración de Umbrales*\n\n"
+                f"{self._format_rules()}\n"
                 "Para configurar un umbral, usa:\n"
-                "`/threshold <recurso> <valor>`\n\n"
+                "`/threshold <recurso> <valor> [recuperación] [duración]`\n\n"
                 "Ejemplo:\n"
-                "`/threshold cpu 90`\n\n"
+                "`/threshold cpu 90 75 2m`\n\n"
+                "Para cambiar el modo de evaluación:\n"
+                "`/rule <recurso> value|ewma|rate [alpha]`\n\n"
                 "Recursos disponibles:\n"
                 "• cpu\n"
                 "• memory\n"
-                "• disk"
-            )
-            await query.edit_message_text(
-                text=thresholds_text,
-                parse_mode='Markdown'
+                "• disk\n"
+                "• network (% de uso del enlace)\n"
+                "• disk\\_io (% de ocupación del dispositivo)"
             )
+            await self.edit_message_with_retry(query.message, thresholds_text, parse_mode='Markdown')
+            return
+
+        if alert_type == "history":
+            history_text = await self._render_alert_history()
+            await self.edit_message_with_retry(query.message, history_text, parse_mode='Markdown')
             return
 
         # Toggle alert status
@@ -326,199 +1125,456 @@ class BotController:
         self.alert_system.toggle_alert(alert_type, new_status)
 
         # Update message
-        alert_status = self.alert_system.get_alert_status()
-        status_text = "🔔 *Estado Actual de Alertas*\n\n"
-        for a_type, enabled in alert_status.items():
-            status = "✅ Activada" if enabled else "❌ Desactivada"
-            status_text += f"• {a_type.title()}: {status}\n"
+        status_text = self._format_alert_status()
+        keyboard = self._alerts_keyboard()
 
-        keyboard = [
-            [InlineKeyboardButton("🔒 Seguridad", callback_data="alert_security")],
-            [InlineKeyboardButton("💻 CPU", callback_data="alert_cpu")],
-            [InlineKeyboardButton("💾 Memoria", callback_data="alert_memory")],
-            [InlineKeyboardButton("💿 Disco", callback_data="alert_disk")],
-            [InlineKeyboardButton("⚙️ Umbrales", callback_data="alert_thresholds")]
-        ]
-
-        await query.edit_message_text(
-            text=status_text,
+        await self.edit_message_with_retry(
+            query.message,
+            status_text,
             reply_markup=InlineKeyboardMarkup(keyboard),
             parse_mode='Markdown'
         )
 
+    async def _render_alert_history(self, limit: int = 10) -> str:
+        """Últimas alertas enviadas, leídas del almacén persistente (sobreviven a un reinicio)"""
+        alerts = await run_blocking('alert_history', self.metrics_store.recent_alerts, limit)
+        if not alerts:
+            return "🕘 Aún no se envió ninguna alerta"
+
+        emoji_map = {
+            'info': 'ℹ️',
+            'warning': '⚠️',
+            'danger': '🚨'
+        }
+        text = f"🕘 *Últimas {len(alerts)} alertas*\n\n"
+        for ts, alert_type, severity, source, message in alerts:
+            # Solo la primera línea, sin marcas de Markdown que pudieran quedar sin cerrar
+            summary = re.sub(r'[*_`\[\]]', '', (message or '').split('\n')[0]).strip()
+            origin = f" · `{self._escape_code(source)}`" if source else ''
+            text += (
+                f"{emoji_map.get(severity, '❗')} `{datetime.fromtimestamp(ts).strftime('%d/%m %H:%M:%S')}` "
+                f"*{alert_type.upper().replace('_', ' ')}*{origin}\n└─ {summary[:120]}\n"
+            )
+        return text
+
     @validate_access
+    @requires_monitoring
     async def threshold(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Configura los umbrales de las alertas"""
         args = context.args
-        if len(args) != 2:
-            await update.message.reply_text(
+        if not args:
+            await self.send_message_with_retry(
+                update.message,
+                f"⚙️ *Reglas de Alerta*\n\n{self._format_rules()}",
+                parse_mode='Markdown'
+            )
+            return
+
+        if not 2 <= len(args) <= 4:
+            await self.send_message_with_retry(
+                update.message,
                 "❌ Uso incorrecto. Ejemplo:\n"
-                "`/threshold cpu 90`",
+                "`/threshold cpu 90 75 2m`",
                 parse_mode='Markdown'
             )
             return
 
-        resource, value = args
+        resource = args[0]
         try:
-            value = float(value)
-            if self.alert_system.set_threshold(resource, value):
-                await update.message.reply_text(
-                    f"✅ Umbral de {resource} actualizado a {value}%",
-                    parse_mode='Markdown'
-                )
-            else:
-                await update.message.reply_text(
-                    "❌ Recurso no válido o valor fuera de rango (0-100)",
-                    parse_mode='Markdown'
-                )
+            value = float(args[1])
+            clear_value = float(args[2]) if len(args) > 2 else None
         except ValueError:
-            await update.message.reply_text(
+            await self.send_message_with_retry(
+                update.message,
                 "❌ El valor debe ser un número",
                 parse_mode='Markdown'
             )
-        username = update.effective_user.username or "Sin username"
-        comando = update.message.text.strip()
-        
-        logger.info(f"Comando recibido de {username} (ID: {user_id}): {comando}")
-        
-        try:
-            espera_message = await self.send_message_with_retry(
+            return
+
+        duration = None
+        if len(args) > 3:
+            duration = self._parse_duration(args[3])
+            if duration is None:
+                await self.send_message_with_retry(update.message, "❌ Duración inválida. Ejemplo: `90s`, `2m`", parse_mode='Markdown')
+                return
+
+        if self.alert_system.set_threshold(resource, value, clear_value, duration):
+            rule = self.alert_system.get_rules()[resource]
+            await self.send_message_with_retry(
                 update.message,
-                "⏳ Ejecutando comando..."
+                f"✅ Regla de {resource} actualizada: {rule.describe()}",
+                parse_mode='Markdown'
+            )
+        else:
+            await self.send_message_with_retry(
+                update.message,
+                "❌ Recurso no válido o valor fuera de rango (0-100, recuperación ≤ disparo)",
+                parse_mode='Markdown'
             )
 
-            result, error = self.command_executor.execute_command(comando)
-            
-            if error:
-                logger.error(f"Error ejecutando comando de {username}: {error}")
-                await self.edit_message_with_retry(espera_message, f"❌ {error}")
-                return
+    @validate_access
+    @requires_monitoring
+    async def rule_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Cambia el modo de evaluación de una regla de alerta"""
+        args = context.args
+        if len(args) not in (2, 3):
+            await self.send_message_with_retry(
+                update.message,
+                "❌ Uso: `/rule <recurso> value|ewma|rate [alpha]`",
+                parse_mode='Markdown'
+            )
+            return
 
-            # Formatear el mensaje final
-            output_message = f"$ {comando}\n{result if result else 'Comando ejecutado con éxito'}"
-            
-            if len(output_message) > 4000:
-                output_message = output_message[:1500] + "\n...\n" + output_message[-1500:]
+        resource, mode = args[0], args[1].lower()
+        try:
+            alpha = float(args[2]) if len(args) > 2 else None
+        except ValueError:
+            await self.send_message_with_retry(update.message, "❌ alpha debe ser un número entre 0 y 1")
+            return
 
-            logger.info(f"Comando ejecutado exitosamente para {username}")
-            await self.edit_message_with_retry(espera_message, output_message)
-        except telegram_error.TimedOut:
-            logger.error(f"Error de timeout al procesar comando de {username}")
+        if self.alert_system.set_rule_mode(resource, mode, alpha):
+            rule = self.alert_system.get_rules()[resource]
+            await self.send_message_with_retry(update.message, f"✅ Regla de {resource} actualizada: {rule.describe()}")
+        else:
+            await self.send_message_with_retry(update.message, "❌ Recurso, modo o alpha no válidos")
+
+    @validate_access
+    @requires_monitoring
+    async def watch_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Agrega procesos, servicios o particiones a vigilar, o lista los actuales"""
+        args = context.args
+        if not args:
+            targets = self.alert_system.list_targets()
+            if not targets:
+                message = "👀 No hay objetivos vigilados"
+            else:
+                message = "👀 *Objetivos Vigilados*\n\n"
+                labels = {'process': 'Proceso', 'unit': 'Servicio', 'mount': 'Partición'}
+                for kind, target, firing in targets:
+                    state = "🔴" if firing else "🟢"
+                    message += f"{state} {labels[kind]} `{target.name}`: `{target.describe()}`\n"
+            await self.send_message_with_retry(update.message, message, parse_mode='Markdown')
+            return
+
+        kind = args[0].lower()
+        try:
+            if kind == 'proc' and 3 <= len(args) <= 5:
+                cpu = float(args[3]) if len(args) > 3 else None
+                memory = float(args[4]) if len(args) > 4 else None
+                ok = self.alert_system.add_process_target(args[1], args[2], cpu, memory)
+            elif kind == 'unit' and len(args) == 2:
+                ok = self.alert_system.add_unit_target(args[1])
+            elif kind == 'mount' and len(args) == 3:
+                ok = self.alert_system.add_mount_target(args[1], float(args[2]))
+            else:
+                ok = None
+        except ValueError:
+            ok = False
+
+        if ok is None:
             await self.send_message_with_retry(
                 update.message,
-                "❌ Error de conexión. Intenta nuevamente."
+                "❌ Uso:\n"
+                "`/watch proc <nombre> <regex> [cpu%] [mem%]`\n"
+                "`/watch unit <unidad>`\n"
+                "`/watch mount <punto> <umbral%>`",
+                parse_mode='Markdown'
             )
+        elif ok:
+            await self.send_message_with_retry(update.message, f"✅ Vigilando `{args[1]}`", parse_mode='Markdown')
+        else:
+            await self.send_message_with_retry(update.message, "❌ Expresión regular o umbral no válidos")
 
     @validate_access
+    @requires_monitoring
+    async def unwatch_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Deja de vigilar un proceso, servicio o partición"""
+        if len(context.args) != 1:
+            await self.send_message_with_retry(update.message, "❌ Uso: /unwatch <nombre>")
+            return
+        if self.alert_system.remove_target(context.args[0]):
+            await self.send_message_with_retry(update.message, f"✅ `{context.args[0]}` ya no se vigila", parse_mode='Markdown')
+        else:
+            await self.send_message_with_retry(update.message, "❌ Objetivo no encontrado")
+
+    def _format_rules(self):
+        text = ""
+        for resource, rule in self.alert_system.get_rules().items():
+            state = "🔴" if rule.firing else "🟢"
+            text += f"{state} {resource}: `{rule.describe()}`\n"
+        return text
+
+    @validate_access
+    @requires_monitoring
     async def ps_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        try:
-            processes = []
-            for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent', 'status']):
-                try:
-                    processes.append(proc.info)
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    pass
+        """Lista procesos: /ps [host] [cpu|mem|io|threads] [filtro] [N]"""
+        from models.process_table import SORT_KEYS
+        sort, pattern, limit = 'cpu', None, 10
+        args = list(context.args)
+        host = self._fleet_host(args)
+        if host:
+            args.pop(0)
+        for arg in args:
+            if arg.lower() in SORT_KEYS:
+                sort = arg.lower()
+            elif arg.isdigit():
+                limit = max(1, min(int(arg), 50))
+            else:
+                pattern = arg
 
-            # Ordenar por uso de CPU
-            processes.sort(key=lambda x: x['cpu_percent'], reverse=True)
-            
-            message = "📈 *Top 10 Procesos Activos*\n\n"
-            message += "```\n"
-            message += "🔵 PROCESO      CPU%   MEM%   ESTADO\n"
-            message += "═" * 40 + "\n"
-            
-            for proc in processes[:10]:
-                status_emoji = "🟢" if proc['status'] == 'running' else "⚪"
-                message += f"{status_emoji} {proc['name'][:10]:<10} {proc['cpu_percent']:>5.1f} {proc['memory_percent']:>6.1f}  {proc['status'][:8]}\n"
-            message += "\n📊 Total procesos: {}".format(len(processes))
-            message += "```"
+        if host:
+            from models.fleet_protocol import FleetError
+            try:
+                result = await self.fleet.request(host, 'ps', sort=sort, pattern=pattern, limit=limit)
+            except FleetError as e:
+                await self.send_message_with_retry(update.message, f"❌ {host}: {str(e)}")
+                return
+            if result['updated_at'] is None:
+                await self.send_message_with_retry(update.message, f"⏳ La tabla de procesos de {host} aún no está disponible")
+                return
+            message = self._format_processes(result['rows'], sort, limit, result['total'], host)
+            await self.send_message_with_retry(update.message, message, parse_mode='Markdown')
+            return
 
-            await update.message.reply_text(message, parse_mode='Markdown')
+        try:
+            # Lectura de la tabla mantenida por el muestreador: no recorre /proc en cada petición
+            if self.process_table.updated_at is None:
+                await self.send_message_with_retry(update.message, "⏳ La tabla de procesos aún no está disponible")
+                return
+            processes = self.process_table.top(sort, pattern, limit)
+            total = len(self.process_table.rows())
+            message = self._format_processes(processes, sort, limit, total)
+            await self.send_message_with_retry(update.message, message, parse_mode='Markdown')
+        except re.error:
+            await self.send_message_with_retry(update.message, "❌ Filtro no válido")
         except Exception as e:
-            await update.message.reply_text(f"❌ Error obteniendo procesos: {str(e)}")
+            await self.send_message_with_retry(update.message, f"❌ Error obteniendo procesos: {str(e)}")
+
+    def _format_processes(self, processes, sort, limit, total, host=None):
+        """Tabla de /ps, para la máquina local o para un agente de la flota"""
+        extra = {'io': 'IO/s', 'threads': 'HILOS'}.get(sort, 'ESTADO')
+        message = f"📈 *Top {limit} Procesos por {sort}*"
+        message += f" en `{host}`\n\n" if host else "\n\n"
+        message += "```\n"
+        message += f"🔵 PROCESO      CPU%   MEM%   {extra}\n"
+        message += "═" * 40 + "\n"
+
+        for proc in processes:
+            status_emoji = "🟢" if proc['status'] == 'running' else "⚪"
+            if sort == 'io':
+                column = self._format_size(proc['io_rate']) if proc['io_rate'] is not None else '-'
+            elif sort == 'threads':
+                column = str(proc['num_threads'])
+            else:
+                column = proc['status'][:8]
+            message += f"{status_emoji} {proc['name'][:10]:<10} {proc['cpu_percent']:>5.1f} {proc['memory_percent']:>6.1f}  {column}\n"
+        message += "\n📊 Total procesos: {}".format(total)
+        message += "```"
+        return message
 
     @validate_access
+    @requires_monitoring
     async def net_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
-            interfaces = psutil.net_if_stats()
-            io_counters = psutil.net_io_counters(pernic=True)
-            addrs = psutil.net_if_addrs()
-            
-            message = "🌐 *Interfaces de Red*\n\n"
-            
-            for iface, stats in interfaces.items():
-                status = '🟢 ACTIVO' if stats.isup else '🔴 INACTIVO'
-                message += f"📡 *{iface}* ({status})\n"
-                
-                # Mostrar direcciones IP
-                if iface in addrs:
-                    for addr in addrs[iface]:
-                        if addr.family.name == 'AF_INET':  # IPv4
-                            message += f"└─ IP: `{addr.address}`\n"
-                        elif addr.family.name == 'AF_INET6':  # IPv6
-                            message += f"└─ IPv6: `{addr.address[:10]}...`\n"
-                
-                if iface in io_counters:
-                    io = io_counters[iface]
-                    # Convertir a unidades más legibles
-                    sent = io.bytes_sent
-                    recv = io.bytes_recv
-                    
-                    for unit in ['B', 'KB', 'MB', 'GB']:
-                        if sent < 1024:
-                            sent_str = f"{sent:.1f} {unit}"
-                            break
-                        sent /= 1024
-                    for unit in ['B', 'KB', 'MB', 'GB']:
-                        if recv < 1024:
-                            recv_str = f"{recv:.1f} {unit}"
-                            break
-                        recv /= 1024
-                        
-                    message += f"└─ 📤 Enviado: `{sent_str}`\n"
-                    message += f"└─ 📥 Recibido: `{recv_str}`\n"
-                message += "\n"
-
-            await update.message.reply_text(message, parse_mode='Markdown')
+            if context.args and context.args[0].lower() == 'conns':
+                message = await self.response_cache.get(('net', 'conns'), self._render_net_connections)
+            else:
+                message = await self.response_cache.get(('net',), self._render_net)
+            await self.send_message_with_retry(update.message, message, parse_mode='Markdown')
         except Exception as e:
-            await update.message.reply_text(f"❌ Error obteniendo estado de red: {str(e)}")
+            await self.send_message_with_retry(update.message, f"❌ Error obteniendo estado de red: {str(e)}")
+
+    async def _render_net(self) -> str:
+        import psutil
+        interfaces = psutil.net_if_stats()
+        io_counters = psutil.net_io_counters(pernic=True)
+        addrs = psutil.net_if_addrs()
+        windows = {
+            'now': self.net_monitor.rates(),
+            '1m': self.net_monitor.rates(60),
+            '5m': self.net_monitor.rates(300)
+        }
+
+        message = "🌐 *Interfaces de Red*\n\n"
+
+        for iface, stats in interfaces.items():
+            status = '🟢 ACTIVO' if stats.isup else '🔴 INACTIVO'
+            message += f"📡 *{iface}* ({status})\n"
+
+            # Mostrar direcciones IP
+            if iface in addrs:
+                for addr in addrs[iface]:
+                    if addr.family.name == 'AF_INET':  # IPv4
+                        message += f"└─ IP: `{addr.address}`\n"
+                    elif addr.family.name == 'AF_INET6':  # IPv6
+                        message += f"└─ IPv6: `{addr.address[:10]}...`\n"
+
+            if iface in io_counters:
+                io = io_counters[iface]
+                message += f"└─ 📤 Enviado: `{self._format_size(io.bytes_sent)}`\n"
+                message += f"└─ 📥 Recibido: `{self._format_size(io.bytes_recv)}`\n"
+
+            now_rates = windows['now'].get(iface)
+            if now_rates:
+                for direction, field, icon in (('TX', 'bytes_sent', '⬆️'), ('RX', 'bytes_recv', '⬇️')):
+                    rates = " · ".join(
+                        f"{label} {self._format_size(windows[label][iface][field])}/s"
+                        for label in ('now', '1m', '5m') if iface in windows[label]
+                    )
+                    message += f"└─ {icon} {direction}: `{rates}`\n"
+                packets = now_rates['packets_sent'] + now_rates['packets_recv']
+                errors = now_rates['errin'] + now_rates['errout']
+                drops = now_rates['dropin'] + now_rates['dropout']
+                message += f"└─ 📦 `{packets:.0f} pkt/s` · errores `{errors:.1f}/s` · descartes `{drops:.1f}/s`\n"
+                usage = self.net_monitor.utilization(iface, now_rates)
+                if usage is not None:
+                    message += f"└─ {self._generate_progress_bar(min(usage, 100))} {usage:.1f}% del enlace\n"
+            message += "\n"
+
+        message += "_Usa /net conns para ver conexiones por proceso_"
+        return message
+
+    async def _render_net_connections(self) -> str:
+        """Resumen de conexiones por proceso (se calcula fuera del event loop)"""
+        import psutil
+        from models.net_monitor import NetworkMonitor
+        names = {row['pid']: row['name'] for row in self.process_table.rows()}
+        try:
+            summary = await run_blocking('net_connections', NetworkMonitor.connections_by_process, names)
+        except psutil.AccessDenied:
+            return "❌ Se requieren permisos de administrador para ver las conexiones"
+
+        if not summary:
+            return "🔌 No hay conexiones activas"
+
+        message = "🔌 *Conexiones por Proceso*\n\n"
+        for entry in summary:
+            pid = entry['pid'] if entry['pid'] else '-'
+            established = entry['states'].get(psutil.CONN_ESTABLISHED, 0)
+            message += f"⚙️ *{self._escape_code(entry['name'])}* (`{pid}`): `{entry['total']}` conexiones, `{established}` establecidas\n"
+            if entry['listen']:
+                ports = ', '.join(str(port) for port in sorted(entry['listen'])[:8])
+                message += f"└─ Escuchando: `{ports}`\n"
+            for ip, count in entry['remotes'].most_common(3):
+                message += f"└─ ↔️ `{ip}` ({count})\n"
+        return message
 
     @validate_access
+    @requires_monitoring
     async def disk_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
-            message = "💾 *Almacenamiento del Sistema*\n\n"
-            
-            for partition in psutil.disk_partitions():
-                try:
-                    usage = psutil.disk_usage(partition.mountpoint)
-                    # Calcular porcentaje usado para la barra de progreso
-                    used_percent = usage.percent
-                    progress_bar = self._generate_progress_bar(used_percent)
-                    
-                    message += f"📂 *{partition.mountpoint}*\n"
-                    message += f"└─ Tipo: `{partition.fstype}`\n"
-                    message += f"└─ {progress_bar} {used_percent}%\n"
-                    
-                    # Convertir tamaños a la unidad más apropiada
-                    total = self._format_size(usage.total)
-                    used = self._format_size(usage.used)
-                    free = self._format_size(usage.free)
-                    
-                    message += f"└─ Total: `{total}`\n"
-                    message += f"└─ Usado: `{used}`\n"
-                    message += f"└─ Libre: `{free}`\n\n"
-                except Exception:
-                    continue
-
-            await update.message.reply_text(message, parse_mode='Markdown')
+            message = await self.response_cache.get(('disk',), self._render_disk)
+            await self.send_message_with_retry(update.message, message, parse_mode='Markdown')
         except Exception as e:
-            await update.message.reply_text(f"❌ Error obteniendo información de disco: {str(e)}")
+            await self.send_message_with_retry(update.message, f"❌ Error obteniendo información de disco: {str(e)}")
+
+    async def _render_disk(self) -> str:
+        partitions = self.disk_monitor.partitions()
+        # La consulta espera como máximo DISK_PROBE_TIMEOUT aunque haya montajes colgados
+        usages = await run_blocking(
+            'disk_probe', self.disk_monitor.probe, [mountpoint for mountpoint, _, _ in partitions]
+        )
+
+        message = "💾 *Almacenamiento del Sistema*\n\n"
+
+        for mountpoint, _, fstype in partitions:
+            if mountpoint not in usages:
+                continue
+            usage = usages[mountpoint]
+            message += f"📂 `{mountpoint}`\n"
+            message += f"└─ Tipo: `{fstype}`\n"
+            if usage is None:
+                message += "└─ ⛔ No responde\n\n"
+                continue
+
+            # Calcular porcentaje usado para la barra de progreso
+            used_percent = usage['percent']
+            progress_bar = self._generate_progress_bar(used_percent)
+            message += f"└─ {progress_bar} {used_percent:.1f}%\n"
+
+            # Convertir tamaños a la unidad más apropiada
+            total = self._format_size(usage['total'])
+            used = self._format_size(usage['used'])
+            free = self._format_size(usage['free'])
+
+            message += f"└─ Total: `{total}`\n"
+            message += f"└─ Usado: `{used}`\n"
+            message += f"└─ Libre: `{free}`\n"
+            if usage['inodes_total']:
+                message += (
+                    f"└─ Inodos: `{usage['inodes_used']:,}` / `{usage['inodes_total']:,}` "
+                    f"({usage['inodes_percent']:.1f}%)\n"
+                )
+            message += "\n"
+
+        rates = self.disk_monitor.rates()
+        rates_1m = self.disk_monitor.rates(60)
+        active = []
+        for disk, disk_rates in sorted(rates.items()):
+            recent = rates_1m.get(disk, disk_rates)
+            # Omitir dispositivos sin actividad en el último minuto
+            if recent['read_iops'] or recent['write_iops']:
+                active.append((disk, disk_rates, recent))
+        if active:
+            message += "📀 *E/S por Dispositivo*\n\n"
+            for disk, disk_rates, recent in active:
+                message += f"`{disk}` {self._generate_progress_bar(disk_rates['busy'])} {disk_rates['busy']:.0f}%\n"
+                message += (
+                    f"└─ 📖 `{self._format_size(disk_rates['read_bytes'])}/s` "
+                    f"({disk_rates['read_iops']:.0f} IOPS)\n"
+                )
+                message += (
+                    f"└─ ✏️ `{self._format_size(disk_rates['write_bytes'])}/s` "
+                    f"({disk_rates['write_iops']:.0f} IOPS)\n"
+                )
+                message += f"└─ ⏱ Latencia: `{disk_rates['latency']:.1f} ms/op`\n"
+                message += f"└─ 1m: `{self._format_size(recent['read_bytes'] + recent['write_bytes'])}/s`\n\n"
+        return message
 
     def _generate_progress_bar(self, percent, length=10):
         filled = int(percent / 100 * length)
         empty = length - filled
         return f"[{'■' * filled}{'□' * empty}]"
 
+    def _history_average(self, metric, window):
+        points = self.metrics_history.query(metric, window, time.time())
+        if not points:
+            return "-"
+        return self._metric_formatter(metric)(sum(value for _, value in points) / len(points))
+
+    def _generate_sparkline(self, values, width=40):
+        """Reduce la serie a 'width' columnas promediando y la dibuja con bloques"""
+        blocks = "▁▂▃▄▅▆▇█"
+        if len(values) > width:
+            step = len(values) / width
+            values = [
+                sum(chunk) / len(chunk)
+                for chunk in (values[int(i * step):int((i + 1) * step)] for i in range(width))
+                if chunk
+            ]
+        low, high = min(values), max(values)
+        span = (high - low) or 1
+        return ''.join(blocks[int((value - low) / span * (len(blocks) - 1))] for value in values)
+
+    def _metric_formatter(self, metric):
+        if metric in ('net_sent', 'net_recv'):
+            return lambda value: f"{self._format_size(value)}/s"
+        if metric == 'load':
+            return lambda value: f"{value:.2f}"
+        return lambda value: f"{value:.1f}%"
+
+    def _parse_duration(self, text):
+        """Convierte '30s', '15m', '6h' o '7d' a segundos (None si no es válido, nulo, negativo o infinito)"""
+        units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+        try:
+            if text[-1].lower() in units:
+                seconds = float(text[:-1]) * units[text[-1].lower()]
+            else:
+                seconds = float(text)
+        except (ValueError, IndexError):
+            return None
+        return seconds if math.isfinite(seconds) and seconds > 0 else None
+
     def _format_size(self, size):
         for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
             if size < 1024:
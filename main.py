@@ -1,20 +1,70 @@
+import time
+_START = time.perf_counter()  # Referencia para medir el tiempo hasta recibir actualizaciones
+
 import asyncio
 import os
 import sys
 import telegram
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackQueryHandler
 from controllers.bot_controller import BotController
-from config.config import TELEGRAM_TOKEN
+from config.config import (
+    TELEGRAM_TOKEN, TELEGRAM_API_URL, HTTP_VERSION, HTTP_POOL_SIZE, HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT, HTTP_WRITE_TIMEOUT, HTTP_POOL_TIMEOUT,
+    WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_SECRET, METRICS_PORT, FLEET_LISTEN
+)
 from utils.logger import logger
+from urllib.parse import urlparse
 from concurrent.futures import ThreadPoolExecutor
 
+ALLOWED_UPDATES = ['message', 'callback_query']
+
 async def start_bot(application, bot_controller):
     """Inicia el bot y envía el mensaje de bienvenida"""
+    metrics_exporter = None
+    fleet_hub = None
     try:
+        # Todos los envíos a Telegram pasan por la cola de salida
+        bot_controller.send_queue.start()
+        bot_controller.loop_monitor.start()
+        bot_controller.loop_watchdog.start()
+
         # Iniciar el bot
         await application.initialize()
         await application.start()
-        await application.updater.start_polling(drop_pending_updates=True, allowed_updates=['message', 'callback_query'])
+        if WEBHOOK_URL:
+            # Telegram entrega cada actualización al instante; no hay tráfico de polling en reposo
+            await application.updater.start_webhook(
+                listen=WEBHOOK_LISTEN,
+                port=WEBHOOK_PORT,
+                url_path=urlparse(WEBHOOK_URL).path.lstrip('/'),
+                webhook_url=WEBHOOK_URL,
+                secret_token=WEBHOOK_SECRET,
+                drop_pending_updates=True,
+                allowed_updates=ALLOWED_UPDATES
+            )
+            logger.info(f"Recibiendo actualizaciones por webhook en {WEBHOOK_LISTEN}:{WEBHOOK_PORT}")
+        else:
+            await application.updater.start_polling(drop_pending_updates=True, allowed_updates=ALLOWED_UPDATES)
+        logger.info(f"Recibiendo actualizaciones a los {(time.perf_counter() - _START) * 1000:.0f} ms del arranque")
+
+        # Iniciar el planificador de comandos
+        await bot_controller.job_scheduler.start()
+
+        # Endpoint /metrics opcional para Prometheus
+        if METRICS_PORT:
+            from models.metrics_exporter import MetricsExporter
+            metrics_exporter = MetricsExporter()
+            await metrics_exporter.start()
+
+        # El monitoreo (psutil, historial persistido y alertas) se inicia con el bot ya escuchando
+        await bot_controller.start_monitoring()
+
+        # Hub de la flota: los agentes de otras máquinas se conectan aquí
+        if FLEET_LISTEN:
+            from models.fleet_hub import FleetHub
+            fleet_hub = FleetHub(bot_controller._on_fleet_alerts, bot_controller._on_fleet_host_state)
+            await fleet_hub.start()
+            bot_controller.fleet = fleet_hub
 
         # Inicializar sistema de alertas
         await bot_controller.setup_alert_check(application.bot)
@@ -38,10 +88,42 @@ async def start_bot(application, bot_controller):
         # Asegurar limpieza al terminar
         if bot_controller._alert_check_task:
             bot_controller._alert_check_task.cancel()
+        if metrics_exporter is not None:
+            await metrics_exporter.stop()
+        if fleet_hub is not None:
+            await fleet_hub.stop()
+        bot_controller.stop_monitoring()
+        await bot_controller.job_scheduler.stop()
+        await bot_controller.command_executor.close()
+        await bot_controller.sessions.close()
+        await bot_controller.send_queue.stop()
+        await bot_controller.loop_monitor.stop()
+        await bot_controller.loop_watchdog.stop()
         await application.updater.stop()
         await application.stop()
         await application.shutdown()
 
+def build_application():
+    """Crea la aplicación con el pool de conexiones y los tiempos de espera configurados"""
+    builder = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        # Las actualizaciones se procesan en paralelo para que /kill no espere al comando en curso
+        .concurrent_updates(True)
+        .http_version(HTTP_VERSION)
+        .connection_pool_size(HTTP_POOL_SIZE)
+        .connect_timeout(HTTP_CONNECT_TIMEOUT)
+        .read_timeout(HTTP_READ_TIMEOUT)
+        .write_timeout(HTTP_WRITE_TIMEOUT)
+        .pool_timeout(HTTP_POOL_TIMEOUT)
+        # getUpdates usa su propia conexión, ocupada durante todo el long polling
+        .get_updates_http_version(HTTP_VERSION)
+        .get_updates_connection_pool_size(1)
+    )
+    if TELEGRAM_API_URL:
+        builder = builder.base_url(f"{TELEGRAM_API_URL}/bot").base_file_url(f"{TELEGRAM_API_URL}/file/bot")
+    return builder.build()
+
 def check_single_instance():
     """Verifica que solo haya una instancia del bot corriendo"""
     pid_file = '/tmp/telegram_bot.pid'
@@ -63,32 +145,47 @@ def cleanup():
     except:
         pass
 
+def register_handlers(application, bot_controller):
+    """Registra los comandos, botones y mensajes del bot"""
+    # Registrar manejadores básicos
+    application.add_handler(CommandHandler("start", bot_controller.start))
+    application.add_handler(CommandHandler("run", bot_controller.run_commands))
+    application.add_handler(CommandHandler("exit", bot_controller.exit_commands))
+    application.add_handler(CommandHandler("kill", bot_controller.kill_command))
+    application.add_handler(CommandHandler("jobs", bot_controller.jobs_command))
+    application.add_handler(CommandHandler("job", bot_controller.job_command))
+    application.add_handler(CommandHandler("runall", bot_controller.runall_command))
+    application.add_handler(CommandHandler("info", bot_controller.info_system))
+    
+    # Registrar comandos de monitoreo
+    application.add_handler(CommandHandler("ps", bot_controller.ps_command))
+    application.add_handler(CommandHandler("net", bot_controller.net_command))
+    application.add_handler(CommandHandler("disk", bot_controller.disk_command))
+    application.add_handler(CommandHandler("graph", bot_controller.graph_command))
+    application.add_handler(CommandHandler("stats", bot_controller.stats_command))
+    application.add_handler(CommandHandler("hosts", bot_controller.hosts_command))
+    
+    # Registrar comandos de alertas
+    application.add_handler(CommandHandler("alerts", bot_controller.alerts))
+    application.add_handler(CommandHandler("threshold", bot_controller.threshold))
+    application.add_handler(CommandHandler("rule", bot_controller.rule_command))
+    application.add_handler(CommandHandler("watch", bot_controller.watch_command))
+    application.add_handler(CommandHandler("unwatch", bot_controller.unwatch_command))
+    application.add_handler(CallbackQueryHandler(bot_controller.handle_page_callback, pattern="^page_"))
+    application.add_handler(CallbackQueryHandler(bot_controller.handle_alert_callback, pattern="^alert_"))
+    application.add_handler(CallbackQueryHandler(bot_controller.handle_runall_callback, pattern="^runall_"))
+    
+    # Manejador de mensajes para comandos de terminal
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, bot_controller.handle_message))
+
 def main():
     try:
         # Inicializar el controlador del bot
         bot_controller = BotController()
 
         # Crear la aplicación
-        application = Application.builder().token(TELEGRAM_TOKEN).build()
-
-        # Registrar manejadores básicos
-        application.add_handler(CommandHandler("start", bot_controller.start))
-        application.add_handler(CommandHandler("run", bot_controller.run_commands))
-        application.add_handler(CommandHandler("exit", bot_controller.exit_commands))
-        application.add_handler(CommandHandler("info", bot_controller.info_system))
-        
-        # Registrar comandos de monitoreo
-        application.add_handler(CommandHandler("ps", bot_controller.ps_command))
-        application.add_handler(CommandHandler("net", bot_controller.net_command))
-        application.add_handler(CommandHandler("disk", bot_controller.disk_command))
-        
-        # Registrar comandos de alertas
-        application.add_handler(CommandHandler("alerts", bot_controller.alerts))
-        application.add_handler(CommandHandler("threshold", bot_controller.threshold))
-        application.add_handler(CallbackQueryHandler(bot_controller.handle_alert_callback))
-        
-        # Manejador de mensajes para comandos de terminal
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, bot_controller.handle_message))
+        application = build_application()
+        register_handlers(application, bot_controller)
 
         # Iniciar el bot de forma asíncrona
         asyncio.run(start_bot(application, bot_controller))
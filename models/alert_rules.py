@@ -0,0 +1,98 @@
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+RULE_MODES = ('value', 'ewma', 'rate')
+
+@dataclass
+class AlertRule:
+    """
+    Regla evaluada incrementalmente sobre cada muestra. Se dispara cuando el valor
+    supera fire_level durante al menos 'duration' segundos y se resuelve cuando
+    baja de clear_level (histéresis).
+
+    Modos:
+    - value: valor de la muestra
+    - ewma: media móvil exponencial con factor alpha
+    - rate: variación en puntos por minuto
+    """
+    metric: str
+    fire_level: float
+    clear_level: float
+    duration: float = 0.0
+    mode: str = 'value'
+    alpha: float = 0.3
+    firing: bool = False
+    last_value: Optional[float] = None
+    _above_since: Optional[float] = field(default=None, repr=False)
+    _ewma: Optional[float] = field(default=None, repr=False)
+    _previous: Optional[Tuple[float, float]] = field(default=None, repr=False)
+
+    def configure(self, fire_level: float, clear_level: Optional[float] = None,
+                  duration: Optional[float] = None, mode: Optional[str] = None,
+                  alpha: Optional[float] = None):
+        """Actualiza los parámetros; el estado se reinicia si cambia el modo"""
+        if mode is not None and mode != self.mode:
+            self.mode = mode
+            self.reset()
+        self.fire_level = fire_level
+        self.clear_level = min(clear_level if clear_level is not None else self.clear_level, fire_level)
+        if duration is not None:
+            self.duration = duration
+        if alpha is not None:
+            self.alpha = alpha
+
+    def reset(self):
+        self.firing = False
+        self.last_value = None
+        self._above_since = None
+        self._ewma = None
+        self._previous = None
+
+    def update(self, timestamp: float, value: float) -> Optional[str]:
+        """Procesa una muestra y retorna 'fire', 'clear' o None"""
+        value = self._transform(timestamp, value)
+        if value is None:
+            return None
+        self.last_value = value
+
+        if self.firing:
+            if value < self.clear_level:
+                self.firing = False
+                self._above_since = None
+                return 'clear'
+            return None
+
+        if value > self.fire_level:
+            if self._above_since is None:
+                self._above_since = timestamp
+            if timestamp - self._above_since >= self.duration:
+                self.firing = True
+                return 'fire'
+        else:
+            self._above_since = None
+        return None
+
+    def sustained_for(self, timestamp: float) -> float:
+        """Segundos que lleva el valor sobre el umbral"""
+        return timestamp - self._above_since if self._above_since is not None else 0.0
+
+    def describe(self) -> str:
+        text = f"{self.fire_level:g} / {self.clear_level:g}"
+        if self.duration:
+            text += f" durante {self.duration:g}s"
+        if self.mode == 'ewma':
+            text += f" (ewma α={self.alpha:g})"
+        elif self.mode == 'rate':
+            text += " (puntos/min)"
+        return text
+
+    def _transform(self, timestamp: float, value: float) -> Optional[float]:
+        if self.mode == 'ewma':
+            self._ewma = value if self._ewma is None else self.alpha * value + (1 - self.alpha) * self._ewma
+            return self._ewma
+        if self.mode == 'rate':
+            previous, self._previous = self._previous, (timestamp, value)
+            if previous is None or timestamp <= previous[0]:
+                return None
+            return (value - previous[1]) / (timestamp - previous[0]) * 60
+        return value
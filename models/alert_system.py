@@ -1,9 +1,15 @@
+import re
+import threading
 from dataclasses import dataclass
 from datetime import datetime
-import psutil
-from typing import Dict, Optional
-from config.config import TELEGRAM_GROUP
-from utils.logger import logger
+from typing import Dict, List, Optional
+from config.config import TELEGRAM_GROUP, ALERT_RULES, LOOP_WATCHDOG_ALERT
+from models.alert_rules import AlertRule, RULE_MODES
+from models.alert_targets import TargetMonitor, ProcessTarget, UnitTarget, MountTarget, TARGET_KINDS
+from models.metrics_sampler import MetricsSampler, MetricsSnapshot
+from models.process_table import ProcessTable
+from models.net_monitor import NetworkMonitor
+from models.disk_monitor import DiskMonitor
 
 @dataclass
 class Alert:
@@ -13,22 +19,60 @@ class Alert:
     severity: str  # 'info', 'warning', 'danger'
     source: str
 
+RESOURCE_LABELS = {
+    'cpu': ('🔥', 'CPU'),
+    'memory': ('💾', 'Memoria'),
+    'disk': ('💿', 'Disco'),
+    'network': ('🌐', 'Red'),
+    'disk_io': ('📀', 'E/S de disco')
+}
+
+# Nombres de cada tipo de alerta en /alerts (las claves llevan '_', que Markdown tomaría como cursiva)
+ALERT_TYPE_LABELS = {
+    'security': ('🔒', 'Seguridad'),
+    **RESOURCE_LABELS,
+    'process': ('⚙️', 'Procesos'),
+    'unit': ('🧩', 'Servicios'),
+    'mount': ('📂', 'Particiones'),
+    'watchdog': ('🐢', 'Bloqueos del bot'),
+    'fleet': ('🖧', 'Flota'),
+    'logs': ('📜', 'Logs')
+}
+
 class AlertSystem:
-    def __init__(self):
+    def __init__(self, sampler: MetricsSampler, process_table: ProcessTable, net_monitor: NetworkMonitor,
+                 disk_monitor: DiskMonitor):
+        self.sampler = sampler
+        self.net_monitor = net_monitor
+        self.disk_monitor = disk_monitor
+        self._lock = threading.Lock()
         self._alerts_enabled = {
             'security': True,
             'cpu': True,
             'memory': True,
-            'disk': True
+            'disk': True,
+            'network': True,
+            'disk_io': True,
+            'process': True,
+            'unit': True,
+            'mount': True,
+            'watchdog': LOOP_WATCHDOG_ALERT,
+            'fleet': True,
+            'logs': True
         }
-        self._thresholds = {
-            'cpu': 80.0,
-            'memory': 80.0,
-            'disk': 80.0
+        self._rules: Dict[str, AlertRule] = {
+            resource: AlertRule(resource, fire_level, clear_level, duration)
+            for resource, (fire_level, clear_level, duration) in ALERT_RULES.items()
         }
+        self.targets = TargetMonitor(process_table, disk_monitor, mount_threshold=self._rules['disk'].fire_level)
+        self._notified: Dict[str, bool] = {}  # Reglas cuya alerta de disparo fue enviada
+        self._pending: List[Alert] = []
         self._last_alert_time: Dict[str, datetime] = {}
         self._alert_cooldown = 300  # 5 minutos entre alertas del mismo tipo
 
+        # Las reglas se evalúan con cada muestra, no solo cuando se consultan
+        self.sampler.add_listener(self.process_snapshot)
+
     def toggle_alert(self, alert_type: str, enabled: bool) -> bool:
         """Activa o desactiva un tipo de alerta específico"""
         if alert_type in self._alerts_enabled:
@@ -40,12 +84,82 @@ class AlertSystem:
         """Obtiene el estado actual de todas las alertas"""
         return self._alerts_enabled.copy()
 
-    def set_threshold(self, resource: str, value: float) -> bool:
-        """Establece el umbral para un recurso específico"""
-        if resource in self._thresholds and 0 <= value <= 100:
-            self._thresholds[resource] = value
-            return True
-        return False
+    def set_threshold(self, resource: str, value: float, clear_value: Optional[float] = None,
+                      duration: Optional[float] = None) -> bool:
+        """
+        Establece el umbral de disparo de un recurso y, opcionalmente, el de
+        recuperación y los segundos que debe mantenerse superado
+        """
+        rule = self._rules.get(resource)
+        if rule is None or not 0 <= value <= 100:
+            return False
+        if clear_value is not None and not 0 <= clear_value <= value:
+            return False
+        if duration is not None and duration < 0:
+            return False
+
+        with self._lock:
+            if clear_value is None:
+                # Mantener la misma separación entre disparo y recuperación
+                clear_value = max(0.0, value - (rule.fire_level - rule.clear_level))
+            rule.configure(value, clear_value, duration)
+        return True
+
+    def set_rule_mode(self, resource: str, mode: str, alpha: Optional[float] = None) -> bool:
+        """Cambia cómo se evalúa la regla de un recurso (value, ewma o rate)"""
+        rule = self._rules.get(resource)
+        if rule is None or mode not in RULE_MODES:
+            return False
+        if alpha is not None and not 0 < alpha <= 1:
+            return False
+        with self._lock:
+            rule.configure(rule.fire_level, rule.clear_level, mode=mode, alpha=alpha)
+            self._notified[resource] = False
+        return True
+
+    def get_rules(self) -> Dict[str, AlertRule]:
+        """Obtiene las reglas de alerta por recurso"""
+        return dict(self._rules)
+
+    def add_process_target(self, name: str, pattern: str, cpu_threshold: Optional[float] = None,
+                           memory_threshold: Optional[float] = None) -> bool:
+        """Vigila los procesos que coinciden con la expresión regular"""
+        for threshold in (cpu_threshold, memory_threshold):
+            if threshold is not None and threshold < 0:
+                return False
+        try:
+            target = ProcessTarget(name, pattern, cpu_threshold, memory_threshold)
+        except re.error:
+            return False
+        self.targets.add_target('process', target)
+        return True
+
+    def add_unit_target(self, name: str) -> bool:
+        """Vigila que una unidad de systemd esté activa"""
+        self.targets.add_target('unit', UnitTarget(name))
+        return True
+
+    def add_mount_target(self, mountpoint: str, threshold: float) -> bool:
+        """Fija un umbral propio para un punto de montaje"""
+        if not 0 <= threshold <= 100:
+            return False
+        self.targets.add_target('mount', MountTarget(mountpoint, threshold))
+        return True
+
+    def remove_target(self, name: str) -> bool:
+        return self.targets.remove_target(name)
+
+    def list_targets(self) -> List[tuple]:
+        """Objetivos vigilados como tuplas (tipo, objetivo, disparada)"""
+        return [
+            (kind, target, self.targets.is_firing(kind, target.name))
+            for kind, target in self.targets.list_targets()
+        ]
+
+    def restore_last_alerts(self, last_alert_times: Dict[str, float]):
+        """Restaura los tiempos de enfriamiento guardados antes de un reinicio"""
+        for alert_type, timestamp in last_alert_times.items():
+            self._last_alert_time[alert_type] = datetime.fromtimestamp(timestamp)
 
     def _can_send_alert(self, alert_type: str) -> bool:
         """Verifica si se puede enviar una alerta basado en el cooldown"""
@@ -72,48 +186,138 @@ class AlertSystem:
             )
         return None
 
-    def check_system_resources(self) -> Optional[Alert]:
-        """Verifica los recursos del sistema y genera alertas si es necesario"""
-        alerts = []
-        now = datetime.now()
+    def report_blocked_loop(self, duration: float, stack: str):
+        """Encola una alerta por un bloqueo del event loop detectado por el watchdog (cualquier hilo)"""
+        with self._lock:
+            if not self._alerts_enabled['watchdog'] or not self._can_send_alert('watchdog'):
+                return
+            self._last_alert_time['watchdog'] = datetime.now()
+            # Telegram corta los mensajes largos: se conservan los marcos más internos
+            stack = stack.replace('`', "'")[-2500:]
+            self._pending.append(Alert(
+                type='watchdog',
+                message=f"🐢 *Event loop bloqueado*\nDuración: al menos `{duration:.2f}s`\n```\n{stack}\n```",
+                timestamp=datetime.now(),
+                severity='warning',
+                source='loop_watchdog'
+            ))
 
-        # CPU
-        if self._alerts_enabled['cpu'] and self._can_send_alert('cpu'):
-            cpu_percent = psutil.cpu_percent(interval=1)
-            if cpu_percent > self._thresholds['cpu']:
-                self._last_alert_time['cpu'] = now
-                alerts.append(Alert(
-                    type='cpu',
-                    message=f"🔥 *Alerta de CPU*\nUso actual: `{cpu_percent:.1f}%`\nUmbral: `{self._thresholds['cpu']}%`",
-                    timestamp=now,
-                    severity='warning',
-                    source='system_monitor'
-                ))
+    def report_log_alert(self, alert_type: str, severity: str, message: str, source: str):
+        """Encola una alerta de la vigilancia de logs (desde su hilo); LogWatcher ya agrupó las repeticiones"""
+        with self._lock:
+            if not self._alerts_enabled['logs'] or not self._alerts_enabled.get(alert_type, True):
+                return
+            self._pending.append(Alert(
+                type=alert_type,
+                message=message,
+                timestamp=datetime.now(),
+                severity=severity,
+                source=source
+            ))
 
-        # Memoria
-        if self._alerts_enabled['memory'] and self._can_send_alert('memory'):
-            memory = psutil.virtual_memory()
-            if memory.percent > self._thresholds['memory']:
-                self._last_alert_time['memory'] = now
-                alerts.append(Alert(
-                    type='memory',
-                    message=f"💾 *Alerta de Memoria*\nUso actual: `{memory.percent:.1f}%`\nUmbral: `{self._thresholds['memory']}%`",
-                    timestamp=now,
-                    severity='warning',
-                    source='system_monitor'
+    def report_remote_alerts(self, host: str, alerts: List[dict]):
+        """Encola las alertas que envió un agente de la flota; el agente ya aplicó sus umbrales y enfriamientos"""
+        with self._lock:
+            if not self._alerts_enabled['fleet']:
+                return
+            for item in alerts:
+                self._pending.append(Alert(
+                    type=str(item.get('type', 'fleet')),
+                    message=f"🖥️ `{host}`\n{item.get('message', '')}",
+                    timestamp=datetime.fromtimestamp(item.get('timestamp') or datetime.now().timestamp()),
+                    severity=item.get('severity', 'warning'),
+                    source=f"fleet:{host}"
                 ))
 
-        # Disco
-        if self._alerts_enabled['disk'] and self._can_send_alert('disk'):
-            disk = psutil.disk_usage('/')
-            if disk.percent > self._thresholds['disk']:
-                self._last_alert_time['disk'] = now
-                alerts.append(Alert(
-                    type='disk',
-                    message=f"💿 *Alerta de Disco*\nUso actual: `{disk.percent:.1f}%`\nUmbral: `{self._thresholds['disk']}%`",
-                    timestamp=now,
-                    severity='warning',
-                    source='system_monitor'
-                ))
+    def report_host_state(self, host: str, online: bool, last_seen: Optional[float]):
+        """Encola el aviso de un agente que dejó de enviar datos o que volvió a conectarse"""
+        seen = datetime.fromtimestamp(last_seen).strftime('%Y-%m-%d %H:%M:%S') if last_seen else '-'
+        if online:
+            alert = Alert(
+                type='fleet',
+                message=f"✅ *Host reconectado*\nHost: `{host}`",
+                timestamp=datetime.now(),
+                severity='info',
+                source=f"fleet:{host}"
+            )
+        else:
+            alert = Alert(
+                type='fleet',
+                message=f"🔌 *Host sin conexión*\nHost: `{host}`\nÚltimo dato: `{seen}`",
+                timestamp=datetime.now(),
+                severity='danger',
+                source=f"fleet:{host}"
+            )
+        with self._lock:
+            if self._alerts_enabled['fleet']:
+                self._pending.append(alert)
+
+    def process_snapshot(self, snapshot: MetricsSnapshot):
+        """Evalúa las reglas con una nueva muestra y encola las alertas resultantes"""
+        values = {
+            'cpu': snapshot.cpu_percent,
+            'memory': snapshot.memory_percent,
+            'disk': snapshot.disk_percent,
+            'network': self.net_monitor.max_utilization(),
+            'disk_io': self.disk_monitor.max_busy()
+        }
+        with self._lock:
+            for resource, rule in self._rules.items():
+                event = rule.update(snapshot.timestamp, values[resource])
+                if event == 'fire':
+                    sustained = rule.sustained_for(snapshot.timestamp)
+                    if self._alerts_enabled[resource] and self._can_send_alert(resource):
+                        self._last_alert_time[resource] = datetime.now()
+                        self._notified[resource] = True
+                        self._pending.append(self._build_alert(resource, rule, values[resource], sustained))
+                    else:
+                        self._notified[resource] = False
+                elif event == 'clear' and self._notified.get(resource):
+                    self._notified[resource] = False
+                    self._pending.append(self._build_resolved_alert(resource, rule, values[resource]))
+
+        # Procesos, servicios y particiones; la tabla de procesos ya se actualizó en este tick
+        self.targets.mount_threshold = self._rules['disk'].fire_level
+        enabled = {kind: self._alerts_enabled[kind] for kind in TARGET_KINDS}
+        alerts = [
+            Alert(type=kind, message=message, timestamp=datetime.now(), severity=severity, source=source)
+            for kind, source, severity, message in self.targets.evaluate(snapshot.timestamp, enabled)
+        ]
+        if alerts:
+            with self._lock:
+                self._pending.extend(alerts)
+
+    def check_system_resources(self) -> List[Alert]:
+        """Retorna todas las alertas generadas por las reglas desde la última consulta"""
+        with self._lock:
+            alerts, self._pending = self._pending, []
+        return alerts
+
+    def _build_alert(self, resource: str, rule: AlertRule, value: float, sustained: float) -> Alert:
+        emoji, label = RESOURCE_LABELS[resource]
+        message = f"{emoji} *Alerta de {label}*\nUso actual: `{value:.1f}%`\n"
+        if rule.mode != 'value':
+            message += f"Valor evaluado ({rule.mode}): `{rule.last_value:.1f}`\n"
+        if sustained:
+            message += f"Sostenido: `{sustained:.0f}s`\n"
+        message += f"Umbral: `{rule.fire_level}%`"
+        return Alert(
+            type=resource,
+            message=message,
+            timestamp=datetime.now(),
+            severity='warning',
+            source='system_monitor'
+        )
 
-        return alerts[0] if alerts else None  # Retorna la primera alerta si hay alguna
+    def _build_resolved_alert(self, resource: str, rule: AlertRule, value: float) -> Alert:
+        _, label = RESOURCE_LABELS[resource]
+        return Alert(
+            type=resource,
+            message=(
+                f"✅ *{label} normalizado*\nUso actual: `{value:.1f}%`\n"
+                f"Umbral de recuperación: `{rule.clear_level}%`"
+            ),
+            timestamp=datetime.now(),
+            severity='info',
+            source='system_monitor'
+        )
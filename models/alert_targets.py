@@ -0,0 +1,258 @@
+import re
+import subprocess
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from config.config import TARGET_COOLDOWN, UNIT_CHECK_INTERVAL, DISK_INODE_THRESHOLD
+from models.alert_rules import AlertRule
+from models.disk_monitor import DiskMonitor
+from models.process_table import ProcessTable
+from utils.logger import logger
+
+TARGET_KINDS = ('process', 'unit', 'mount')
+
+@dataclass
+class ProcessTarget:
+    """Procesos cuyo nombre o línea de comando coinciden con una expresión regular"""
+    name: str
+    pattern: str
+    cpu_threshold: Optional[float] = None
+    memory_threshold: Optional[float] = None
+    cooldown: float = TARGET_COOLDOWN
+    _regex: re.Pattern = field(default=None, repr=False)
+
+    def __post_init__(self):
+        self._regex = re.compile(self.pattern)
+
+    def matches(self, row: dict) -> bool:
+        return bool(self._regex.search(row['name']) or self._regex.search(row['cmdline']))
+
+    def describe(self) -> str:
+        text = f"/{self.pattern}/"
+        if self.cpu_threshold is not None:
+            text += f" CPU>{self.cpu_threshold:g}%"
+        if self.memory_threshold is not None:
+            text += f" MEM>{self.memory_threshold:g}%"
+        return text
+
+@dataclass
+class UnitTarget:
+    """Unidad de systemd que debe estar activa"""
+    name: str
+    cooldown: float = TARGET_COOLDOWN
+
+    def describe(self) -> str:
+        return self.name
+
+@dataclass
+class MountTarget:
+    """Punto de montaje con su propio umbral de uso"""
+    name: str
+    threshold: float
+    cooldown: float = TARGET_COOLDOWN
+
+    def describe(self) -> str:
+        return f"{self.name} >{self.threshold:g}%"
+
+class TargetMonitor:
+    """
+    Evalúa alertas de procesos, unidades de systemd y puntos de montaje. Las
+    reglas de proceso leen la ProcessTable ya actualizada en el tick, sin
+    recorrer /proc por su cuenta. Los puntos de montaje se consultan a través del
+    DiskMonitor, con límite de tiempo.
+    """
+
+    def __init__(self, process_table: ProcessTable, disk_monitor: DiskMonitor, mount_threshold: float = 80.0):
+        self.process_table = process_table
+        self.disk_monitor = disk_monitor
+        self._lock = threading.Lock()
+        self._targets: Dict[Tuple[str, str], object] = {}
+        self._rules: Dict[str, AlertRule] = {}
+        self._last_alert: Dict[str, float] = {}
+        self._notified: Dict[str, bool] = {}
+        self.mount_threshold = mount_threshold
+        self._unit_states: Dict[str, str] = {}
+        self._last_unit_check = 0.0
+
+    def add_target(self, kind: str, target) -> None:
+        with self._lock:
+            self._targets[(kind, target.name)] = target
+            # Reiniciar el estado de las reglas del objetivo
+            self._forget(kind, target.name)
+            if kind == 'unit':
+                self._last_unit_check = 0.0
+
+    def remove_target(self, name: str) -> bool:
+        with self._lock:
+            removed = [key for key in self._targets if key[1] == name]
+            for key in removed:
+                del self._targets[key]
+                self._forget(*key)
+        return bool(removed)
+
+    def _forget(self, kind: str, name: str):
+        """Descarta reglas, avisos y enfriamientos del objetivo (con _lock tomado)"""
+        prefix = f"{kind}:{name}:"
+        for state in (self._rules, self._notified, self._last_alert):
+            for key in [key for key in state if key.startswith(prefix)]:
+                del state[key]
+
+    def list_targets(self) -> List[Tuple[str, object]]:
+        """Objetivos configurados, incluidos los puntos de montaje detectados"""
+        with self._lock:
+            targets = list(self._targets.items())
+        configured = {name for (kind, name), _ in targets if kind == 'mount'}
+        for mountpoint, _, _ in self.disk_monitor.partitions():
+            if mountpoint not in configured and mountpoint != '/':
+                targets.append((('mount', mountpoint), MountTarget(mountpoint, self.mount_threshold)))
+        return [(kind, target) for (kind, _), target in targets]
+
+    def is_firing(self, kind: str, name: str) -> bool:
+        # Se consulta desde el event loop mientras el hilo de muestreo agrega reglas
+        with self._lock:
+            return any(
+                rule.firing for key, rule in self._rules.items()
+                if key.startswith(f"{kind}:{name}:")
+            )
+
+    def evaluate(self, timestamp: float, enabled: Dict[str, bool]) -> List[Tuple[str, str, str, str]]:
+        """
+        Toma las mediciones del tick y retorna los eventos generados como
+        tuplas (tipo, origen, severidad, mensaje)
+        """
+        with self._lock:
+            targets = dict(self._targets)
+
+        measurements = []
+        if enabled.get('process'):
+            measurements.extend(self._measure_processes(targets))
+        if enabled.get('unit'):
+            measurements.extend(self._measure_units(targets, timestamp))
+        if enabled.get('mount'):
+            measurements.extend(self._measure_mounts())
+
+        events = []
+        for key, target, fire_level, value, label, detail in measurements:
+            event = self._update_rule(timestamp, key, target, fire_level, value, label, detail)
+            if event:
+                events.append(event)
+        return events
+
+    def _measure_processes(self, targets: dict) -> list:
+        targets = [target for (kind, _), target in targets.items() if kind == 'process']
+        if not targets:
+            return []
+
+        totals = {target.name: [0, 0.0, 0.0] for target in targets}  # procesos, cpu, memoria
+        for row in self.process_table.rows():
+            for target in targets:
+                if target.matches(row):
+                    total = totals[target.name]
+                    total[0] += 1
+                    total[1] += row['cpu_percent'] or 0.0
+                    total[2] += row['memory_percent'] or 0.0
+
+        measurements = []
+        for target in targets:
+            count, cpu, memory = totals[target.name]
+            measurements.append((
+                f"process:{target.name}:missing", target, 0.5, 0.0 if count else 1.0,
+                f"Proceso {target.name}", "⛔ No está en ejecución"
+            ))
+            if target.cpu_threshold is not None and count:
+                measurements.append((
+                    f"process:{target.name}:cpu", target, target.cpu_threshold, cpu,
+                    f"CPU del proceso {target.name}", f"🔥 Uso: `{cpu:.1f}%` ({count} procesos)"
+                ))
+            if target.memory_threshold is not None and count:
+                measurements.append((
+                    f"process:{target.name}:memory", target, target.memory_threshold, memory,
+                    f"Memoria del proceso {target.name}", f"💾 Uso: `{memory:.1f}%` ({count} procesos)"
+                ))
+        return measurements
+
+    def _measure_units(self, targets: dict, timestamp: float) -> list:
+        targets = [target for (kind, _), target in targets.items() if kind == 'unit']
+        if not targets:
+            return []
+
+        # Una sola llamada a systemctl para todas las unidades, con menor frecuencia que el muestreo
+        if timestamp - self._last_unit_check >= UNIT_CHECK_INTERVAL:
+            self._last_unit_check = timestamp
+            names = [target.name for target in targets]
+            try:
+                result = subprocess.run(
+                    ['systemctl', 'is-active', *names],
+                    capture_output=True, text=True, timeout=10
+                )
+                self._unit_states = dict(zip(names, result.stdout.split()))
+            except (OSError, subprocess.TimeoutExpired) as e:
+                logger.error(f"Error consultando unidades de systemd: {e}")
+
+        measurements = []
+        for target in targets:
+            state = self._unit_states.get(target.name)
+            if state is None:
+                continue
+            measurements.append((
+                f"unit:{target.name}:inactive", target, 0.5, 0.0 if state == 'active' else 1.0,
+                f"Servicio {target.name}", f"⛔ Estado: `{state}`"
+            ))
+        return measurements
+
+    def _measure_mounts(self) -> list:
+        targets = [target for kind, target in self.list_targets() if kind == 'mount']
+        if not targets:
+            return []
+
+        usages = self.disk_monitor.probe([target.name for target in targets])
+        measurements = []
+        for target in targets:
+            if target.name not in usages:
+                continue
+            usage = usages[target.name]
+            measurements.append((
+                f"mount:{target.name}:hung", target, 0.5, 0.0 if usage is not None else 1.0,
+                f"Partición {target.name}", f"⛔ No responde en {self.disk_monitor.probe_timeout:g}s"
+            ))
+            if usage is None:
+                continue
+            measurements.append((
+                f"mount:{target.name}:usage", target, target.threshold, usage['percent'],
+                f"Partición {target.name}", f"💿 Uso: `{usage['percent']:.1f}%`"
+            ))
+            if usage['inodes_total']:
+                measurements.append((
+                    f"mount:{target.name}:inodes", target, DISK_INODE_THRESHOLD, usage['inodes_percent'],
+                    f"Inodos de {target.name}", f"🗂 Uso: `{usage['inodes_percent']:.1f}%`"
+                ))
+        return measurements
+
+    def _update_rule(self, timestamp, key, target, fire_level, value, label, detail):
+        # Todo el estado de la regla cambia con _lock: remove_target lo purga desde el event loop
+        with self._lock:
+            kind = key.split(':', 1)[0]
+            if kind != 'mount' and self._targets.get((kind, target.name)) is not target:
+                return None  # Eliminado o reemplazado mientras se medía
+            rule = self._rules.get(key)
+            if rule is None or rule.fire_level != fire_level:
+                # Para estados (0/1) ambos niveles son 0.5; para porcentajes hay 5 puntos de histéresis
+                clear_level = fire_level if fire_level == 0.5 else max(0.0, fire_level - 5)
+                rule = self._rules[key] = AlertRule(key, fire_level, clear_level)
+
+            event = rule.update(timestamp, value)
+            if event == 'fire':
+                last = self._last_alert.get(key)
+                if last is not None and timestamp - last < target.cooldown:
+                    self._notified[key] = False
+                    return None
+                self._last_alert[key] = timestamp
+                self._notified[key] = True
+                message = f"*{label}*\n{detail}"
+                if fire_level != 0.5:
+                    message += f"\nUmbral: `{fire_level:g}%`"
+                return kind, key, 'warning' if fire_level != 0.5 else 'danger', message
+            if event == 'clear' and self._notified.get(key):
+                self._notified[key] = False
+                return kind, key, 'info', f"✅ *{label} normalizado*\n{detail}"
+            return None
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from config.config import SESSION_MAX_ENTRIES, SESSION_STATE_PATH, SESSION_SAVE_DELAY
+from utils.logger import logger
+from utils.metrics import run_blocking
+
+class ChatSession:
+    """Estado de un usuario en un chat: modo terminal y directorio actual"""
+    __slots__ = ('chat_id', 'user_id', 'terminal', 'cwd', 'last_used')
+
+    def __init__(self, chat_id: int, user_id: int, cwd: str, terminal: bool = False, last_used: float = 0.0):
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.cwd = cwd
+        self.terminal = terminal
+        self.last_used = last_used or time.time()
+
+    @property
+    def key(self) -> Tuple[int, int]:
+        return self.chat_id, self.user_id
+
+    def to_dict(self) -> Dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+class SessionRegistry:
+    """
+    Sesiones por (chat, usuario), de modo que el /run o el cd de un
+    administrador no afecten a los demás. Se recuerdan como máximo
+    'max_entries' y se olvida la usada hace más tiempo. Con 'path' el estado
+    se guarda en un archivo JSON, agrupando los cambios de SESSION_SAVE_DELAY
+    segundos en una sola escritura fuera del event loop.
+
+    Solo se usa desde el event loop: cada handler modifica únicamente su
+    propia sesión y no hace falta ningún lock.
+    """
+
+    def __init__(self, default_cwd: Optional[str] = None, max_entries: int = SESSION_MAX_ENTRIES,
+                 path: Optional[str] = SESSION_STATE_PATH):
+        self.default_cwd = default_cwd or os.getcwd()
+        self.max_entries = max_entries
+        self.path = path
+        self._sessions: Dict[Tuple[int, int], ChatSession] = OrderedDict()
+        self._save_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, chat_id: int, user_id: int) -> ChatSession:
+        """Retorna la sesión, creándola si no existe, y la marca como la más reciente"""
+        key = (chat_id, user_id)
+        session = self._sessions.get(key)
+        if session is None:
+            session = self._sessions[key] = ChatSession(chat_id, user_id, self.default_cwd)
+            while len(self._sessions) > self.max_entries:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(key)
+            session.last_used = time.time()
+        return session
+
+    def changed(self):
+        """Programa el guardado tras un cambio; los cambios seguidos se escriben juntos"""
+        if self.path and (self._save_task is None or self._save_task.done()):
+            self._save_task = asyncio.create_task(self._save_later())
+
+    async def _save_later(self):
+        await asyncio.sleep(SESSION_SAVE_DELAY)
+        await self.save()
+
+    async def save(self):
+        # La copia se toma en el event loop; en el hilo solo se escribe el archivo
+        data = [session.to_dict() for session in self._sessions.values()]
+        try:
+            await run_blocking('save_sessions', self._write, data)
+        except OSError as e:
+            logger.error(f"Error guardando las sesiones en {self.path}: {e}")
+
+    def _write(self, data):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_path, self.path)
+
+    async def restore(self):
+        """Carga las sesiones guardadas; el archivo se lee fuera del event loop"""
+        if not self.path:
+            return
+        sessions = await run_blocking('load_sessions', self._read)
+        for session in sessions[-self.max_entries:]:
+            self._sessions.setdefault(session.key, session)
+        while len(self._sessions) > self.max_entries:
+            self._sessions.popitem(last=False)
+        if sessions:
+            logger.info(f"{len(sessions)} sesiones restauradas de {self.path}")
+
+    def _read(self) -> List[ChatSession]:
+        if not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path) as f:
+                sessions = [ChatSession(**entry) for entry in json.load(f)]
+        except (OSError, ValueError, TypeError) as e:
+            logger.error(f"Error leyendo las sesiones de {self.path}: {e}")
+            return []
+        for session in sessions:
+            # Un directorio que ya no existe no debe impedir ejecutar comandos
+            if not os.path.isdir(session.cwd):
+                session.cwd = self.default_cwd
+        return sorted(sessions, key=lambda session: session.last_used)
+
+    async def close(self):
+        """Escribe los cambios pendientes"""
+        if self._save_task is not None and not self._save_task.done():
+            self._save_task.cancel()
+            await self.save()
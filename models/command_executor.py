@@ -1,52 +1,247 @@
-import subprocess
+import asyncio
+import codecs
 import shlex
 import os
+import signal
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Set
+from models.chat_sessions import ChatSession
+from models.output_buffer import OutputBuffer
+from models.shell_session import ShellSession, ShellSessionManager, SessionError
 from utils.logger import logger
-from config.config import BLACKLIST_COMMANDS
+from config.config import BLACKLIST_COMMANDS, COMMAND_TIMEOUT, COMMAND_KILL_GRACE
+
+@dataclass
+class CommandResult:
+    output: str
+    error: Optional[str] = None
+    exit_code: Optional[int] = None
+    status: str = 'ok'  # 'ok', 'error', 'timeout', 'killed'
 
 class CommandExecutor:
-    def __init__(self):
-        self.current_directory = os.getcwd()
+    def __init__(self, sessions: Optional[ShellSessionManager] = None):
+        # Directorio de los comandos sin sesión (/runall y agentes de la flota)
+        self.default_directory = os.getcwd()
+        # Con sesiones, los comandos que indican 'session' corren en una shell persistente
+        self.sessions = sessions
+        self._running: Dict[Any, Any] = {}
+        self._killed: Set[Any] = set()
+
+    async def execute_command(self, command: str, on_output: Optional[Callable[[str], None]] = None,
+                              timeout: Optional[float] = COMMAND_TIMEOUT, key: Any = None) -> tuple:
+        """
+        Ejecuta un comando de forma asíncrona y retorna el resultado y el estado.
+        La salida se entrega incrementalmente a on_output a medida que llega.
+        """
+        result = await self.run(command, on_output=on_output, timeout=timeout, key=key)
+        if result.error:
+            return None, result.error
+        return result.output, None
 
-    def execute_command(self, command: str) -> tuple:
+    async def run(self, command: str, on_output: Optional[Callable[[str], None]] = None,
+                  timeout: Optional[float] = COMMAND_TIMEOUT, key: Any = None,
+                  buffer: Optional[OutputBuffer] = None, session: Optional[ChatSession] = None) -> CommandResult:
         """
-        Ejecuta un comando y retorna el resultado y el estado
+        Ejecuta un comando y retorna el resultado completo, incluido el código de salida.
+        Si se indica un buffer la salida se escribe en él en lugar de acumularse en memoria.
+        Con 'session' el comando corre en el directorio de la sesión (en su shell
+        persistente si hay sesiones de shell) y un cd solo cambia el de esa sesión.
         """
         try:
-            # Validar comando en lista negra
-            cmd_base = command.split()[0].lower()
+            # Validar comando en lista negra (también por ruta); en las sesiones de shell
+            # la trampa de blacklist_guard revisa además cada comando de la línea
+            cmd_base = os.path.basename(command.split()[0]).lower()
             if cmd_base in BLACKLIST_COMMANDS:
-                return None, f"Comando '{cmd_base}' prohibido"
+                return CommandResult('', f"Comando '{cmd_base}' prohibido", status='error')
+
+            if session is not None:
+                self._check_directory(session)
+            if session is not None and self.sessions is not None:
+                return await self._run_in_session(command, session, on_output, timeout, key, buffer)
+
+            cwd = session.cwd if session is not None else self.default_directory
 
             # Manejar comando cd
             if command.startswith("cd "):
-                return self._change_directory(command[3:].strip())
+                new_dir, error = self._change_directory(cwd, command[3:].strip())
+                if error:
+                    return CommandResult('', error, status='error')
+                if session is not None:
+                    session.cwd = new_dir
+                if buffer is not None:
+                    buffer.write(new_dir)
+                    new_dir = ''
+                return CommandResult(new_dir, exit_code=0)
 
             # Ejecutar comando normal
             cmd_tokens = shlex.split(command)
-            result = subprocess.check_output(
-                cmd_tokens,
-                stderr=subprocess.STDOUT,
-                text=True,
-                cwd=self.current_directory
+            process = await asyncio.create_subprocess_exec(
+                *cmd_tokens,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                cwd=cwd,
+                start_new_session=True
             )
-            return result, None
+            if key is not None:
+                self._running[key] = process
+
+            chunks = []
+            sink = buffer.write if buffer is not None else chunks.append
+            try:
+                await asyncio.wait_for(self._read_output(process, sink, on_output), timeout)
+                returncode = await process.wait()
+            except asyncio.TimeoutError:
+                self._terminate(process)
+                returncode = await process.wait()
+                output = ''.join(chunks)
+                return CommandResult(output, f"Tiempo límite excedido ({timeout}s)\n{output}".rstrip(), returncode, 'timeout')
+            except asyncio.CancelledError:
+                self._terminate(process)
+                raise
+            finally:
+                if key is not None and self._running.get(key) is process:
+                    del self._running[key]
+
+            output = ''.join(chunks)
+            if key in self._killed:
+                self._killed.discard(key)
+                return CommandResult(output, f"Comando cancelado\n{output}".rstrip(), returncode, 'killed')
+            if returncode != 0:
+                if buffer is not None:
+                    return CommandResult(output, f"Error ejecutando comando (código {returncode})", returncode, 'error')
+                return CommandResult(output, f"Error ejecutando comando: {output}", returncode, 'error')
+            return CommandResult(output, exit_code=returncode)
 
-        except subprocess.CalledProcessError as e:
-            return None, f"Error ejecutando comando: {e.output}"
         except Exception as e:
-            return None, f"Error: {str(e)}"
+            return CommandResult('', f"Error: {str(e)}", status='error')
+
+    async def _run_in_session(self, command: str, session: ChatSession, on_output: Optional[Callable[[str], None]],
+                              timeout: Optional[float], key: Any, buffer: Optional[OutputBuffer]) -> CommandResult:
+        """Ejecuta el comando en la shell persistente de la sesión: cd, variables y alias se conservan"""
+        try:
+            shell = await self.sessions.acquire(session.key, session.cwd)
+        except SessionError as e:
+            return CommandResult('', str(e), status='error')
+        if key is not None:
+            self._running[key] = shell
 
-    def _change_directory(self, new_dir: str) -> tuple:
+        chunks = []
+        sink = buffer.write if buffer is not None else chunks.append
+
+        def deliver(text: str):
+            sink(text)
+            if on_output:
+                on_output(text)
+
+        try:
+            returncode, timed_out = await shell.run(command, deliver, timeout)
+        except SessionError as e:
+            return CommandResult(''.join(chunks), str(e), status='error')
+        except asyncio.CancelledError:
+            shell.interrupt()
+            raise
+        finally:
+            if key is not None and self._running.get(key) is shell:
+                del self._running[key]
+            # Si la shell se cierra, la siguiente empieza donde quedó esta
+            session.cwd = shell.current_directory() or session.cwd
+
+        output = ''.join(chunks)
+        if timed_out:
+            return CommandResult(output, f"Tiempo límite excedido ({timeout}s)\n{output}".rstrip(), returncode, 'timeout')
+        if key in self._killed:
+            self._killed.discard(key)
+            return CommandResult(output, f"Comando cancelado\n{output}".rstrip(), returncode, 'killed')
+        if returncode is None:
+            return CommandResult(output, f"La sesión de shell terminó\n{output}".rstrip(), status='error')
+        if returncode != 0:
+            if buffer is not None:
+                return CommandResult(output, f"Error ejecutando comando (código {returncode})", returncode, 'error')
+            return CommandResult(output, f"Error ejecutando comando: {output}", returncode, 'error')
+        return CommandResult(output, exit_code=returncode)
+
+    def _check_directory(self, session: ChatSession):
+        """Si el directorio de la sesión ya no existe, vuelve al directorio por defecto"""
+        if not os.path.isdir(session.cwd):
+            logger.warning(f"El directorio {session.cwd} ya no existe; la sesión vuelve a {self.default_directory}")
+            session.cwd = self.default_directory
+
+    async def close_session(self, session: ChatSession) -> bool:
+        """Cierra la shell persistente de la sesión indicada; la siguiente empieza en el directorio por defecto"""
+        session.cwd = self.default_directory
+        if self.sessions is None:
+            return False
+        return await self.sessions.close(session.key)
+
+    async def close(self):
+        if self.sessions is not None:
+            await self.sessions.close_all()
+
+    async def _read_output(self, process, sink: Callable[[str], None], on_output: Optional[Callable[[str], None]]):
+        """Lee stdout por bloques y entrega cada fragmento decodificado"""
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        while True:
+            data = await process.stdout.read(4096)
+            text = decoder.decode(data, final=not data)
+            if text:
+                sink(text)
+                if on_output:
+                    on_output(text)
+            if not data:
+                break
+
+    def kill(self, key: Any) -> bool:
+        """Cancela el comando en ejecución asociado a la clave indicada"""
+        process = self._running.get(key)
+        if isinstance(process, ShellSession):
+            # Solo se terminan los procesos del comando; la shell de la sesión sigue abierta
+            self._killed.add(key)
+            process.interrupt()
+            return True
+        if process is None or process.returncode is not None:
+            return False
+        self._killed.add(key)
+        self._terminate(process)
+        return True
+
+    def is_running(self, key: Any) -> bool:
+        return key in self._running
+
+    def _terminate(self, process):
         """
-        Cambia el directorio actual
+        Termina el grupo de procesos del comando. Lo que siga vivo tras
+        COMMAND_KILL_GRACE segundos (un programa que ignora SIGTERM o un hijo que
+        mantiene abierta la salida) recibe SIGKILL, para que ni el tiempo límite
+        ni /kill esperen indefinidamente.
         """
+        if process.returncode is not None:
+            return
         try:
-            os.chdir(new_dir)
-            self.current_directory = os.getcwd()
-            return self.current_directory, None
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
         except Exception as e:
-            return None, f"Error cambiando directorio: {str(e)}"
+            logger.error(f"Error terminando proceso {process.pid}: {e}")
+            process.kill()
+            return
+        asyncio.get_running_loop().call_later(COMMAND_KILL_GRACE, self._force_kill, process)
+
+    def _force_kill(self, process):
+        try:
+            # El grupo sigue existiendo mientras quede alguno de sus procesos, aunque el líder ya terminó
+            os.killpg(process.pid, signal.SIGKILL)
+            logger.warning(f"El comando {process.pid} no terminó con SIGTERM; se envió SIGKILL")
+        except (ProcessLookupError, PermissionError):
+            pass
 
-    def get_current_directory(self) -> str:
-        return self.current_directory
+    def _change_directory(self, cwd: str, new_dir: str) -> tuple:
+        """
+        Resuelve el nuevo directorio a partir de 'cwd' sin tocar el del proceso del bot
+        """
+        path = os.path.realpath(os.path.join(cwd, os.path.expanduser(new_dir)))
+        if not os.path.isdir(path):
+            return None, f"Error cambiando directorio: no existe el directorio '{new_dir}'"
+        if not os.access(path, os.X_OK):
+            return None, f"Error cambiando directorio: permiso denegado para '{new_dir}'"
+        return path, None
@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, wait
+from typing import Dict, List, Optional, Tuple
+import psutil
+from config.config import SAMPLE_INTERVAL, DISK_PROBE_TIMEOUT, PARTITION_REFRESH_INTERVAL, IGNORED_FSTYPES
+from utils.logger import logger
+
+# Campos de disk_io_counters usados para calcular tasas (busy_time solo existe en Linux)
+FIELDS = ('read_bytes', 'write_bytes', 'read_count', 'write_count', 'read_time', 'write_time', 'busy_time')
+
+class DiskMonitor:
+    """
+    Tasas de E/S por dispositivo a partir de disk_io_counters(perdisk=True) y
+    consulta de uso e inodos de los puntos de montaje. Cada punto de montaje se
+    consulta en un hilo aparte con límite de tiempo, de modo que un montaje
+    colgado (p. ej. NFS caído) no bloquea al muestreador ni al bot.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, max_window: float = 300,
+                 probe_timeout: float = DISK_PROBE_TIMEOUT):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=int(max_window / interval) + 2)
+        self.probe_timeout = probe_timeout
+        self._probes: Dict[str, Future] = {}  # Consultas en curso por punto de montaje
+        self._partitions: List[Tuple[str, str, str]] = []
+        self._last_partition_refresh = 0.0
+
+    def update(self, snapshot=None):
+        """Toma una muestra de contadores; se registra como listener del muestreador"""
+        now = time.time()
+        try:
+            io_counters = psutil.disk_io_counters(perdisk=True, nowrap=True) or {}
+        except (OSError, RuntimeError) as e:
+            logger.error(f"Error leyendo contadores de disco: {e}")
+            return
+        counters = {
+            disk: tuple(getattr(io, field, 0) for field in FIELDS)
+            for disk, io in io_counters.items()
+        }
+        with self._lock:
+            self._samples.append((now, counters))
+
+    def rates(self, window: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Bytes/s, operaciones/s, latencia media por operación (ms) y porcentaje de
+        ocupación por dispositivo. Sin ventana se usa el último intervalo.
+        """
+        with self._lock:
+            if len(self._samples) < 2:
+                return {}
+            newest_ts, newest = self._samples[-1]
+            reference_ts, reference = self._samples[-2]
+            if window is not None:
+                for timestamp, counters in self._samples:
+                    if timestamp >= newest_ts - window:
+                        reference_ts, reference = timestamp, counters
+                        break
+
+        elapsed = newest_ts - reference_ts
+        if elapsed <= 0:
+            return {}
+        result = {}
+        for disk, values in newest.items():
+            previous = reference.get(disk)
+            if previous is None:
+                continue
+            delta = dict(zip(FIELDS, (max(0, value - old) for value, old in zip(values, previous))))
+            operations = delta['read_count'] + delta['write_count']
+            result[disk] = {
+                'read_bytes': delta['read_bytes'] / elapsed,
+                'write_bytes': delta['write_bytes'] / elapsed,
+                'read_iops': delta['read_count'] / elapsed,
+                'write_iops': delta['write_count'] / elapsed,
+                'latency': (delta['read_time'] + delta['write_time']) / operations if operations else 0.0,
+                # busy_time está en milisegundos
+                'busy': min(100.0, delta['busy_time'] / (elapsed * 1000) * 100)
+            }
+        return result
+
+    def max_busy(self) -> float:
+        """Mayor porcentaje de ocupación entre los dispositivos en el último intervalo"""
+        return max((rates['busy'] for rates in self.rates().values()), default=0.0)
+
+    def partitions(self) -> List[Tuple[str, str, str]]:
+        """Puntos de montaje reales como tuplas (punto de montaje, dispositivo, tipo)"""
+        now = time.time()
+        if now - self._last_partition_refresh >= PARTITION_REFRESH_INTERVAL:
+            self._last_partition_refresh = now
+            self._partitions = [
+                (partition.mountpoint, partition.device, partition.fstype)
+                for partition in psutil.disk_partitions()
+                if partition.fstype not in IGNORED_FSTYPES and not partition.device.startswith('/dev/loop')
+            ]
+        return self._partitions
+
+    def probe(self, mountpoints: List[str]) -> Dict[str, Optional[dict]]:
+        """
+        Uso e inodos de cada punto de montaje. Los que no responden dentro de
+        probe_timeout se devuelven como None y no se vuelven a consultar hasta
+        que termine la consulta pendiente, para no acumular hilos bloqueados.
+        Los que fallan (p. ej. ya no existen) se omiten.
+        """
+        futures = {}
+        started = []
+        with self._lock:
+            for mountpoint in mountpoints:
+                future = self._probes.get(mountpoint)
+                if future is None or future.done():
+                    future = self._probes[mountpoint] = self._start_probe(mountpoint)
+                    started.append(future)
+                futures[mountpoint] = future
+
+        # Solo se espera por las consultas nuevas; las que siguen colgadas se omiten sin esperar
+        wait(started, timeout=self.probe_timeout)
+        result = {}
+        for mountpoint, future in futures.items():
+            if not future.done():
+                result[mountpoint] = None
+                continue
+            if future.exception() is None:
+                result[mountpoint] = future.result()
+        return result
+
+    def _start_probe(self, mountpoint: str) -> Future:
+        # Hilo daemon: un montaje colgado no debe impedir que el proceso termine
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(self._statvfs(mountpoint))
+            except OSError as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name=f"disk-probe {mountpoint}", daemon=True).start()
+        return future
+
+    @staticmethod
+    def _statvfs(mountpoint: str) -> dict:
+        stats = os.statvfs(mountpoint)
+        total = stats.f_blocks * stats.f_frsize
+        free = stats.f_bavail * stats.f_frsize
+        used = (stats.f_blocks - stats.f_bfree) * stats.f_frsize
+        # Igual que df: el porcentaje se calcula sobre el espacio disponible para usuarios
+        usable = used + free
+        inodes_used = stats.f_files - stats.f_ffree
+        return {
+            'total': total,
+            'used': used,
+            'free': free,
+            'percent': used / usable * 100 if usable else 0.0,
+            'inodes_total': stats.f_files,
+            'inodes_used': inodes_used,
+            'inodes_percent': inodes_used / stats.f_files * 100 if stats.f_files else 0.0
+        }
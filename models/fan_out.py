@@ -0,0 +1,79 @@
+import asyncio
+import difflib
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence
+from config.config import FANOUT_CONCURRENCY, FANOUT_TIMEOUT
+
+@dataclass
+class TargetResult:
+    """Resultado de un comando en una máquina"""
+    target: str
+    status: str  # 'ok', 'error', 'timeout', 'killed' o 'unreachable'
+    output: str = ''
+    error: Optional[str] = None
+    exit_code: Optional[int] = None
+    duration: float = 0.0
+
+    @property
+    def key(self) -> tuple:
+        """Dos máquinas con la misma clave produjeron exactamente el mismo resultado"""
+        return self.status, self.exit_code, self.output.strip(), (self.error or '').strip()
+
+@dataclass
+class ResultGroup:
+    """Máquinas con un resultado idéntico"""
+    result: TargetResult
+    targets: List[str] = field(default_factory=list)
+
+async def fan_out(targets: Sequence[str], run: Callable[[str, float], Awaitable[TargetResult]],
+                  concurrency: int = FANOUT_CONCURRENCY, timeout: float = FANOUT_TIMEOUT) -> AsyncIterator[TargetResult]:
+    """
+    Ejecuta run(destino, timeout) en todos los destinos con como máximo
+    'concurrency' a la vez y entrega cada resultado apenas termina. El tiempo
+    límite se aplica a cada destino por separado, desde que obtiene su turno.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(target: str) -> TargetResult:
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                # Margen para que el destino corte el comando por su cuenta y devuelva la salida parcial
+                result = await asyncio.wait_for(run(target, timeout), timeout + 5)
+            except asyncio.TimeoutError:
+                result = TargetResult(target, 'timeout', error=f"Sin respuesta en {timeout:.0f}s")
+            except Exception as e:
+                result = TargetResult(target, 'unreachable', error=str(e))
+            result.duration = time.monotonic() - started
+            return result
+
+    tasks = [asyncio.create_task(run_one(target)) for target in targets]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield await next_result
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def group_results(results: Sequence[TargetResult]) -> List[ResultGroup]:
+    """Agrupa los resultados idénticos; los grupos más numerosos primero"""
+    groups: Dict[tuple, ResultGroup] = {}
+    for result in results:
+        group = groups.get(result.key)
+        if group is None:
+            group = groups[result.key] = ResultGroup(result)
+        group.targets.append(result.target)
+    for group in groups.values():
+        group.targets.sort()
+    return sorted(groups.values(), key=lambda group: (-len(group.targets), group.targets[0]))
+
+def diff_outputs(reference: str, other: str, max_lines: int = 20) -> str:
+    """Diferencias de 'other' respecto de 'reference', sin cabeceras y acotadas a max_lines"""
+    lines = [
+        line for line in difflib.unified_diff(reference.splitlines(), other.splitlines(), lineterm='', n=0)
+        if not line.startswith(('---', '+++', '@@'))
+    ]
+    if len(lines) > max_lines:
+        lines = lines[:max_lines] + [f"… {len(lines) - max_lines} líneas más"]
+    return '\n'.join(lines)
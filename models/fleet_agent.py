@@ -0,0 +1,267 @@
+import asyncio
+import hmac
+import platform
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Set
+import psutil
+from config.config import (
+    FLEET_HUB, FLEET_NAME, FLEET_TOKEN, FLEET_AGENT_RUN, FLEET_PUSH_INTERVAL, FLEET_KEYFRAME_INTERVAL,
+    FLEET_RECONNECT_MAX, COMMAND_TIMEOUT, OUTPUT_PAGE_SIZE
+)
+from models.fleet_protocol import (
+    PROTOCOL_VERSION, CHALLENGE, HELLO, WELCOME, PUSH, REQUEST, RESPONSE, FleetError, DeltaEncoder,
+    encode_frame, read_frame, open_connection, snapshot_values, new_nonce, sign, request_signature
+)
+from models.process_table import SORT_KEYS
+from utils.logger import logger
+
+# Salida máxima de un comando que se devuelve al hub
+MAX_RUN_OUTPUT = 16 * OUTPUT_PAGE_SIZE
+
+class FleetAgent:
+    """
+    Agente de una máquina de la flota: se conecta al hub, le envía las
+    muestras del muestreador agrupadas cada FLEET_PUSH_INTERVAL junto con las
+    alertas locales, y responde las operaciones que el hub le pide (/ps y
+    comandos de terminal). Reconecta con espera exponencial si pierde el hub.
+
+    Con FLEET_TOKEN cada extremo firma el nonce del otro al conectarse y el hub
+    firma cada petición; sin token, o si el hub no demuestra conocerlo, el
+    agente no ejecuta comandos.
+    """
+
+    def __init__(self, sampler, process_table, net_monitor, disk_monitor, alert_system, executor,
+                 name: str = FLEET_NAME, hub: str = FLEET_HUB, token: str = FLEET_TOKEN,
+                 allow_run: bool = FLEET_AGENT_RUN, push_interval: float = FLEET_PUSH_INTERVAL):
+        self.name = name
+        self.hub = hub
+        self.token = token
+        self.allow_run = allow_run
+        if allow_run and not token:
+            logger.warning("FLEET_TOKEN no está definido: el agente no aceptará comandos del hub")
+        self.push_interval = push_interval
+        self.process_table = process_table
+        self.net_monitor = net_monitor
+        self.disk_monitor = disk_monitor
+        self.alert_system = alert_system
+        self.executor = executor
+        self.bytes_sent = 0
+        self.frames_sent = 0
+        # El hilo del muestreador deja aquí las muestras; el bucle de envío las vacía
+        self._samples = deque(maxlen=max(1, FLEET_KEYFRAME_INTERVAL))
+        self._encoder = DeltaEncoder(FLEET_KEYFRAME_INTERVAL)
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pusher: Optional[asyncio.Task] = None
+        self._answers: Set[asyncio.Task] = set()
+        self._delay = 1.0
+        # Estado de la conexión actual: nonce propio, clave de la sesión y última petición aceptada
+        self._challenge = ''
+        self._nonce = ''
+        self._session_key: Optional[str] = None
+        self._last_request = 0
+        sampler.add_listener(self._on_snapshot)
+
+    def _on_snapshot(self, snapshot):
+        """Listener del muestreador (en su hilo): se registra después de los monitores"""
+        self._samples.append(snapshot_values(
+            snapshot,
+            net=round(self.net_monitor.max_utilization(), 1),
+            io=round(self.disk_monitor.max_busy(), 1),
+            procs=len(self.process_table.rows())
+        ))
+
+    def start(self):
+        if self._task is None:
+            self._write_lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Las operaciones en curso se cancelan (un comando corta su proceso)
+        for task in list(self._answers):
+            task.cancel()
+        if self._answers:
+            await asyncio.gather(*self._answers, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            try:
+                reader, writer = await open_connection(self.hub)
+            except OSError as e:
+                logger.warning(f"No se pudo conectar con el hub {self.hub}: {e}")
+                await self._backoff()
+                continue
+
+            self._writer = writer
+            # Cada conexión empieza con una muestra completa
+            self._encoder.reset()
+            self._session_key = None
+            self._last_request = 0
+            try:
+                challenge, _ = await asyncio.wait_for(read_frame(reader), timeout=10)
+                if challenge.get('t') != CHALLENGE or challenge.get('v') != PROTOCOL_VERSION:
+                    raise FleetError("el hub no envió un desafío compatible")
+                await self._send(self._hello(str(challenge.get('nonce', ''))))
+                await self._read_loop(reader)
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, FleetError, ValueError) as e:
+                logger.warning(f"Conexión con el hub perdida: {e}")
+            finally:
+                if self._pusher is not None:
+                    self._pusher.cancel()
+                    self._pusher = None
+                self._writer = None
+                writer.close()
+            await self._backoff()
+
+    async def _backoff(self):
+        """Espera antes de reconectar; la espera se duplica hasta que el hub acepte el saludo"""
+        await asyncio.sleep(self._delay)
+        self._delay = min(self._delay * 2, FLEET_RECONNECT_MAX)
+
+    def _hello(self, challenge: str) -> Dict[str, Any]:
+        uname = platform.uname()
+        self._challenge = challenge
+        self._nonce = new_nonce()
+        return {
+            't': HELLO,
+            'v': PROTOCOL_VERSION,
+            'name': self.name,
+            'sig': sign(self.token, 'agent', challenge, self.name),
+            'nonce': self._nonce,
+            'info': {
+                'system': f"{uname.system} {uname.release}",
+                'hostname': uname.node,
+                'machine': uname.machine,
+                'boot_time': psutil.boot_time(),
+                'interval': self.push_interval,
+                'run': self.allow_run and bool(self.token)
+            }
+        }
+
+    async def _send(self, message: Dict[str, Any]):
+        frame = encode_frame(message)
+        async with self._write_lock:
+            if self._writer is None:
+                raise ConnectionError("Sin conexión con el hub")
+            self._writer.write(frame)
+            await self._writer.drain()
+        self.bytes_sent += len(frame)
+        self.frames_sent += 1
+
+    async def _push_loop(self):
+        """Envía las muestras acumuladas y las alertas pendientes en un único mensaje"""
+        while True:
+            samples = []
+            while self._samples:
+                samples.append(self._encoder.encode(self._samples.popleft()))
+            alerts = [
+                {
+                    'type': alert.type,
+                    'message': alert.message,
+                    'severity': alert.severity,
+                    'source': alert.source,
+                    'timestamp': alert.timestamp.timestamp()
+                }
+                for alert in self.alert_system.check_system_resources()
+            ]
+            # Sin muestras nuevas el mensaje vacío sirve igual para que el hub sepa que seguimos vivos
+            message = {'t': PUSH, 'm': samples}
+            if alerts:
+                message['a'] = alerts
+            try:
+                await self._send(message)
+            except ConnectionError:
+                return
+            await asyncio.sleep(self.push_interval)
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        while True:
+            message, _ = await read_frame(reader)
+            if message.get('t') == WELCOME:
+                self._verify_welcome(message)
+                # Las muestras se envían solo cuando el hub aceptó el saludo
+                self._delay = 1.0
+                logger.info(f"Conectado al hub {self.hub} como {self.name}")
+                if self._pusher is None:
+                    self._pusher = asyncio.create_task(self._push_loop())
+            elif message.get('t') == REQUEST:
+                # Un comando largo no debe retrasar las demás operaciones
+                task = asyncio.create_task(self._answer(message))
+                self._answers.add(task)
+                task.add_done_callback(self._answers.discard)
+
+    def _verify_welcome(self, welcome: Dict[str, Any]):
+        """Con token, el hub debe firmar el nonce del agente; si no, puede ser otro proceso en su dirección"""
+        if not self.token:
+            return
+        expected = sign(self.token, 'hub', self._nonce, self._challenge)
+        if not hmac.compare_digest(str(welcome.get('sig', '')), expected):
+            raise FleetError(f"el hub {self.hub} no demostró conocer FLEET_TOKEN")
+        self._session_key = sign(self.token, 'session', self._challenge, self._nonce)
+
+    def _check_request(self, request: Dict[str, Any]):
+        """Acepta solo peticiones firmadas por el hub de esta sesión y no repetidas"""
+        if self._session_key is None:
+            raise FleetError("El hub aún no se autenticó")
+        request_id = request.get('id')
+        expected = request_signature(self._session_key, request_id, request.get('op'), request.get('args') or {})
+        if not hmac.compare_digest(str(request.get('sig', '')), expected):
+            raise FleetError("Petición con firma no válida")
+        if not isinstance(request_id, int) or request_id <= self._last_request:
+            raise FleetError("Petición repetida")
+        self._last_request = request_id
+
+    async def _answer(self, request: Dict[str, Any]):
+        response = {'t': RESPONSE, 'id': request.get('id')}
+        try:
+            if self.token:
+                self._check_request(request)
+            response['data'] = await self._handle(request.get('op'), request.get('args') or {}, request.get('id'))
+        except Exception as e:
+            response['error'] = str(e)
+        try:
+            await self._send(response)
+        except (ConnectionError, FleetError) as e:
+            logger.warning(f"No se pudo responder al hub: {e}")
+
+    async def _handle(self, op: str, args: Dict[str, Any], request_id: Any = None) -> Any:
+        if op == 'ps':
+            sort = args.get('sort', 'cpu')
+            if sort not in SORT_KEYS:
+                raise FleetError(f"Orden no válido: {sort}")
+            rows = self.process_table.top(sort, args.get('pattern'), int(args.get('limit', 10)))
+            return {
+                'rows': [{key: value for key, value in row.items() if key != 'cmdline'} for row in rows],
+                'total': len(self.process_table.rows()),
+                'updated_at': self.process_table.updated_at
+            }
+        if op == 'run':
+            if not self.allow_run:
+                raise FleetError("Este agente no acepta comandos (FLEET_AGENT_RUN=0)")
+            if self._session_key is None:
+                # Sin token cualquier proceso que ocupe la dirección del hub podría pedirlos
+                raise FleetError("Este agente no acepta comandos sin FLEET_TOKEN")
+            started = time.monotonic()
+            timeout = min(float(args.get('command_timeout', COMMAND_TIMEOUT)), COMMAND_TIMEOUT)
+            # La clave permite que el hub corte el comando con 'cancel' si deja de esperarlo
+            result = await self.executor.run(args['command'], timeout=timeout, key=('hub', request_id))
+            return {
+                'output': result.output[-MAX_RUN_OUTPUT:],
+                'truncated': len(result.output) > MAX_RUN_OUTPUT,
+                'error': result.error[:MAX_RUN_OUTPUT] if result.error else None,
+                'exit_code': result.exit_code,
+                'status': result.status,
+                'duration': time.monotonic() - started
+            }
+        if op == 'cancel':
+            return {'cancelled': self.executor.kill(('hub', args.get('id')))}
+        raise FleetError(f"Operación desconocida: {op}")
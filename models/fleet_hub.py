@@ -0,0 +1,291 @@
+import asyncio
+import hmac
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set
+from config.config import FLEET_LISTEN, FLEET_TOKEN, FLEET_HOST_TIMEOUT, FLEET_REQUEST_TIMEOUT
+from models.fleet_protocol import (
+    PROTOCOL_VERSION, CHALLENGE, HELLO, WELCOME, PUSH, REQUEST, RESPONSE, FleetError, DeltaDecoder,
+    encode_frame, read_frame, start_server, new_nonce, sign, request_signature
+)
+from utils.logger import logger
+from utils.metrics import REGISTRY
+
+FLEET_RECEIVED = REGISTRY.counter(
+    'bot_fleet_received_bytes_total', 'Bytes recibidos de los agentes de la flota por tipo de mensaje', ('type',)
+)
+
+@dataclass
+class RemoteHost:
+    """Estado de un agente tal como lo conoce el hub"""
+    name: str
+    info: Dict[str, Any] = field(default_factory=dict)
+    decoder: DeltaDecoder = field(default_factory=DeltaDecoder)
+    connected: bool = False
+    connected_at: Optional[float] = None
+    last_seen: Optional[float] = None  # time.time() del último mensaje
+    samples: int = 0
+    bytes_received: int = 0
+    down_reported: bool = False
+    writer: Optional[asyncio.StreamWriter] = None
+    session_key: str = ''  # Firma las peticiones de esta conexión
+    write_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    pending: Dict[int, asyncio.Future] = field(default_factory=dict)
+
+    @property
+    def values(self) -> Optional[Dict[str, Any]]:
+        """Última muestra reconstruida (None hasta recibir la primera completa)"""
+        return self.decoder.values
+
+class FleetHub:
+    """
+    Servidor del bot central: acepta las conexiones de los agentes, mantiene
+    la última muestra de cada uno a partir de los cambios que envían, reenvía
+    sus alertas y les pide operaciones (/ps remoto, comandos). Avisa con
+    on_host_state cuando un agente deja de enviar datos FLEET_HOST_TIMEOUT
+    segundos y cuando vuelve.
+    """
+
+    def __init__(self, on_alerts: Callable[[str, List[dict]], None],
+                 on_host_state: Callable[[str, bool, Optional[float]], None],
+                 address: str = FLEET_LISTEN, token: str = FLEET_TOKEN, host_timeout: float = FLEET_HOST_TIMEOUT):
+        self.address = address
+        self.token = token
+        self.host_timeout = host_timeout
+        self.hosts: Dict[str, RemoteHost] = {}
+        self._on_alerts = on_alerts
+        self._on_host_state = on_host_state
+        self._request_ids = itertools.count(1)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._watch_task: Optional[asyncio.Task] = None
+        self._connections: Set[asyncio.Task] = set()
+        self._cancels: Set[asyncio.Task] = set()
+        REGISTRY.gauge(
+            'bot_fleet_hosts', 'Agentes de la flota conectados y desconectados', ('state',)
+        ).set_function(self._count_hosts)
+
+    def _count_hosts(self):
+        online = sum(1 for host in self.hosts.values() if host.connected)
+        return {('online',): online, ('offline',): len(self.hosts) - online}
+
+    async def start(self):
+        if self._server is None:
+            self._server = await start_server(self._handle, self.address)
+            self._watch_task = asyncio.create_task(self._watch())
+            if not self.token:
+                logger.warning(
+                    "FLEET_TOKEN no está definido: cualquier agente que alcance el hub puede unirse "
+                    "y los agentes no aceptarán comandos"
+                )
+            logger.info(f"Hub de la flota escuchando en {self.address}")
+
+    async def stop(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._watch_task = None
+        if self._server is not None:
+            self._server.close()
+            for host in self.hosts.values():
+                if host.writer is not None:
+                    host.writer.close()
+            # Cerrar la conexión despierta a su tarea con fin de datos; se espera a que termine sola
+            if self._connections:
+                await asyncio.wait(self._connections, timeout=5)
+            await self._server.wait_closed()
+            self._server = None
+
+    def get_host(self, name: str) -> Optional[RemoteHost]:
+        return self.hosts.get(name)
+
+    def list_hosts(self) -> List[RemoteHost]:
+        return sorted(self.hosts.values(), key=lambda host: host.name)
+
+    async def request(self, name: str, op: str, timeout: float = FLEET_REQUEST_TIMEOUT, **args) -> Any:
+        """Pide una operación a un agente y espera su respuesta (FleetError si falla)"""
+        host = self.hosts.get(name)
+        if host is None:
+            raise FleetError(f"Host desconocido: {name}")
+        if not host.connected:
+            raise FleetError(f"{name} no está conectado")
+
+        request_id = next(self._request_ids)
+        future = asyncio.get_running_loop().create_future()
+        host.pending[request_id] = future
+        try:
+            await self._send(host, {
+                't': REQUEST, 'id': request_id, 'op': op, 'args': args,
+                'sig': request_signature(host.session_key, request_id, op, args)
+            })
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.CancelledError:
+            # Nadie espera ya el resultado: el agente debe cortar el comando en vez de terminarlo
+            self._cancel_remote(host, request_id)
+            raise
+        except asyncio.TimeoutError:
+            self._cancel_remote(host, request_id)
+            raise FleetError(f"{name} no respondió en {timeout:.0f}s")
+        except ConnectionError as e:
+            raise FleetError(f"Conexión con {name} perdida: {e}")
+        finally:
+            host.pending.pop(request_id, None)
+
+    def _cancel_remote(self, host: RemoteHost, request_id: int):
+        """Pide al agente que cancele una operación en curso, sin esperar su respuesta"""
+        async def send():
+            cancel_id = next(self._request_ids)
+            args = {'id': request_id}
+            try:
+                await self._send(host, {
+                    't': REQUEST, 'id': cancel_id, 'op': 'cancel', 'args': args,
+                    'sig': request_signature(host.session_key, cancel_id, 'cancel', args)
+                })
+            except (ConnectionError, FleetError) as e:
+                logger.debug(f"No se pudo cancelar la petición {request_id} en {host.name}: {e}")
+
+        if host.connected:
+            task = asyncio.create_task(send())
+            self._cancels.add(task)
+            task.add_done_callback(self._cancels.discard)
+
+    async def _send(self, host: RemoteHost, message: Dict[str, Any]):
+        frame = encode_frame(message)
+        async with host.write_lock:
+            if host.writer is None:
+                raise ConnectionError("agente desconectado")
+            host.writer.write(frame)
+            await host.writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        host = None
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            # El agente demuestra conocer el token firmando un nonce nuevo en cada conexión
+            challenge = new_nonce()
+            writer.write(encode_frame({'t': CHALLENGE, 'v': PROTOCOL_VERSION, 'nonce': challenge}))
+            await writer.drain()
+            hello, size = await asyncio.wait_for(read_frame(reader), timeout=10)
+            host = self._accept(hello, size, writer, challenge)
+            if host is None:
+                return
+            # Y el hub lo demuestra firmando el del agente: sin esa firma el agente no ejecuta nada
+            agent_nonce = hello['nonce']
+            host.session_key = sign(self.token, 'session', challenge, agent_nonce)
+            await self._send(host, {'t': WELCOME, 'sig': sign(self.token, 'hub', agent_nonce, challenge)})
+            while True:
+                message, size = await read_frame(reader)
+                self._receive(host, message, size)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError) as e:
+            if host is not None:
+                logger.info(f"Agente {host.name} desconectado: {type(e).__name__}")
+        except (FleetError, ValueError) as e:
+            logger.warning(f"Mensaje no válido de {host.name if host else 'un agente'}: {e}")
+        finally:
+            self._connections.discard(task)
+            writer.close()
+            if host is not None and host.writer is writer:
+                self._detach(host)
+
+    def _accept(self, hello: Dict[str, Any], size: int, writer: asyncio.StreamWriter,
+                challenge: str) -> Optional[RemoteHost]:
+        name = str(hello.get('name') or '')
+        if (hello.get('t') != HELLO or not name or hello.get('v') != PROTOCOL_VERSION
+                or not isinstance(hello.get('nonce'), str) or not hello['nonce']):
+            logger.warning("Conexión de agente rechazada: saludo o versión no válidos")
+            return None
+        if self.token and not hmac.compare_digest(str(hello.get('sig', '')), sign(self.token, 'agent', challenge, name)):
+            logger.warning(f"Conexión de agente rechazada: firma incorrecta para {name}")
+            return None
+
+        host = self.hosts.get(name)
+        if host is None:
+            host = self.hosts[name] = RemoteHost(name)
+        elif host.writer is not None:
+            # El agente se reconectó antes de que el hub notara el corte: gana la conexión nueva
+            host.writer.close()
+            self._detach(host)
+        host.info = hello.get('info') or {}
+        host.decoder.reset()
+        host.writer = writer
+        host.connected = True
+        host.connected_at = host.last_seen = time.time()
+        host.bytes_received += size
+        FLEET_RECEIVED.inc(size, type=HELLO)
+        logger.info(f"Agente {name} conectado")
+        if host.down_reported:
+            host.down_reported = False
+            self._on_host_state(name, True, host.last_seen)
+        return host
+
+    def _detach(self, host: RemoteHost):
+        host.writer = None
+        host.connected = False
+        for future in host.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("agente desconectado"))
+        host.pending.clear()
+
+    def _receive(self, host: RemoteHost, message: Dict[str, Any], size: int):
+        kind = message.get('t')
+        host.last_seen = time.time()
+        host.bytes_received += size
+        FLEET_RECEIVED.inc(size, type=str(kind))
+        if kind == PUSH:
+            self._check_push(message)
+            for delta in message.get('m', ()):
+                if host.decoder.apply(delta):
+                    host.samples += 1
+            alerts = message.get('a')
+            if alerts:
+                self._on_alerts(host.name, alerts)
+        elif kind == RESPONSE:
+            request_id = message.get('id')
+            if not isinstance(request_id, int) or isinstance(request_id, bool):
+                raise FleetError("respuesta sin identificador válido")
+            future = host.pending.get(request_id)
+            if future is not None and not future.done():
+                if message.get('error'):
+                    future.set_exception(FleetError(str(message['error'])))
+                else:
+                    future.set_result(message.get('data'))
+
+    @staticmethod
+    def _check_push(message: Dict[str, Any]):
+        """Valida la forma de un envío antes de aplicarlo: muestras con valores numéricos y alertas como objetos"""
+        samples = message.get('m', [])
+        if not isinstance(samples, list):
+            raise FleetError("muestras que no son una lista")
+        for delta in samples:
+            if not isinstance(delta, dict) or not all(
+                isinstance(value, (int, float)) and not isinstance(value, bool) or value is None
+                for value in delta.values()
+            ):
+                raise FleetError("muestra con formato no válido")
+        alerts = message.get('a', [])
+        if not isinstance(alerts, list):
+            raise FleetError("alertas que no son una lista")
+        for alert in alerts:
+            if not isinstance(alert, dict):
+                raise FleetError("alerta con formato no válido")
+            timestamp = alert.get('timestamp')
+            if timestamp is not None and (
+                not isinstance(timestamp, (int, float)) or isinstance(timestamp, bool)
+                or not 0 <= timestamp < 1e11
+            ):
+                raise FleetError("alerta con fecha no válida")
+
+    async def _watch(self):
+        """Marca como caídos los agentes que dejan de enviar datos"""
+        while True:
+            await asyncio.sleep(max(1.0, self.host_timeout / 4))
+            now = time.time()
+            for host in list(self.hosts.values()):
+                if host.down_reported or host.last_seen is None or now - host.last_seen < self.host_timeout:
+                    continue
+                host.down_reported = True
+                if host.writer is not None:
+                    # Conexión abierta pero sin datos: se cierra para que el agente reconecte
+                    host.writer.close()
+                    self._detach(host)
+                self._on_host_state(host.name, False, host.last_seen)
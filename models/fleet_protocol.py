@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import struct
+from typing import Any, Callable, Dict, Optional, Tuple
+from config.config import FLEET_MAX_FRAME
+
+PROTOCOL_VERSION = 2
+
+# Cabecera de cada mensaje: longitud del JSON en 4 bytes (big endian)
+HEADER = struct.Struct('!I')
+
+# Tipos de mensaje
+CHALLENGE = 'challenge'  # Hub → agente: nonce que el agente debe firmar
+HELLO = 'hello'  # Agente → hub: nombre, firma del nonce, nonce propio y datos fijos de la máquina
+WELCOME = 'welcome'  # Hub → agente: saludo aceptado y firma del nonce del agente
+PUSH = 'push'  # Agente → hub: lote de muestras codificadas y alertas
+REQUEST = 'req'  # Hub → agente: operación con identificador
+RESPONSE = 'res'  # Agente → hub: resultado de una operación
+
+# Campos de cada muestra: (clave, campo de MetricsSnapshot, cuantización)
+# La cuantización agrupa valores casi iguales para que no cuenten como cambio
+SNAPSHOT_FIELDS = (
+    ('ts', 'timestamp', 0.1),
+    ('cpu', 'cpu_percent', 0.1),
+    ('cores', 'cpu_count', 1),
+    ('mem_total', 'memory_total', 1024 * 1024),
+    ('mem_used', 'memory_used', 1024 * 1024),
+    ('mem', 'memory_percent', 0.1),
+    ('disk_total', 'disk_total', 1024 * 1024),
+    ('disk_used', 'disk_used', 1024 * 1024),
+    ('disk', 'disk_percent', 0.1),
+    ('net_sent', 'net_bytes_sent', 1),
+    ('net_recv', 'net_bytes_recv', 1)
+)
+# Claves que solo crecen: se envía la diferencia con la muestra anterior
+COUNTER_KEYS = frozenset(('ts', 'net_sent', 'net_recv'))
+
+class FleetError(Exception):
+    """Error del protocolo o de una operación remota"""
+
+def new_nonce() -> str:
+    return secrets.token_hex(16)
+
+def sign(token: str, *parts) -> str:
+    """
+    HMAC-SHA256 de las partes con el secreto compartido. El token nunca viaja:
+    cada extremo firma el nonce del otro, y las peticiones del hub se firman
+    con una clave de la sesión derivada de ambos nonces.
+    """
+    message = '|'.join(str(part) for part in parts).encode()
+    return hmac.new(token.encode(), message, hashlib.sha256).hexdigest()
+
+def request_signature(session_key: str, request_id: int, op: str, args: Dict[str, Any]) -> str:
+    return sign(session_key, request_id, op, json.dumps(args, sort_keys=True, separators=(',', ':')))
+
+def quantize(value: float, step: float):
+    if step == 1:
+        return int(value)
+    if step >= 1:
+        return int(value // step * step)
+    return round(value, 1)
+
+def encode_frame(message: Dict[str, Any]) -> bytes:
+    payload = json.dumps(message, separators=(',', ':'), ensure_ascii=False).encode()
+    if len(payload) > FLEET_MAX_FRAME:
+        raise FleetError(f"Mensaje de {len(payload)} bytes, el máximo es {FLEET_MAX_FRAME}")
+    return HEADER.pack(len(payload)) + payload
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[Dict[str, Any], int]:
+    """Lee un mensaje; retorna (mensaje, bytes leídos). IncompleteReadError si se cerró la conexión"""
+    size, = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if size > FLEET_MAX_FRAME:
+        raise FleetError(f"Mensaje de {size} bytes, el máximo es {FLEET_MAX_FRAME}")
+    payload = await reader.readexactly(size)
+    message = json.loads(payload)
+    if not isinstance(message, dict):
+        raise FleetError("Mensaje con formato no válido")
+    return message, HEADER.size + size
+
+def parse_address(address: str) -> Tuple[str, Any]:
+    """'unix:/ruta' → ('unix', '/ruta'); 'host:puerto' → ('tcp', (host, puerto))"""
+    if address.startswith('unix:'):
+        return 'unix', address[len('unix:'):]
+    host, _, port = address.rpartition(':')
+    try:
+        return 'tcp', (host.strip('[]') or '127.0.0.1', int(port))
+    except ValueError:
+        raise FleetError(f"Dirección no válida: {address}")
+
+async def open_connection(address: str):
+    kind, target = parse_address(address)
+    if kind == 'unix':
+        return await asyncio.open_unix_connection(target)
+    return await asyncio.open_connection(*target)
+
+async def start_server(callback: Callable, address: str) -> asyncio.AbstractServer:
+    kind, target = parse_address(address)
+    if kind == 'unix':
+        # Un socket que quedó de una ejecución anterior impide escuchar en la misma ruta
+        if os.path.exists(target):
+            os.remove(target)
+        server = await asyncio.start_unix_server(callback, target)
+        os.chmod(target, 0o660)
+        return server
+    return await asyncio.start_server(callback, *target)
+
+def snapshot_values(snapshot, **extra) -> Dict[str, Any]:
+    """Valores planos y cuantizados de una muestra, más los campos adicionales indicados"""
+    values = {key: quantize(getattr(snapshot, field), step) for key, field, step in SNAPSHOT_FIELDS}
+    values['load'] = round(snapshot.load_avg[0], 2)
+    values.update(extra)
+    return values
+
+class DeltaEncoder:
+    """
+    Codifica cada muestra como los cambios respecto de la anterior: los
+    contadores como diferencia y el resto solo si cambió. Cada
+    'keyframe_interval' muestras (y tras reset) envía la muestra completa.
+    """
+
+    def __init__(self, keyframe_interval: int):
+        self.keyframe_interval = keyframe_interval
+        self._last: Optional[Dict[str, Any]] = None
+        self._since_keyframe = 0
+
+    def reset(self):
+        self._last = None
+
+    def encode(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        if self._last is None or self._since_keyframe >= self.keyframe_interval:
+            delta = dict(values, k=1)
+            self._since_keyframe = 0
+        else:
+            delta = {}
+            for key, value in values.items():
+                previous = self._last.get(key)
+                if key in COUNTER_KEYS and value is not None and previous is not None:
+                    difference = value - previous
+                    if difference:
+                        delta[key] = round(difference, 1) if isinstance(difference, float) else difference
+                elif value != previous:
+                    delta[key] = value
+        self._last = values
+        self._since_keyframe += 1
+        return delta
+
+class DeltaDecoder:
+    """Reconstruye las muestras del DeltaEncoder del otro extremo"""
+
+    def __init__(self):
+        self.values: Optional[Dict[str, Any]] = None
+
+    def reset(self):
+        self.values = None
+
+    def apply(self, delta: Dict[str, Any]) -> bool:
+        """Aplica un cambio; False si falta la muestra completa de referencia"""
+        if delta.get('k'):
+            self.values = {key: value for key, value in delta.items() if key != 'k'}
+            return True
+        if self.values is None:
+            return False
+        for key, value in delta.items():
+            previous = self.values.get(key)
+            if key in COUNTER_KEYS and previous is not None:
+                value = round(previous + value, 1) if isinstance(value, float) else previous + value
+            self.values[key] = value
+        return True
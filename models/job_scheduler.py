@@ -0,0 +1,207 @@
+import asyncio
+import itertools
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+from config.config import MAX_WORKERS, JOB_HISTORY_SIZE, COMMAND_DURATION_BUCKETS, COMMAND_TIMEOUT
+from models.chat_sessions import ChatSession
+from models.command_executor import CommandExecutor
+from models.output_buffer import OutputBuffer
+from utils.logger import logger
+from utils.metrics import REGISTRY
+
+COMMAND_DURATION = REGISTRY.histogram(
+    'bot_command_duration_seconds', 'Duración de los comandos de terminal por estado final', ('status',),
+    buckets=COMMAND_DURATION_BUCKETS
+)
+JOB_COUNT = REGISTRY.gauge('bot_jobs', 'Trabajos de terminal en cola y en ejecución', ('status',))
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+@dataclass
+class Job:
+    id: int
+    command: str
+    chat_id: int
+    username: str
+    created_at: float
+    status: str = 'queued'  # 'queued', 'running', 'ok', 'error', 'timeout', 'killed'
+    exit_code: Optional[int] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    buffer: Optional[OutputBuffer] = field(default=None, repr=False)
+    error: Optional[str] = None
+    output_tail: str = ''
+    on_output: Optional[Callable[[str], None]] = field(default=None, repr=False)
+    session: Optional[ChatSession] = field(default=None, repr=False)
+    timeout: Optional[float] = COMMAND_TIMEOUT
+    _done: Optional[asyncio.Event] = field(default=None, repr=False)
+
+    @property
+    def duration(self) -> Optional[float]:
+        """Duración de la ejecución (hasta ahora si sigue corriendo)"""
+        if self.started_at is None:
+            return None
+        end = self.finished_at if self.finished_at is not None else time.time()
+        return end - self.started_at
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in ACTIVE_STATUSES
+
+class JobScheduler:
+    """Planificador FIFO de comandos con un número acotado de ejecuciones simultáneas"""
+
+    def __init__(self, executor: CommandExecutor, max_workers: int = MAX_WORKERS,
+                 history_size: int = JOB_HISTORY_SIZE, tail_size: int = 2000):
+        self.executor = executor
+        self._max_workers = max_workers
+        self._history_size = history_size
+        self._tail_size = tail_size
+        self._ids = itertools.count(1)
+        self._jobs: Dict[int, Job] = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        JOB_COUNT.set_function(self._count_active)
+
+    async def start(self):
+        """Inicia los workers (debe llamarse dentro del event loop)"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{i}")
+            for i in range(self._max_workers)
+        ]
+        logger.info(f"Planificador de trabajos iniciado ({self._max_workers} workers)")
+
+    async def stop(self):
+        """Detiene los workers y cancela los comandos en curso"""
+        for job in self._jobs.values():
+            if job.is_active:
+                self.kill(job.id)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, command: str, chat_id: int, username: str,
+               on_output: Optional[Callable[[str], None]] = None, session: Optional[ChatSession] = None,
+               timeout: Optional[float] = COMMAND_TIMEOUT) -> Job:
+        """Encola un comando y retorna el trabajo creado; con 'session' corre en el estado de esa sesión"""
+        if self._queue is None:
+            raise RuntimeError("El planificador de trabajos no está iniciado")
+        job = Job(
+            id=next(self._ids),
+            command=command,
+            chat_id=chat_id,
+            username=username,
+            created_at=time.time(),
+            buffer=OutputBuffer(),
+            on_output=on_output,
+            session=session,
+            timeout=timeout,
+            _done=asyncio.Event()
+        )
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job)
+        self._trim_history()
+        return job
+
+    async def wait(self, job: Job) -> Job:
+        """Espera a que el trabajo termine"""
+        await job._done.wait()
+        return job
+
+    def kill(self, job_id: int) -> bool:
+        """Cancela un trabajo en cola o en ejecución"""
+        job = self._jobs.get(job_id)
+        if job is None or not job.is_active:
+            return False
+        if job.status == 'queued':
+            # El worker lo descartará al sacarlo de la cola
+            self._finish(job, 'killed', error="Comando cancelado")
+            return True
+        return self.executor.kill(job.id)
+
+    def get_job(self, job_id: int) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[Job]:
+        return list(self._jobs.values())
+
+    def active_jobs(self, chat_id: Optional[int] = None) -> List[Job]:
+        return [
+            job for job in self._jobs.values()
+            if job.is_active and (chat_id is None or job.chat_id == chat_id)
+        ]
+
+    def _count_active(self) -> Dict[tuple, int]:
+        counts = {(status,): 0 for status in ACTIVE_STATUSES}
+        for job in self._jobs.values():
+            if job.is_active:
+                counts[(job.status,)] += 1
+        return counts
+
+    def queue_position(self, job: Job) -> int:
+        """Posición del trabajo entre los que esperan un worker libre (0 = no espera)"""
+        queued = [j.id for j in self._jobs.values() if j.status == 'queued']
+        if job.id not in queued:
+            return 0
+        running = sum(1 for j in self._jobs.values() if j.status == 'running')
+        idle_workers = max(0, self._max_workers - running)
+        return max(0, queued.index(job.id) + 1 - idle_workers)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status != 'queued':
+                    continue
+                await self._run_job(job)
+            except asyncio.CancelledError:
+                self._finish(job, 'killed', error="Comando cancelado")
+                raise
+            except Exception as e:
+                logger.error(f"Error ejecutando trabajo #{job.id}: {e}")
+                self._finish(job, 'error', error=f"Error: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job: Job):
+        job.status = 'running'
+        job.started_at = time.time()
+
+        def on_output(chunk: str):
+            job.output_tail = (job.output_tail + chunk)[-self._tail_size:]
+            if job.on_output:
+                job.on_output(chunk)
+
+        result = await self.executor.run(
+            job.command, on_output=on_output, timeout=job.timeout, key=job.id, buffer=job.buffer,
+            session=job.session
+        )
+        job.exit_code = result.exit_code
+        self._finish(job, result.status, error=result.error)
+
+    def _finish(self, job: Job, status: str, error: Optional[str] = None):
+        if not job.is_active:
+            return
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        if job.started_at is None:
+            job.started_at = job.finished_at
+        else:
+            COMMAND_DURATION.observe(job.duration, status=status)
+        job.on_output = None
+        job._done.set()
+        self._trim_history()
+
+    def _trim_history(self):
+        """Descarta los trabajos terminados más antiguos por encima del límite"""
+        finished = [job_id for job_id, job in self._jobs.items() if not job.is_active]
+        for job_id in finished[:max(0, len(finished) - self._history_size)]:
+            # El buffer se libera por recolección si nadie más lo está paginando
+            self._jobs.pop(job_id).buffer = None
@@ -0,0 +1,415 @@
+import os
+import re
+import select
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from config.config import (
+    LOG_WATCH, LOG_POLL_INTERVAL, LOG_READ_LIMIT, LOG_MAX_LINE, LOG_ALERT_WINDOW, LOG_RULE_BURST
+)
+from utils.logger import logger
+from utils.metrics import REGISTRY
+
+LOG_LINES = REGISTRY.counter('bot_log_lines_total', 'Líneas leídas de los logs vigilados', ('source',))
+LOG_SKIPPED = REGISTRY.counter(
+    'bot_log_skipped_bytes_total', 'Bytes de log saltados por superar LOG_READ_LIMIT en una vuelta', ('source',)
+)
+LOG_MATCHES = REGISTRY.counter('bot_log_matches_total', 'Líneas de log que coincidieron con una regla', ('rule',))
+LOG_SUPPRESSED = REGISTRY.counter(
+    'bot_log_suppressed_total', 'Coincidencias agrupadas en un resumen en lugar de alertar', ('rule',)
+)
+
+# Origen que se lee de journalctl -f en lugar de un archivo
+JOURNAL_SOURCE = 'journal'
+JOURNAL_COMMAND = ('journalctl', '--follow', '--lines=0', '--output=short', '--no-pager')
+JOURNAL_RESTART_DELAY = 30  # Segundos antes de relanzar journalctl si terminó
+
+@dataclass(frozen=True)
+class LogRule:
+    """Expresión regular sobre líneas de log; 'key' es el grupo que identifica las repeticiones"""
+    name: str
+    keywords: Tuple[bytes, ...]  # Alguna debe aparecer en la línea para probar la expresión
+    regex: re.Pattern
+    key: str
+    key_label: str
+    title: str
+    severity: str = 'warning'
+    alert_type: str = 'logs'
+
+# Conjuntos de reglas que se asignan a cada origen en LOG_WATCH
+RULE_SETS: Dict[str, Tuple[LogRule, ...]] = {
+    'ssh': (
+        LogRule(
+            'ssh_failed', (b'Failed password',),
+            re.compile(r'Failed password for (?:invalid user )?(?P<user>\S+) from (?P<ip>[0-9A-Fa-f.:]+)'),
+            'ip', 'IP', '🔑 *Login SSH fallido*', alert_type='security'
+        ),
+        LogRule(
+            'ssh_invalid_user', (b'Invalid user',),
+            re.compile(r'Invalid user (?P<user>\S*) from (?P<ip>[0-9A-Fa-f.:]+)'),
+            'ip', 'IP', '👤 *Usuario SSH inexistente*', alert_type='security'
+        ),
+    ),
+    'oom': (
+        LogRule(
+            'oom_kill', (b'Killed process',),
+            re.compile(r'Killed process (?P<pid>\d+) \((?P<process>[^)]+)\)'),
+            'process', 'Proceso', '💥 *Proceso terminado por falta de memoria*', severity='danger'
+        ),
+    ),
+    'io': (
+        LogRule(
+            'io_error', (b'I/O error',),
+            re.compile(r'I/O error,? (?:on )?dev(?:ice)? (?P<device>[\w.-]+)'),
+            'device', 'Dispositivo', '📀 *Error de E/S del kernel*', severity='danger'
+        ),
+        LogRule(
+            'fs_error', (b'EXT4-fs error', b'XFS (', b'BTRFS error'),
+            re.compile(r'(?:EXT4-fs error \(device (?P<ext4>[\w.-]+)\)|(?:XFS|BTRFS error) \(device (?P<device>[\w.-]+)\))'),
+            'device', 'Dispositivo', '🗂️ *Error del sistema de archivos*', severity='danger'
+        ),
+    ),
+    # Log de errores del propio bot (formato de utils/logger.py)
+    'errors': (
+        LogRule(
+            'bot_error', (b'| ERROR |', b'| CRITICAL |'),
+            # El texto hasta el primer número agrupa los errores que solo cambian en IDs o valores
+            re.compile(r'\|\s*(?:ERROR|CRITICAL)\s*\|\s*(?P<message>[^\d\n]{1,80})'),
+            'message', 'Mensaje', '🐞 *Error en el log*'
+        ),
+    ),
+}
+
+class LineSource:
+    """Origen de líneas: guarda la línea incompleta hasta la siguiente lectura"""
+    name: str
+    rules: Tuple[LogRule, ...]
+    _partial = b''
+
+    def _split(self, data: bytes) -> List[bytes]:
+        lines = (self._partial + data).split(b'\n')
+        # Una línea sin fin no puede crecer sin límite
+        self._partial = lines.pop()[-LOG_MAX_LINE:]
+        LOG_LINES.inc(len(lines), source=self.name)
+        return lines
+
+class FileSource(LineSource):
+    """
+    Archivo seguido por posición, sin releerlo: cada vuelta lee solo lo
+    agregado desde la anterior. Detecta la rotación (la ruta apunta a otro
+    inodo: se termina de leer el archivo anterior y se abre el nuevo desde el
+    principio) y el truncado (el tamaño baja de la posición leída).
+    """
+
+    def __init__(self, path: str, rules: Sequence[LogRule]):
+        self.name = path
+        self.path = path
+        self.rules = tuple(rules)
+        self._file = None
+        self._inode: Optional[Tuple[int, int]] = None
+        self._position = 0
+        self._started = False
+
+    def fileno(self) -> Optional[int]:
+        # Los archivos no se pueden esperar con select: se consultan en cada vuelta
+        return None
+
+    def read(self) -> List[bytes]:
+        if self._file is None and not self._open():
+            return []
+        lines = self._read_available()
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or (stat.st_dev, stat.st_ino) != self._inode:
+            # Rotado o eliminado: lo que quedaba ya se leyó, el siguiente se abre desde el principio
+            self._close()
+            if stat is not None and self._open():
+                lines += self._read_available()
+        return lines
+
+    def _open(self) -> bool:
+        try:
+            self._file = open(self.path, 'rb')
+        except FileNotFoundError:
+            self._started = True
+            return False
+        stat = os.fstat(self._file.fileno())
+        self._inode = (stat.st_dev, stat.st_ino)
+        # Al iniciar no se alerta por el historial; un archivo que aparece después se lee completo
+        self._position = stat.st_size if not self._started else 0
+        self._started = True
+        self._file.seek(self._position)
+        self._partial = b''
+        return True
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _read_available(self) -> List[bytes]:
+        size = os.fstat(self._file.fileno()).st_size
+        if size < self._position:
+            # Truncado (copytruncate): se vuelve a leer desde el principio
+            self._position = 0
+            self._partial = b''
+        pending = size - self._position
+        if pending <= 0:
+            return []
+        if pending > LOG_READ_LIMIT:
+            # Demasiado atraso: solo se analiza lo más reciente
+            skipped = pending - LOG_READ_LIMIT
+            LOG_SKIPPED.inc(skipped, source=self.name)
+            self._position += skipped
+            self._partial = b''
+            pending = LOG_READ_LIMIT
+        self._file.seek(self._position)
+        data = self._file.read(pending)
+        self._position += len(data)
+        return self._split(data)
+
+    def close(self):
+        self._close()
+
+class JournalSource(LineSource):
+    """Salida de journalctl -f leída sin bloquear; se relanza si el proceso termina"""
+
+    def __init__(self, rules: Sequence[LogRule]):
+        self.name = JOURNAL_SOURCE
+        self.rules = tuple(rules)
+        self._process: Optional[subprocess.Popen] = None
+        self._retry_at = 0.0
+
+    def fileno(self) -> Optional[int]:
+        return self._process.stdout.fileno() if self._process is not None else None
+
+    def read(self) -> List[bytes]:
+        if self._process is None:
+            if time.monotonic() < self._retry_at or not self._start():
+                return []
+        chunks = []
+        size = 0
+        while size < LOG_READ_LIMIT:
+            try:
+                data = os.read(self._process.stdout.fileno(), 65536)
+            except BlockingIOError:
+                break
+            if not data:
+                logger.warning(f"journalctl terminó (código {self._process.wait()}); se relanzará")
+                self.close()
+                self._retry_at = time.monotonic() + JOURNAL_RESTART_DELAY
+                break
+            chunks.append(data)
+            size += len(data)
+        return self._split(b''.join(chunks)) if chunks else []
+
+    def _start(self) -> bool:
+        try:
+            self._process = subprocess.Popen(
+                JOURNAL_COMMAND, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+            )
+        except OSError as e:
+            logger.warning(f"No se pudo iniciar journalctl: {e}")
+            self._retry_at = time.monotonic() + JOURNAL_RESTART_DELAY
+            return False
+        os.set_blocking(self._process.stdout.fileno(), False)
+        self._partial = b''
+        return True
+
+    def close(self):
+        if self._process is not None:
+            if self._process.poll() is None:
+                self._process.terminate()
+                try:
+                    self._process.wait(timeout=2)
+                except subprocess.TimeoutExpired:
+                    self._process.kill()
+            self._process.stdout.close()
+            self._process = None
+
+class AlertLimiter:
+    """
+    Deduplica y limita las alertas de logs. La primera coincidencia de cada
+    (regla, clave) alerta enseguida; sus repeticiones durante 'window'
+    segundos se cuentan y se resumen al cerrarse la ventana. Cada regla emite
+    como máximo 'burst' alertas por ventana: el resto (p. ej. un ataque desde
+    muchas IPs) se resume en un único aviso.
+    """
+
+    def __init__(self, window: float = LOG_ALERT_WINDOW, burst: int = LOG_RULE_BURST, max_keys: int = 4096):
+        self.window = window
+        self.burst = burst
+        self.max_keys = max_keys
+        # (regla, clave) → [inicio de la ventana, repeticiones, alertada]
+        self._keys: Dict[Tuple[str, str], list] = OrderedDict()
+        # regla → [inicio de la ventana, alertas emitidas, coincidencias resumidas, claves resumidas]
+        self._rules: Dict[str, list] = {}
+        self._summaries: List[tuple] = []
+
+    def hit(self, rule: LogRule, key: str, now: float) -> bool:
+        """Registra una coincidencia; True si debe alertarse ahora"""
+        entry = self._keys.get((rule.name, key))
+        if entry is not None and now - entry[0] < self.window:
+            entry[1] += 1
+            if not entry[2]:
+                self._suppress(rule, key, now)
+            return False
+
+        state = self._rules.get(rule.name)
+        if state is None or now - state[0] >= self.window:
+            if state is not None and state[2]:
+                self._summaries.append(('burst', rule.name, state[2], len(state[3])))
+            state = self._rules[rule.name] = [now, 0, 0, set()]
+        alerted = state[1] < self.burst
+        if alerted:
+            state[1] += 1
+        else:
+            self._suppress(rule, key, now)
+
+        self._keys.pop((rule.name, key), None)
+        self._keys[(rule.name, key)] = [now, 0, alerted]
+        while len(self._keys) > self.max_keys:
+            self._keys.popitem(last=False)
+        return alerted
+
+    def _suppress(self, rule: LogRule, key: str, now: float):
+        state = self._rules.setdefault(rule.name, [now, self.burst, 0, set()])
+        state[2] += 1
+        if len(state[3]) < self.max_keys:
+            state[3].add(key)
+        LOG_SUPPRESSED.inc(rule=rule.name)
+
+    def expire(self, now: float) -> List[tuple]:
+        """
+        Cierra las ventanas vencidas. Retorna ('repeat', regla, clave, repeticiones)
+        y ('burst', regla, coincidencias, claves distintas) para los resúmenes.
+        """
+        summaries, self._summaries = self._summaries, []
+        # Las entradas están en orden de apertura: basta con revisar el principio
+        while self._keys:
+            (rule_name, key), (started, repeats, alerted) = next(iter(self._keys.items()))
+            if now - started < self.window:
+                break
+            self._keys.popitem(last=False)
+            if alerted and repeats:
+                summaries.append(('repeat', rule_name, key, repeats))
+        for rule_name, (started, _, suppressed, keys) in list(self._rules.items()):
+            if now - started >= self.window:
+                del self._rules[rule_name]
+                if suppressed:
+                    summaries.append(('burst', rule_name, suppressed, len(keys)))
+        return summaries
+
+class LogWatcher:
+    """
+    Sigue los logs configurados en LOG_WATCH en un hilo dedicado y convierte
+    las líneas que coinciden con las reglas en alertas, vía
+    on_alert(tipo, severidad, mensaje, origen). Cada vuelta lee como máximo
+    LOG_READ_LIMIT bytes por origen, y las líneas se filtran por palabras
+    clave (en bytes, sin decodificar) antes de probar las expresiones.
+    """
+
+    def __init__(self, on_alert: Callable[[str, str, str, str], None],
+                 sources: Optional[Dict[str, List[str]]] = None, interval: float = LOG_POLL_INTERVAL,
+                 limiter: Optional[AlertLimiter] = None):
+        self.on_alert = on_alert
+        self.interval = interval
+        self.limiter = limiter or AlertLimiter()
+        self.sources = []
+        self._rules: Dict[str, LogRule] = {}
+        for name, rule_sets in (LOG_WATCH if sources is None else sources).items():
+            unknown = [rule_set for rule_set in rule_sets if rule_set not in RULE_SETS]
+            if unknown:
+                logger.warning(f"Reglas de log desconocidas para {name}: {', '.join(unknown)}")
+            rules = [rule for rule_set in rule_sets for rule in RULE_SETS.get(rule_set, ())]
+            if not rules:
+                continue
+            for rule in rules:
+                self._rules[rule.name] = rule
+            self.sources.append(JournalSource(rules) if name == JOURNAL_SOURCE else FileSource(name, rules))
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if not self.sources or (self._thread and self._thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='LogWatcher', daemon=True)
+        self._thread.start()
+        logger.info(f"Vigilancia de logs iniciada: {', '.join(source.name for source in self.sources)}")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 2)
+            self._thread = None
+
+    def _run(self):
+        try:
+            # Primera lectura: fija la posición al final de cada archivo
+            for source in self.sources:
+                source.read()
+            while not self._stop_event.is_set():
+                fds = [fd for fd in (source.fileno() for source in self.sources) if fd is not None]
+                if fds:
+                    # El journal despierta el hilo apenas hay datos; los archivos se revisan igual en cada vuelta
+                    select.select(fds, [], [], self.interval)
+                else:
+                    self._stop_event.wait(self.interval)
+                self.poll()
+        finally:
+            for source in self.sources:
+                source.close()
+
+    def poll(self):
+        """Una vuelta: lee todos los orígenes, evalúa las reglas y cierra las ventanas vencidas"""
+        now = time.monotonic()
+        for source in self.sources:
+            try:
+                lines = source.read()
+            except OSError as e:
+                logger.error(f"Error leyendo {source.name}: {e}")
+                continue
+            for line in lines:
+                self._match(source, line, now)
+        for summary in self.limiter.expire(now):
+            self._report_summary(summary)
+
+    def _match(self, source, line: bytes, now: float):
+        for rule in source.rules:
+            if not any(keyword in line for keyword in rule.keywords):
+                continue
+            text = line.decode('utf-8', errors='replace')
+            match = rule.regex.search(text)
+            if match is None:
+                continue
+            LOG_MATCHES.inc(rule=rule.name)
+            key = (match.group(rule.key) or next((value for value in match.groups() if value), '')).strip()
+            if self.limiter.hit(rule, key, now):
+                # Las comillas invertidas romperían el bloque de código del mensaje
+                excerpt = text.strip().replace('`', "'")[:500]
+                self.on_alert(
+                    rule.alert_type, rule.severity,
+                    f"{rule.title}\n{rule.key_label}: `{key}`\nOrigen: `{source.name}`\n```\n{excerpt}\n```",
+                    f"log:{rule.name}"
+                )
+            return
+
+    def _report_summary(self, summary: tuple):
+        kind, rule_name = summary[0], summary[1]
+        rule = self._rules[rule_name]
+        minutes = self.limiter.window / 60
+        if kind == 'repeat':
+            _, _, key, repeats = summary
+            times = 'repetición' if repeats == 1 else 'repeticiones'
+            message = f"{rule.title}\n{rule.key_label}: `{key}`\n🔁 {repeats} {times} más en {minutes:.0f} min"
+        else:
+            _, _, count, keys = summary
+            matches = 'coincidencia' if count == 1 else 'coincidencias'
+            message = f"{rule.title}\n🔇 {count} {matches} más sin alertar ({keys} distintas) en {minutes:.0f} min"
+        self.on_alert(rule.alert_type, rule.severity, message, f"log:{rule.name}")
@@ -0,0 +1,127 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from typing import Callable, Optional, Tuple
+from config.config import (
+    LOOP_LAG_INTERVAL, STATS_WINDOW, LOOP_WATCHDOG_INTERVAL, LOOP_BLOCK_THRESHOLD, LOOP_STACK_DEPTH
+)
+from utils.logger import logger
+from utils.metrics import REGISTRY
+
+LOOP_LAG = REGISTRY.histogram(
+    'bot_event_loop_lag_seconds', 'Retraso del event loop al despertar una tarea programada',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5), window=STATS_WINDOW
+)
+LOOP_BLOCKS = REGISTRY.counter(
+    'bot_event_loop_blocks_total', 'Veces que el event loop estuvo bloqueado más que el umbral del watchdog'
+)
+
+class LoopLagMonitor:
+    """
+    Mide cuánto tarda el event loop en retomar una tarea que pidió dormir
+    'interval' segundos. Un retraso alto indica código bloqueante en el loop.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - expected)
+            self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG.observe(lag)
+
+class LoopWatchdog:
+    """
+    Hilo que comprueba que el event loop responde. Cada 'interval' segundos
+    programa un callback en el loop; si no se ejecuta antes de 'threshold'
+    segundos, el loop está bloqueado por código síncrono: se captura la pila
+    del hilo del loop con sys._current_frames() y se registra en el log.
+    Cuando el loop se recupera se llama a on_block(duración, pila).
+    """
+
+    def __init__(self, interval: float = LOOP_WATCHDOG_INTERVAL, threshold: float = LOOP_BLOCK_THRESHOLD,
+                 on_block: Optional[Callable[[float, str], None]] = None):
+        self.interval = interval
+        self.threshold = threshold
+        self.on_block = on_block
+        self.blocks = 0
+        self.last_block: Optional[Tuple[float, float]] = None  # (momento, duración)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Inicia el hilo de vigilancia (debe llamarse dentro del event loop a vigilar)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='LoopWatchdog', daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        """Detiene el hilo; la espera se hace fuera del event loop, que el hilo necesita libre para salir"""
+        self._stop_event.set()
+        if self._thread:
+            thread, self._thread = self._thread, None
+            await asyncio.to_thread(thread.join, self.interval + self.threshold + 1)
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            answered = threading.Event()
+            sent = time.monotonic()
+            try:
+                self._loop.call_soon_threadsafe(answered.set)
+            except RuntimeError:
+                return  # El loop ya se cerró
+            if answered.wait(self.threshold):
+                continue
+            if self._stop_event.is_set():
+                return  # El apagado puede tardar; no es un bloqueo a informar
+
+            stack = self._loop_stack()
+            logger.warning(
+                f"Event loop bloqueado más de {self.threshold}s; pila del hilo del loop:\n{stack}"
+            )
+            # Se espera a que el loop se libere para conocer la duración total
+            while not answered.wait(self.interval):
+                if self._stop_event.is_set():
+                    return
+            duration = time.monotonic() - sent
+            self.blocks += 1
+            self.last_block = (time.time(), duration)
+            LOOP_BLOCKS.inc()
+            logger.warning(f"Event loop recuperado tras al menos {duration:.2f}s bloqueado")
+            if self.on_block is not None:
+                try:
+                    self.on_block(duration, stack)
+                except Exception as e:
+                    logger.error(f"Error notificando el bloqueo del event loop: {e}")
+
+    def _loop_stack(self) -> str:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return "(pila no disponible)"
+        return ''.join(traceback.format_stack(frame, limit=LOOP_STACK_DEPTH))
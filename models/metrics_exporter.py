@@ -0,0 +1,129 @@
+import asyncio
+from typing import Optional
+from config.config import METRICS_LISTEN, METRICS_PORT
+from utils.metrics import REGISTRY, MetricsRegistry
+from utils.logger import logger
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# (métrica, campo de MetricsSnapshot, descripción)
+SNAPSHOT_GAUGES = (
+    ('bot_system_cpu_percent', 'cpu_percent', 'Uso de CPU en la última muestra'),
+    ('bot_system_cpu_count', 'cpu_count', 'Núcleos de CPU'),
+    ('bot_system_memory_total_bytes', 'memory_total', 'Memoria total'),
+    ('bot_system_memory_used_bytes', 'memory_used', 'Memoria usada'),
+    ('bot_system_memory_percent', 'memory_percent', 'Porcentaje de memoria usada'),
+    ('bot_system_disk_total_bytes', 'disk_total', 'Tamaño del disco raíz'),
+    ('bot_system_disk_used_bytes', 'disk_used', 'Espacio usado del disco raíz'),
+    ('bot_system_disk_percent', 'disk_percent', 'Porcentaje usado del disco raíz'),
+    ('bot_system_sample_timestamp_seconds', 'timestamp', 'Momento de la última muestra (epoch)')
+)
+
+class MetricsExporter:
+    """
+    Servidor HTTP mínimo en el event loop que publica GET /metrics para
+    Prometheus. Cada lectura solo formatea los valores ya registrados: no
+    consulta psutil ni espera al muestreador.
+    """
+
+    def __init__(self, host: str = METRICS_LISTEN, port: int = METRICS_PORT,
+                 registry: MetricsRegistry = REGISTRY):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        if self._server is None:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+            logger.info(f"Métricas de Prometheus en http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Se descartan las cabeceras: la respuesta no depende de ellas
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) < 2 or parts[0] not in ('GET', 'HEAD'):
+                status, body = '405 Method Not Allowed', b''
+            elif parts[1].split('?', 1)[0] != '/metrics':
+                status, body = '404 Not Found', b''
+            else:
+                status, body = '200 OK', self.registry.render().encode()
+            headers = (
+                f"HTTP/1.1 {status}\r\n"
+                f"Content-Type: {CONTENT_TYPE}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n"
+            )
+            writer.write(headers.encode('latin-1'))
+            if parts and parts[0] != 'HEAD':
+                writer.write(body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            logger.debug(f"Petición de métricas incompleta: {e}")
+        finally:
+            writer.close()
+
+def register_system_metrics(sampler, net_monitor, disk_monitor, registry: MetricsRegistry = REGISTRY):
+    """
+    Publica la última muestra del muestreador y las tasas de red y disco ya
+    calculadas. Las funciones solo leen lo que guardó el hilo de muestreo.
+    """
+    def snapshot_field(field):
+        def read():
+            snapshot = sampler.get_snapshot()
+            return None if snapshot is None else getattr(snapshot, field)
+        return read
+
+    def load_average():
+        snapshot = sampler.get_snapshot()
+        if snapshot is None:
+            return None
+        return {(period,): value for period, value in zip(('1m', '5m', '15m'), snapshot.load_avg)}
+
+    def network_totals():
+        snapshot = sampler.get_snapshot()
+        if snapshot is None:
+            return None
+        return {('sent',): snapshot.net_bytes_sent, ('recv',): snapshot.net_bytes_recv}
+
+    def network_rates():
+        return {
+            (nic, direction): rates[f'bytes_{direction}']
+            for nic, rates in net_monitor.rates().items()
+            for direction in ('sent', 'recv')
+        }
+
+    def disk_rates():
+        return {
+            (disk, direction): rates[f'{direction}_bytes']
+            for disk, rates in disk_monitor.rates().items()
+            for direction in ('read', 'write')
+        }
+
+    def disk_busy():
+        return {(disk,): rates['busy'] for disk, rates in disk_monitor.rates().items()}
+
+    for name, field, documentation in SNAPSHOT_GAUGES:
+        registry.gauge(name, documentation).set_function(snapshot_field(field))
+    registry.gauge('bot_system_load_average', 'Carga media del sistema', ('period',)).set_function(load_average)
+    registry.counter(
+        'bot_system_network_bytes_total', 'Bytes de red enviados y recibidos desde el arranque', ('direction',)
+    ).set_function(network_totals)
+    registry.gauge(
+        'bot_network_bytes_per_second', 'Tráfico por interfaz en el último intervalo', ('interface', 'direction')
+    ).set_function(network_rates)
+    registry.gauge(
+        'bot_disk_bytes_per_second', 'Lectura y escritura por dispositivo en el último intervalo', ('device', 'direction')
+    ).set_function(disk_rates)
+    registry.gauge(
+        'bot_disk_busy_percent', 'Porcentaje de ocupación por dispositivo en el último intervalo', ('device',)
+    ).set_function(disk_busy)
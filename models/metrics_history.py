@@ -0,0 +1,136 @@
+import threading
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+from config.config import HISTORY_TIERS
+from models.metrics_sampler import MetricsSnapshot
+
+METRICS = ('cpu', 'memory', 'disk', 'load', 'net_sent', 'net_recv')
+
+class RingBuffer:
+    """Buffer circular de tamaño fijo respaldado por arrays compactos"""
+
+    def __init__(self, capacity: int, metrics: Sequence[str] = METRICS):
+        self.capacity = capacity
+        self._timestamps = array('d', bytes(8 * capacity))
+        self._values = {metric: array('f', bytes(4 * capacity)) for metric in metrics}
+        self._head = 0  # Próxima posición a escribir
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp: float, values: Dict[str, float]):
+        """Agrega un punto en O(1), sobrescribiendo el más antiguo si está lleno"""
+        self._timestamps[self._head] = timestamp
+        for metric, column in self._values.items():
+            column[self._head] = values.get(metric, 0.0)
+        self._head = (self._head + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def oldest_timestamp(self) -> Optional[float]:
+        if not self._count:
+            return None
+        return self._timestamps[(self._head - self._count) % self.capacity]
+
+    def series(self, metric: str, since: float = 0.0) -> List[Tuple[float, float]]:
+        """Puntos (timestamp, valor) de una métrica desde 'since', del más antiguo al más reciente"""
+        column = self._values[metric]
+        points = []
+        start = self._head - self._count
+        for offset in range(self._count):
+            index = (start + offset) % self.capacity
+            timestamp = self._timestamps[index]
+            if timestamp >= since:
+                points.append((timestamp, column[index]))
+        return points
+
+    def memory_bytes(self) -> int:
+        return self._timestamps.itemsize * self.capacity + sum(
+            column.itemsize * self.capacity for column in self._values.values()
+        )
+
+class _Rollup:
+    """Acumula muestras hasta completar un intervalo y guarda su promedio"""
+
+    def __init__(self, resolution: float, capacity: int):
+        self.resolution = resolution
+        self.buffer = RingBuffer(capacity)
+        self._bucket: Optional[float] = None
+        self._sums = dict.fromkeys(METRICS, 0.0)
+        self._count = 0
+
+    def add(self, timestamp: float, values: Dict[str, float]):
+        bucket = timestamp - timestamp % self.resolution
+        if self._bucket is not None and bucket != self._bucket:
+            self.flush()
+        self._bucket = bucket
+        for metric in METRICS:
+            self._sums[metric] += values.get(metric, 0.0)
+        self._count += 1
+
+    def flush(self):
+        if not self._count:
+            return
+        self.buffer.append(self._bucket, {metric: total / self._count for metric, total in self._sums.items()})
+        self._sums = dict.fromkeys(METRICS, 0.0)
+        self._count = 0
+
+class MetricsHistory:
+    """Historial de métricas en varias resoluciones (crudo, 1m, 5m, 1h) con memoria acotada"""
+
+    def __init__(self, tiers: Sequence[Tuple[float, int]] = HISTORY_TIERS):
+        self._lock = threading.Lock()
+        self._tiers = [_Rollup(resolution, capacity) for resolution, capacity in tiers]
+        self._previous: Optional[MetricsSnapshot] = None
+
+    def add_snapshot(self, snapshot: MetricsSnapshot) -> Dict[str, float]:
+        """Convierte la muestra en valores, los agrega y los retorna"""
+        net_sent = net_recv = 0.0
+        previous = self._previous
+        if previous is not None and snapshot.timestamp > previous.timestamp:
+            elapsed = snapshot.timestamp - previous.timestamp
+            net_sent = max(0, snapshot.net_bytes_sent - previous.net_bytes_sent) / elapsed
+            net_recv = max(0, snapshot.net_bytes_recv - previous.net_bytes_recv) / elapsed
+        self._previous = snapshot
+
+        values = {
+            'cpu': snapshot.cpu_percent,
+            'memory': snapshot.memory_percent,
+            'disk': snapshot.disk_percent,
+            'load': snapshot.load_avg[0],
+            'net_sent': net_sent,
+            'net_recv': net_recv
+        }
+        self.add(snapshot.timestamp, values)
+        return values
+
+    def add(self, timestamp: float, values: Dict[str, float]):
+        with self._lock:
+            for tier in self._tiers:
+                tier.add(timestamp, values)
+
+    def load(self, store, now: float):
+        """
+        Reconstruye el historial desde el almacén persistente. Cada resolución
+        se carga con promedios calculados por SQLite, sin reproducir muestra a muestra.
+        """
+        with self._lock:
+            for tier in self._tiers:
+                since = now - tier.resolution * tier.buffer.capacity
+                for timestamp, values in store.aggregate(since, tier.resolution):
+                    tier.buffer.append(timestamp, values)
+
+    def query(self, metric: str, window: float, now: float) -> List[Tuple[float, float]]:
+        """Retorna la serie de la ventana indicada usando la resolución más fina que la cubra"""
+        if metric not in METRICS:
+            raise ValueError(f"Métrica desconocida: {metric}")
+        since = now - window
+        with self._lock:
+            for tier in self._tiers:
+                covered = tier.resolution * tier.buffer.capacity
+                if covered >= window or tier is self._tiers[-1]:
+                    return tier.buffer.series(metric, since)
+        return []
+
+    def memory_bytes(self) -> int:
+        return sum(tier.buffer.memory_bytes() for tier in self._tiers)
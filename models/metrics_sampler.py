@@ -0,0 +1,118 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+import psutil
+from config.config import SAMPLE_INTERVAL
+from utils.logger import logger
+
+@dataclass(frozen=True)
+class MetricsSnapshot:
+    timestamp: float
+    cpu_percent: float
+    cpu_count: int
+    memory_total: int
+    memory_used: int
+    memory_percent: float
+    disk_total: int
+    disk_used: int
+    disk_percent: float
+    net_bytes_sent: int
+    net_bytes_recv: int
+    load_avg: Tuple[float, float, float]
+
+class MetricsSampler:
+    """Muestrea métricas del sistema en un hilo dedicado, fuera del event loop"""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self._interval = interval
+        self._snapshot: Optional[MetricsSnapshot] = None
+        self._listeners: List[Callable[[MetricsSnapshot], None]] = []
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def interval(self) -> float:
+        return self._interval
+
+    def get_snapshot(self) -> Optional[MetricsSnapshot]:
+        """Retorna la última muestra disponible (None si aún no hay datos)"""
+        return self._snapshot
+
+    def add_listener(self, callback: Callable[[MetricsSnapshot], None]):
+        """Registra una función que se llama (en el hilo del muestreador) con cada muestra"""
+        self._listeners.append(callback)
+
+    def start(self):
+        """Inicia el hilo de muestreo"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='MetricsSampler', daemon=True)
+        self._thread.start()
+        logger.info(f"Muestreador de métricas iniciado (intervalo: {self._interval}s)")
+
+    def stop(self):
+        """Detiene el hilo de muestreo"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self._interval + 1)
+            self._thread = None
+
+    def _run(self):
+        # La primera llamada sin intervalo solo fija la referencia para el cálculo de CPU
+        psutil.cpu_percent(interval=None)
+        if self._stop_event.wait(min(1.0, self._interval)):
+            return
+
+        next_tick = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                self.sample_now()
+            except Exception as e:
+                logger.error(f"Error muestreando métricas del sistema: {e}")
+
+            # Mantener un tick fijo aunque el muestreo tarde
+            next_tick += self._interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                next_tick = time.monotonic()
+                delay = 0
+            self._stop_event.wait(delay)
+
+    def sample_now(self) -> MetricsSnapshot:
+        """Toma una muestra y notifica a los listeners en el hilo que llama"""
+        self._snapshot = self._sample()
+        self._notify(self._snapshot)
+        return self._snapshot
+
+    def _sample(self) -> MetricsSnapshot:
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage('/')
+        net = psutil.net_io_counters()
+        try:
+            load_avg = psutil.getloadavg()
+        except (AttributeError, OSError):
+            load_avg = (0.0, 0.0, 0.0)
+
+        return MetricsSnapshot(
+            timestamp=time.time(),
+            cpu_percent=psutil.cpu_percent(interval=None),
+            cpu_count=psutil.cpu_count() or 1,
+            memory_total=memory.total,
+            memory_used=memory.used,
+            memory_percent=memory.percent,
+            disk_total=disk.total,
+            disk_used=disk.used,
+            disk_percent=disk.percent,
+            net_bytes_sent=net.bytes_sent if net else 0,
+            net_bytes_recv=net.bytes_recv if net else 0,
+            load_avg=tuple(load_avg)
+        )
+
+    def _notify(self, snapshot: MetricsSnapshot):
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logger.error(f"Error en listener de métricas: {e}")
@@ -0,0 +1,163 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from config.config import METRICS_DB_PATH, STORE_FLUSH_INTERVAL, STORE_RETENTION_DAYS, STORE_COMPACT_INTERVAL
+from models.metrics_history import METRICS
+from utils.logger import logger
+
+# Alertas que se conservan en memoria si la base de datos no pudo abrirse (para el historial de /alerts)
+UNSTORED_ALERTS = 100
+
+class MetricsStore:
+    """
+    Almacén persistente de métricas y alertas sobre SQLite en modo WAL.
+    Las escrituras se agrupan y se confirman en lote cada STORE_FLUSH_INTERVAL
+    segundos para reducir el desgaste de la tarjeta SD.
+    """
+
+    def __init__(self, path: str = METRICS_DB_PATH, flush_interval: float = STORE_FLUSH_INTERVAL,
+                 retention_days: float = STORE_RETENTION_DAYS, compact_interval: float = STORE_COMPACT_INTERVAL):
+        self.path = path
+        self._flush_interval = flush_interval
+        self._retention = retention_days * 86400
+        self._compact_interval = compact_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._pending_samples: List[tuple] = []
+        self._pending_alerts: List[tuple] = []
+        self._last_flush = time.monotonic()
+        self._last_compact = time.monotonic()
+
+    def open(self):
+        """Abre (o crea) la base de datos"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        # auto_vacuum debe fijarse antes de crear las tablas
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        columns = ', '.join(f"{metric} REAL" for metric in METRICS)
+        # ts en milisegundos como clave primaria entera: la tabla queda ordenada por tiempo
+        conn.execute(f"CREATE TABLE IF NOT EXISTS metrics (ts INTEGER PRIMARY KEY, {columns})")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS alerts ("
+            "id INTEGER PRIMARY KEY, ts REAL NOT NULL, type TEXT NOT NULL, "
+            "severity TEXT NOT NULL, source TEXT, message TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS alerts_type_ts ON alerts (type, ts)")
+        self._conn = conn
+        logger.info(f"Almacén de métricas abierto en {self.path}")
+
+    def close(self):
+        if self._conn is None:
+            return
+        self.flush()
+        with self._lock:
+            try:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error as e:
+                logger.error(f"Error en checkpoint del almacén de métricas: {e}")
+            self._conn.close()
+            self._conn = None
+
+    def add_sample(self, timestamp: float, values: Dict[str, float]):
+        """Encola una muestra; se escribe en el próximo lote. Sin base de datos se descarta"""
+        row = (int(timestamp * 1000),) + tuple(values.get(metric, 0.0) for metric in METRICS)
+        with self._lock:
+            if self._conn is None:
+                return
+            self._pending_samples.append(row)
+        self.maintain()
+
+    def add_alert(self, alert):
+        with self._lock:
+            self._pending_alerts.append(
+                (alert.timestamp.timestamp(), alert.type, alert.severity, alert.source, alert.message)
+            )
+            if self._conn is None:
+                # Nunca se escribirán: solo se guardan las últimas
+                del self._pending_alerts[:-UNSTORED_ALERTS]
+
+    def maintain(self):
+        """Escribe el lote pendiente y compacta cuando corresponde"""
+        now = time.monotonic()
+        if now - self._last_flush >= self._flush_interval:
+            self.flush()
+        if now - self._last_compact >= self._compact_interval:
+            self.compact()
+
+    def flush(self):
+        """Confirma en una sola transacción todas las escrituras pendientes"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if self._conn is None or not (self._pending_samples or self._pending_alerts):
+                return
+            samples, self._pending_samples = self._pending_samples, []
+            alerts, self._pending_alerts = self._pending_alerts, []
+            placeholders = ', '.join('?' * (len(METRICS) + 1))
+            try:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(f"INSERT OR REPLACE INTO metrics VALUES ({placeholders})", samples)
+                self._conn.executemany(
+                    "INSERT INTO alerts (ts, type, severity, source, message) VALUES (?, ?, ?, ?, ?)",
+                    alerts
+                )
+                self._conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                self._conn.execute("ROLLBACK")
+                logger.error(f"Error guardando métricas: {e}")
+
+    def compact(self):
+        """Elimina datos fuera del período de retención y libera el espacio"""
+        with self._lock:
+            self._last_compact = time.monotonic()
+            if self._conn is None:
+                return
+            cutoff = time.time() - self._retention
+            try:
+                self._conn.execute("DELETE FROM metrics WHERE ts < ?", (int(cutoff * 1000),))
+                self._conn.execute("DELETE FROM alerts WHERE ts < ?", (cutoff,))
+                self._conn.execute("PRAGMA incremental_vacuum")
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except sqlite3.Error as e:
+                logger.error(f"Error compactando el almacén de métricas: {e}")
+
+    def aggregate(self, since: float, resolution: float) -> List[Tuple[float, Dict[str, float]]]:
+        """Promedios por intervalo de 'resolution' segundos desde 'since'"""
+        step = int(resolution * 1000)
+        averages = ', '.join(f"AVG({metric})" for metric in METRICS)
+        with self._lock:
+            if self._conn is None:
+                return []
+            rows = self._conn.execute(
+                f"SELECT (ts / ?) * ? AS bucket, {averages} FROM metrics "
+                "WHERE ts >= ? GROUP BY bucket ORDER BY bucket",
+                (step, step, int(since * 1000))
+            ).fetchall()
+        return [(row[0] / 1000, dict(zip(METRICS, row[1:]))) for row in rows]
+
+    def last_alert_times(self) -> Dict[str, float]:
+        """Último instante en que se disparó cada tipo de alerta (sin contar las de resolución)"""
+        with self._lock:
+            if self._conn is None:
+                return {}
+            rows = self._conn.execute(
+                "SELECT type, MAX(ts) FROM alerts WHERE severity != 'info' GROUP BY type"
+            ).fetchall()
+        return dict(rows)
+
+    def recent_alerts(self, limit: int = 10) -> List[tuple]:
+        """Últimas alertas (ts, tipo, severidad, origen, mensaje), incluidas las aún no escritas"""
+        with self._lock:
+            pending = self._pending_alerts[::-1][:limit]
+            if self._conn is None or len(pending) >= limit:
+                return pending
+            rows = self._conn.execute(
+                "SELECT ts, type, severity, source, message FROM alerts ORDER BY ts DESC LIMIT ?",
+                (limit - len(pending),)
+            ).fetchall()
+        return pending + rows
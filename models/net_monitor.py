@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, List, Optional
+import psutil
+from config.config import SAMPLE_INTERVAL, NET_DEFAULT_SPEED
+
+# Campos de net_io_counters usados para calcular tasas
+FIELDS = ('bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv', 'errin', 'errout', 'dropin', 'dropout')
+
+class NetworkMonitor:
+    """
+    Calcula tasas por interfaz (bytes/s, paquetes/s, errores y descartes) a partir
+    de las muestras de net_io_counters(pernic=True) tomadas en cada tick.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL, max_window: float = 300,
+                 default_speed: float = NET_DEFAULT_SPEED):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=int(max_window / interval) + 2)
+        self._default_speed = default_speed
+        self._speeds: Dict[str, float] = {}
+        self._last_speed_refresh = 0.0
+
+    def update(self, snapshot=None):
+        """Toma una muestra de contadores; se registra como listener del muestreador"""
+        now = time.time()
+        counters = {
+            nic: tuple(getattr(io, field) for field in FIELDS)
+            for nic, io in psutil.net_io_counters(pernic=True).items()
+        }
+        if now - self._last_speed_refresh >= 60:
+            self._last_speed_refresh = now
+            self._speeds = {nic: stats.speed for nic, stats in psutil.net_if_stats().items()}
+        with self._lock:
+            self._samples.append((now, counters))
+
+    def rates(self, window: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Tasas por interfaz en la ventana indicada (en segundos). Sin ventana se usa
+        el último intervalo de muestreo.
+        """
+        with self._lock:
+            if len(self._samples) < 2:
+                return {}
+            newest_ts, newest = self._samples[-1]
+            reference_ts, reference = self._samples[-2]
+            if window is not None:
+                # La muestra más antigua que siga dentro de la ventana
+                for timestamp, counters in self._samples:
+                    if timestamp >= newest_ts - window:
+                        reference_ts, reference = timestamp, counters
+                        break
+
+        elapsed = newest_ts - reference_ts
+        if elapsed <= 0:
+            return {}
+        result = {}
+        for nic, values in newest.items():
+            previous = reference.get(nic)
+            if previous is None:
+                continue
+            # max(0, ...) evita tasas negativas si los contadores se reinician
+            result[nic] = {
+                field: max(0, value - old) / elapsed
+                for field, value, old in zip(FIELDS, values, previous)
+            }
+        return result
+
+    def utilization(self, nic: str, rates: Dict[str, float]) -> Optional[float]:
+        """Porcentaje de uso del enlace según su velocidad (Mbps)"""
+        if nic == 'lo':
+            return None
+        speed = self._speeds.get(nic) or self._default_speed
+        if not speed:
+            return None
+        peak = max(rates['bytes_sent'], rates['bytes_recv']) * 8
+        return peak / (speed * 1_000_000) * 100
+
+    def max_utilization(self) -> float:
+        """Mayor porcentaje de uso entre todas las interfaces en el último intervalo"""
+        values = [
+            self.utilization(nic, nic_rates)
+            for nic, nic_rates in self.rates().items()
+        ]
+        return max((value for value in values if value is not None), default=0.0)
+
+    @staticmethod
+    def connections_by_process(names: Dict[int, str], limit: int = 10) -> List[dict]:
+        """
+        Resume las conexiones inet por proceso en una sola pasada por
+        net_connections. Puede tardar en hosts con muchas conexiones, por lo que
+        debe llamarse fuera del event loop.
+        """
+        summary: Dict[Optional[int], dict] = {}
+        for conn in psutil.net_connections(kind='inet'):
+            entry = summary.setdefault(conn.pid, {
+                'pid': conn.pid,
+                'name': names.get(conn.pid, '?') if conn.pid else '?',
+                'total': 0,
+                'states': Counter(),
+                'listen': set(),
+                'remotes': Counter()
+            })
+            entry['total'] += 1
+            entry['states'][conn.status] += 1
+            if conn.status == psutil.CONN_LISTEN and conn.laddr:
+                entry['listen'].add(conn.laddr.port)
+            if conn.raddr:
+                entry['remotes'][conn.raddr.ip] += 1
+        return sorted(summary.values(), key=lambda entry: entry['total'], reverse=True)[:limit]
@@ -0,0 +1,96 @@
+import gzip
+import itertools
+import shutil
+import tempfile
+from collections import OrderedDict
+from typing import Optional
+from config.config import OUTPUT_PAGE_SIZE, OUTPUT_SPILL_SIZE, OUTPUT_MAX_SIZE, OUTPUT_STORE_SIZE
+
+def _is_continuation(byte: int) -> bool:
+    """Indica si el byte es la continuación de un carácter UTF-8 multibyte"""
+    return byte & 0xC0 == 0x80
+
+class OutputBuffer:
+    """Salida completa de un comando: en memoria mientras es pequeña y en disco al crecer"""
+
+    def __init__(self, spill_size: int = OUTPUT_SPILL_SIZE, max_size: int = OUTPUT_MAX_SIZE,
+                 page_size: int = OUTPUT_PAGE_SIZE):
+        self._file = tempfile.SpooledTemporaryFile(max_size=spill_size, mode='w+b')
+        self._size = 0
+        self._max_size = max_size
+        self.page_size = page_size
+        self.truncated = False
+        self.title = ''  # Encabezado mostrado sobre cada página
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def page_count(self) -> int:
+        return max(1, -(-self._size // self.page_size))
+
+    def write(self, text: str):
+        """Agrega texto al final; lo que supere el tamaño máximo se descarta"""
+        if self.truncated:
+            return
+        data = text.encode('utf-8')
+        if self._size + len(data) > self._max_size:
+            data = data[:self._max_size - self._size]
+            self.truncated = True
+        self._file.seek(0, 2)
+        self._file.write(data)
+        self._size += len(data)
+
+    def read_page(self, page: int) -> str:
+        """Lee una página sin cortar caracteres multibyte entre páginas"""
+        page = max(0, min(page, self.page_count - 1))
+        self._file.seek(page * self.page_size)
+        data = self._file.read(self.page_size + 4)
+
+        # Cada carácter pertenece a la página donde está su primer byte
+        start = 0
+        while start < len(data) and _is_continuation(data[start]):
+            start += 1
+        end = min(self.page_size, len(data))
+        while end < len(data) and _is_continuation(data[end]):
+            end += 1
+        return data[start:end].decode('utf-8', errors='replace')
+
+    def read_all(self) -> str:
+        self._file.seek(0)
+        return self._file.read().decode('utf-8', errors='replace')
+
+    def to_gzip(self):
+        """Comprime la salida por bloques en un archivo temporal listo para enviar"""
+        compressed = tempfile.TemporaryFile()
+        self._file.seek(0)
+        with gzip.GzipFile(fileobj=compressed, mode='wb') as gz:
+            shutil.copyfileobj(self._file, gz, 64 * 1024)
+        compressed.seek(0)
+        return compressed
+
+    def close(self):
+        self._file.close()
+
+class OutputStore:
+    """Mantiene las salidas paginadas más recientes; las más antiguas se liberan"""
+
+    def __init__(self, max_items: int = OUTPUT_STORE_SIZE):
+        self._max_items = max_items
+        self._items: "OrderedDict[int, OutputBuffer]" = OrderedDict()
+        self._ids = itertools.count(1)
+
+    def add(self, buffer: OutputBuffer) -> int:
+        buffer_id = next(self._ids)
+        self._items[buffer_id] = buffer
+        while len(self._items) > self._max_items:
+            _, old = self._items.popitem(last=False)
+            old.close()
+        return buffer_id
+
+    def get(self, buffer_id: int) -> Optional[OutputBuffer]:
+        buffer = self._items.get(buffer_id)
+        if buffer is not None:
+            self._items.move_to_end(buffer_id)
+        return buffer
@@ -0,0 +1,110 @@
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+import psutil
+
+SORT_KEYS = {
+    'cpu': 'cpu_percent',
+    'mem': 'memory_percent',
+    'io': 'io_rate',
+    'threads': 'num_threads'
+}
+
+class ProcessTable:
+    """
+    Tabla de procesos que conserva los objetos psutil.Process entre ticks. Solo
+    se crean objetos para PIDs nuevos y se descartan los muertos, de modo que
+    cpu_percent() mide el delta real desde el tick anterior.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._processes: Dict[int, psutil.Process] = {}
+        self._static: Dict[int, tuple] = {}  # pid -> (nombre, cmdline), leídos una sola vez
+        self._io: Dict[int, tuple] = {}  # pid -> (timestamp, bytes leídos + escritos)
+        self._rows: List[dict] = []
+        self.updated_at: Optional[float] = None
+
+    def update(self, snapshot=None):
+        """Actualiza la tabla; se registra como listener del muestreador"""
+        now = time.time()
+        pids = set(psutil.pids())
+
+        for pid in self._processes.keys() - pids:
+            self._forget(pid)
+        for pid in pids - self._processes.keys():
+            self._track(pid)
+
+        rows = []
+        for pid, proc in list(self._processes.items()):
+            try:
+                with proc.oneshot():
+                    name, cmdline = self._static[pid]
+                    rows.append({
+                        'pid': pid,
+                        'name': name,
+                        'cmdline': cmdline,
+                        'status': proc.status(),
+                        'cpu_percent': proc.cpu_percent(interval=None),
+                        'memory_percent': proc.memory_percent(),
+                        'num_threads': proc.num_threads(),
+                        'io_rate': self._io_rate(pid, proc, now)
+                    })
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                self._forget(pid)
+            except psutil.AccessDenied:
+                continue
+
+        with self._lock:
+            self._rows = rows
+            self.updated_at = now
+
+    def rows(self) -> List[dict]:
+        """Última tabla calculada (lectura sin consultar /proc)"""
+        with self._lock:
+            return self._rows
+
+    def top(self, sort: str = 'cpu', pattern: Optional[str] = None, limit: int = 10) -> List[dict]:
+        """Procesos ordenados por la clave indicada, opcionalmente filtrados por nombre o comando"""
+        rows = self.rows()
+        if pattern:
+            regex = re.compile(pattern, re.IGNORECASE)
+            rows = [row for row in rows if regex.search(row['name']) or regex.search(row['cmdline'])]
+        key = SORT_KEYS[sort]
+        return sorted(rows, key=lambda row: row[key] or 0, reverse=True)[:limit]
+
+    def _track(self, pid: int) -> Optional[psutil.Process]:
+        try:
+            proc = psutil.Process(pid)
+            with proc.oneshot():
+                name = proc.name()
+                try:
+                    cmdline = ' '.join(proc.cmdline())
+                except psutil.AccessDenied:
+                    cmdline = ''
+                # La primera llamada fija la referencia para el siguiente delta
+                proc.cpu_percent(interval=None)
+        except (psutil.NoSuchProcess, psutil.ZombieProcess, psutil.AccessDenied):
+            return None
+        self._processes[pid] = proc
+        self._static[pid] = (name, cmdline)
+        return proc
+
+    def _forget(self, pid: int):
+        self._processes.pop(pid, None)
+        self._static.pop(pid, None)
+        self._io.pop(pid, None)
+
+    def _io_rate(self, pid: int, proc: psutil.Process, now: float) -> Optional[float]:
+        """Bytes/s de E/S desde el tick anterior (None si no hay permisos)"""
+        try:
+            counters = proc.io_counters()
+        except (psutil.AccessDenied, AttributeError):
+            return None
+        total = counters.read_bytes + counters.write_bytes
+        previous = self._io.get(pid)
+        self._io[pid] = (now, total)
+        if previous is None or now <= previous[0]:
+            return 0.0
+        return max(0, total - previous[1]) / (now - previous[0])
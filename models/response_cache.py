@@ -0,0 +1,77 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from utils.metrics import REGISTRY
+
+CACHE_LOOKUPS = REGISTRY.counter(
+    'bot_response_cache_lookups_total', 'Consultas a la caché de respuestas por resultado', ('result',)
+)
+
+class ResponseCache:
+    """
+    Caché de respuestas ya formateadas para los comandos de monitoreo. Cada
+    entrada vale como máximo 'ttl' segundos y se descarta en cuanto el
+    muestreador publica una nueva muestra (version_fn cambia). Las peticiones
+    idénticas que llegan mientras se calcula una respuesta esperan ese mismo
+    cálculo en lugar de repetirlo.
+
+    Se usa solo desde el event loop, por lo que no necesita bloqueos.
+    """
+
+    def __init__(self, ttl: float, version_fn: Callable[[], Hashable]):
+        self.ttl = ttl
+        self._version_fn = version_fn
+        self._entries: Dict[Hashable, Tuple[Hashable, float, str]] = {}
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        CACHE_LOOKUPS.set_function(lambda: {
+            ('hit',): self.hits, ('miss',): self.misses, ('coalesced',): self.coalesced
+        })
+
+    async def get(self, key: Hashable, render: Callable[[], Awaitable[str]]) -> str:
+        """Retorna la respuesta en caché para 'key' o la calcula con 'render'"""
+        version = self._version_fn()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+            self.hits += 1
+            return entry[2]
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            # shield: si una petición se cancela, las demás siguen esperando el resultado
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await render()
+        except BaseException as e:
+            future.set_exception(e)
+            # Evita el aviso de excepción no recuperada si nadie más esperaba
+            future.exception()
+            raise
+        else:
+            self._entries[key] = (version, time.monotonic() + self.ttl, value)
+            future.set_result(value)
+            return value
+        finally:
+            del self._inflight[key]
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Descarta una entrada o toda la caché"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'entries': len(self._entries)
+        }
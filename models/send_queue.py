@@ -0,0 +1,330 @@
+import asyncio
+import itertools
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from telegram import error as telegram_error
+from config.config import (
+    SEND_GLOBAL_RATE, SEND_CHAT_RATE, SEND_GROUP_RATE, SEND_CHAT_BURST,
+    SEND_MAX_RETRIES, SEND_BACKOFF_BASE, SEND_BACKOFF_MAX, STATS_WINDOW
+)
+from utils.logger import logger
+from utils.metrics import REGISTRY
+
+# Prioridades de la cola: un número menor se envía antes
+PRIORITY_SECURITY = 0
+PRIORITY_ALERT = 1
+PRIORITY_NORMAL = 2
+
+MAX_MESSAGE_LENGTH = 4096
+
+PRIORITY_NAMES = {PRIORITY_SECURITY: 'security', PRIORITY_ALERT: 'alert', PRIORITY_NORMAL: 'normal'}
+
+API_REQUESTS = REGISTRY.counter(
+    'bot_telegram_requests_total', 'Llamadas a la API de Telegram por método y resultado', ('method', 'outcome')
+)
+API_DURATION = REGISTRY.histogram(
+    'bot_telegram_request_duration_seconds', 'Duración de las llamadas a la API de Telegram', ('method',),
+    window=STATS_WINDOW
+)
+QUEUE_WAIT = REGISTRY.histogram(
+    'bot_send_queue_wait_seconds', 'Espera en la cola de salida antes de cada intento de envío', window=STATS_WINDOW
+)
+QUEUE_DEPTH = REGISTRY.gauge('bot_send_queue_depth', 'Envíos pendientes en la cola de salida', ('priority',))
+
+class TokenBucket:
+    """Cubeta de fichas: 'rate' envíos por segundo con ráfagas de hasta 'capacity'"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self.blocked_until = 0.0  # Fijado por RetryAfter
+
+    def delay(self, now: float) -> float:
+        """Segundos hasta que haya una ficha disponible"""
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self._tokens < 1:
+            wait = max(wait, (1 - self._tokens) / self.rate)
+        return wait
+
+    def blocked_delay(self, now: float) -> float:
+        """Segundos de espera impuestos por RetryAfter, sin contar las fichas"""
+        return max(0.0, self.blocked_until - now)
+
+    def consume(self, now: float):
+        self._refill(now)
+        self._tokens -= 1
+
+    def block(self, until: float):
+        self.blocked_until = max(self.blocked_until, until)
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+@dataclass
+class _Request:
+    priority: int
+    seq: int
+    chat_id: int
+    call: Callable[[], Awaitable]
+    futures: List[asyncio.Future]
+    text: Optional[str] = None  # Solo en mensajes que se pueden fusionar
+    render: Optional[Callable[[str], Awaitable]] = None
+    merge_key: Optional[tuple] = None
+    supersede_key: Optional[tuple] = None
+    method: str = 'call'  # Método de la API, para las métricas
+    attempts: int = 0
+    not_before: float = 0.0
+    queued_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def new_message(self) -> bool:
+        """Los mensajes nuevos cuentan para el límite del chat; ediciones, borrados y botones solo para el global"""
+        return self.method.startswith('send')
+
+class SendQueue:
+    """
+    Cola central de salida hacia la API de Telegram. Respeta el límite global y
+    el de cada chat con cubetas de fichas, espera lo indicado por RetryAfter,
+    reintenta los errores de red con espera exponencial y aleatoria, fusiona
+    mensajes consecutivos al mismo chat y atiende primero las alertas de
+    seguridad. Los envíos a chats distintos salen en paralelo; dentro de un
+    mismo chat se mantiene el orden.
+    """
+
+    def __init__(self, global_rate: float = SEND_GLOBAL_RATE, chat_rate: float = SEND_CHAT_RATE,
+                 group_rate: float = SEND_GROUP_RATE, max_retries: int = SEND_MAX_RETRIES):
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chat_rate = chat_rate
+        self._group_rate = group_rate
+        self._buckets: Dict[int, TokenBucket] = {}
+        self.max_retries = max_retries
+        self._pending: List[_Request] = []
+        self._inflight: Set[int] = set()
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.merged = 0
+        self.throttled = 0
+        QUEUE_DEPTH.set_function(self._depth_by_priority)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for request in self._pending:
+            for future in request.futures:
+                future.cancel()
+        self._pending.clear()
+
+    async def send_message(self, bot, chat_id: int, text: str, parse_mode: Optional[str] = None,
+                           reply_markup=None, priority: int = PRIORITY_NORMAL, mergeable: bool = False):
+        """Envía un mensaje nuevo; si es 'mergeable' puede salir unido a otros del mismo chat"""
+        if mergeable and reply_markup is None:
+            def render(merged_text):
+                return bot.send_message(chat_id=chat_id, text=merged_text, parse_mode=parse_mode)
+            return await self._submit(
+                chat_id, priority, lambda: render(text),
+                text=text, render=render, merge_key=(int(chat_id), parse_mode), method='sendMessage'
+            )
+        return await self._submit(chat_id, priority, lambda: bot.send_message(
+            chat_id=chat_id, text=text, parse_mode=parse_mode, reply_markup=reply_markup
+        ), method='sendMessage')
+
+    async def reply(self, message, text: str, parse_mode: Optional[str] = None,
+                    reply_markup=None, priority: int = PRIORITY_NORMAL):
+        """Responde a un mensaje"""
+        return await self._submit(message.chat_id, priority, lambda: message.reply_text(
+            text, parse_mode=parse_mode, reply_markup=reply_markup
+        ), method='sendMessage')
+
+    async def edit(self, message, text: str, parse_mode: Optional[str] = None,
+                   reply_markup=None, priority: int = PRIORITY_NORMAL):
+        """
+        Edita un mensaje. Si ya hay una edición pendiente del mismo mensaje, se
+        reemplaza por esta y ambas esperas reciben el mismo resultado.
+        """
+        return await self._submit(
+            message.chat_id, priority,
+            lambda: message.edit_text(text, parse_mode=parse_mode, reply_markup=reply_markup),
+            supersede_key=(message.chat_id, message.message_id), method='editMessageText'
+        )
+
+    async def call(self, chat_id: int, call: Callable[[], Awaitable], priority: int = PRIORITY_NORMAL,
+                   method: str = 'call'):
+        """Encola cualquier otra llamada a la API dirigida a un chat (p. ej. send_document)"""
+        return await self._submit(chat_id, priority, call, method=method)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'pending': len(self._pending),
+            'sent': self.sent,
+            'merged': self.merged,
+            'throttled': self.throttled
+        }
+
+    def _depth_by_priority(self) -> Dict[tuple, int]:
+        depth = {(name,): 0 for name in PRIORITY_NAMES.values()}
+        for request in self._pending:
+            depth[(PRIORITY_NAMES[request.priority],)] += 1
+        return depth
+
+    def _submit(self, chat_id: int, priority: int, call: Callable[[], Awaitable], **kwargs) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        # TELEGRAM_ADMIN llega como texto; se normaliza para compartir la cubeta con message.chat_id
+        chat_id = int(chat_id)
+        supersede_key = kwargs.get('supersede_key')
+        if supersede_key is not None:
+            for request in self._pending:
+                if request.supersede_key == supersede_key:
+                    request.call = call
+                    request.priority = min(request.priority, priority)
+                    request.futures.append(future)
+                    return future
+
+        self._pending.append(_Request(priority, next(self._seq), chat_id, call, [future], **kwargs))
+        self._wakeup.set()
+        return future
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            # Los chats de grupo tienen identificador negativo y un límite menor
+            rate = self._group_rate if chat_id < 0 else self._chat_rate
+            bucket = self._buckets[chat_id] = TokenBucket(rate, SEND_CHAT_BURST)
+        return bucket
+
+    def _next_ready(self, now: float) -> Tuple[Optional[_Request], Optional[float]]:
+        """Primera petición enviable por prioridad y orden de llegada, o el tiempo hasta la próxima"""
+        shortest = None
+        # Un chat con un envío en curso o en espera no puede adelantar sus mensajes siguientes
+        blocked = set(self._inflight)
+        # Las llamadas que no crean mensajes solo esperan a lo que está en curso en su chat
+        waiting = set(self._inflight)
+        for request in sorted(self._pending, key=lambda request: (request.priority, request.seq)):
+            if request.chat_id in (blocked if request.new_message else waiting):
+                continue
+            bucket = self._bucket(request.chat_id)
+            wait = max(
+                request.not_before - now,
+                self._global.delay(now),
+                bucket.delay(now) if request.new_message else bucket.blocked_delay(now)
+            )
+            if wait <= 0:
+                return request, None
+            blocked.add(request.chat_id)
+            if not request.new_message:
+                waiting.add(request.chat_id)
+            shortest = wait if shortest is None else min(shortest, wait)
+        return None, shortest
+
+    def _collect_merges(self, request: _Request):
+        """Une al mensaje los siguientes del mismo chat que esperan en la cola, hasta el límite de Telegram"""
+        if request.merge_key is None:
+            return
+        followers = sorted(
+            (other for other in self._pending if other.chat_id == request.chat_id and other.seq > request.seq),
+            key=lambda other: other.seq
+        )
+        for other in followers:
+            # Solo mensajes consecutivos: cualquier otro envío al chat corta la fusión
+            if other.merge_key != request.merge_key:
+                break
+            if len(request.text) + len(other.text) + 2 > MAX_MESSAGE_LENGTH:
+                break
+            request.text += "\n\n" + other.text
+            request.futures.extend(other.futures)
+            request.priority = min(request.priority, other.priority)
+            self._pending.remove(other)
+            self.merged += 1
+
+    async def _run(self):
+        dispatches = set()
+        while True:
+            request, wait = self._next_ready(time.monotonic())
+            if request is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = time.monotonic()
+            self._pending.remove(request)
+            self._collect_merges(request)
+            self._global.consume(now)
+            if request.new_message:
+                self._bucket(request.chat_id).consume(now)
+            QUEUE_WAIT.observe(now - request.queued_at)
+            self._inflight.add(request.chat_id)
+            task = asyncio.create_task(self._dispatch(request))
+            dispatches.add(task)
+            task.add_done_callback(dispatches.discard)
+
+    async def _dispatch(self, request: _Request):
+        outcome = 'cancelled'
+        started = time.perf_counter()
+        try:
+            if request.render is not None:
+                result = await request.render(request.text)
+            else:
+                result = await request.call()
+        except telegram_error.RetryAfter as e:
+            outcome = 'retry_after'
+            delay = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else e.retry_after
+            self.throttled += 1
+            logger.warning(f"Límite de Telegram alcanzado en el chat {request.chat_id}; reintento en {delay}s")
+            self._bucket(request.chat_id).block(time.monotonic() + delay)
+            self._requeue(request)
+        except telegram_error.BadRequest as e:
+            outcome = 'bad_request'
+            self._fail(request, e)
+        except telegram_error.NetworkError as e:
+            outcome = 'timeout' if isinstance(e, telegram_error.TimedOut) else 'network_error'
+            request.attempts += 1
+            if request.attempts >= self.max_retries:
+                self._fail(request, e)
+            else:
+                backoff = min(SEND_BACKOFF_MAX, SEND_BACKOFF_BASE * 2 ** (request.attempts - 1))
+                request.not_before = time.monotonic() + backoff * random.uniform(0.5, 1.5)
+                logger.warning(f"Error de red enviando a {request.chat_id} ({e}); intento {request.attempts}")
+                self._requeue(request)
+        except Exception as e:
+            outcome = 'error'
+            self._fail(request, e)
+        else:
+            outcome = 'ok'
+            self.sent += 1
+            for future in request.futures:
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            API_REQUESTS.inc(method=request.method, outcome=outcome)
+            API_DURATION.observe(time.perf_counter() - started, method=request.method)
+            self._inflight.discard(request.chat_id)
+            self._wakeup.set()
+
+    def _requeue(self, request: _Request):
+        # Conserva su número de orden para no adelantarse a lo que ya estaba detrás
+        self._pending.append(request)
+
+    def _fail(self, request: _Request, error: Exception):
+        for future in request.futures:
+            if not future.done():
+                future.set_exception(error)
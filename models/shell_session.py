@@ -0,0 +1,352 @@
+import asyncio
+import codecs
+import fcntl
+import os
+import pty
+import re
+import secrets
+import shlex
+import signal
+import struct
+import termios
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+from config.config import BLACKLIST_COMMANDS, COMMAND_KILL_GRACE, SHELL_PATH, SHELL_MAX_SESSIONS, SHELL_IDLE_TIMEOUT
+from utils.logger import logger
+from utils.metrics import REGISTRY
+
+OPEN_SESSIONS = REGISTRY.gauge('bot_shell_sessions', 'Sesiones de shell abiertas por estado', ('state',))
+
+# Entorno de las sesiones: sin colores ni paginadores, que esperarían una tecla
+SESSION_ENV = {'TERM': 'dumb', 'PAGER': 'cat', 'GIT_PAGER': 'cat', 'SYSTEMD_PAGER': '', 'PS1': '', 'PS2': ''}
+TERMINAL_SIZE = (50, 120)  # Filas y columnas informadas a los programas
+# Cada comando corre dentro de una función: al recibir SIGUSR1 la shell sale de ella
+# y descarta el resto de la línea, como Ctrl+C en una terminal, sin perder su estado
+SESSION_BOOTSTRAP = "__bot_run() { eval \"$1\"; }\ntrap 'return 130 2>/dev/null' USR1\n"
+
+def blacklist_guard(commands=BLACKLIST_COMMANDS) -> str:
+    """
+    Trampa DEBUG de bash que rechaza los comandos de la lista negra en
+    cualquier posición de la línea (tras ';', '&&', en pipes y subshells), por
+    ruta y detrás de envoltorios como sudo o env. Con extdebug, que la trampa
+    devuelva 1 hace que bash omita el comando, y la línea termina con código
+    126. No alcanza a los intérpretes que el comando lance (bash -c, scripts):
+    es un resguardo, no un aislamiento.
+    """
+    names = '|'.join(shlex.quote(name) for name in commands)
+    if not names:
+        return ''
+    prefilter = '|'.join(f"*{shlex.quote(name)}*" for name in commands)
+    return (
+        "if [ -n \"$BASH_VERSION\" ]; then\n"
+        "__bot_guard() {\n"
+        f"  case \"$BASH_COMMAND\" in {prefilter}) ;; *) return 0 ;; esac\n"
+        "  local - word; set -f\n"
+        "  for word in $BASH_COMMAND; do\n"
+        "    case \"$word\" in command|builtin|exec|sudo|env|nohup|nice|time|*=*|-*|[0-9]*) continue ;; esac\n"
+        f"    case \"${{word##*/}}\" in {names}) echo \"Comando '${{word##*/}}' prohibido\" >&2; __bot_blocked=1; return 1 ;; esac\n"
+        "    return 0\n"
+        "  done\n"
+        "}\n"
+        # El código de salida 126 (no ejecutable) indica que se omitió algún comando
+        "__bot_run() { __bot_blocked=; eval \"$1\"; local status=$?; [ -z \"$__bot_blocked\" ] || return 126; return $status; }\n"
+        "shopt -s extdebug; set -o functrace; trap __bot_guard DEBUG\n"
+        "fi\n"
+    )
+
+class SessionError(Exception):
+    """La sesión no pudo ejecutar el comando (shell terminada o sin sesiones libres)"""
+
+class ShellSession:
+    """
+    Shell persistente de una sesión de chat. Los comandos se escriben por un pipe en la
+    entrada de la shell y la salida llega por un pseudo-terminal, de modo que
+    los programas escriben línea a línea como en una terminal. Cada comando se
+    ejecuta con eval seguido de un marcador con el código de salida: el
+    marcador lleva un token aleatorio de la sesión y el número de comando, y
+    delimita la salida.
+    """
+
+    def __init__(self, key: Any, cwd: str, shell: str = SHELL_PATH):
+        self.key = key
+        self.cwd = cwd
+        self.shell = shell
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.commands = 0
+        self._token = secrets.token_hex(8)
+        self._marker_head = f"\x1e{self._token}:"
+        self._marker = re.compile(re.escape(self._marker_head) + r'(\d+):(\d+)\x1e')
+        self._seq = 0
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._master: Optional[int] = None
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._pending = ''
+        self._lock = asyncio.Lock()
+        self._sink: Optional[Callable[[str], None]] = None
+        self._done: Optional[asyncio.Future] = None
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.returncode is None
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    async def start(self):
+        master, slave = pty.openpty()
+        try:
+            attrs = termios.tcgetattr(slave)
+            attrs[1] &= ~termios.OPOST  # Sin conversión de \n a \r\n
+            termios.tcsetattr(slave, termios.TCSANOW, attrs)
+            fcntl.ioctl(slave, termios.TIOCSWINSZ, struct.pack('HHHH', *TERMINAL_SIZE, 0, 0))
+            # La entrada no es una terminal: la shell no es interactiva y no lee archivos rc
+            self._process = await asyncio.create_subprocess_exec(
+                self.shell,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=slave,
+                stderr=slave,
+                cwd=self.cwd,
+                env=dict(os.environ, **SESSION_ENV),
+                start_new_session=True
+            )
+        except Exception:
+            os.close(master)
+            raise
+        finally:
+            os.close(slave)
+        self._master = master
+        os.set_blocking(master, False)
+        asyncio.get_running_loop().add_reader(master, self._on_readable)
+        self._process.stdin.write((SESSION_BOOTSTRAP + blacklist_guard()).encode())
+        logger.info(f"Sesión de shell abierta para {self.key} (PID {self._process.pid})")
+
+    async def run(self, command: str, sink: Callable[[str], None], timeout: Optional[float]) -> tuple:
+        """
+        Ejecuta un comando en la sesión y entrega la salida a 'sink' a medida
+        que llega. Retorna (código de salida, se agotó el tiempo).
+        """
+        async with self._lock:
+            if not self.alive:
+                raise SessionError("La sesión de shell terminó")
+            self.last_used = time.monotonic()
+            self.commands += 1
+            self._seq += 1
+            self._sink = sink
+            self._done = asyncio.get_running_loop().create_future()
+            # eval mantiene la línea completa aunque el comando tenga comillas sin cerrar, y
+            # la entrada /dev/null evita que el comando consuma los siguientes de la sesión
+            line = f"__bot_run {shlex.quote(command)} < /dev/null; printf '\\036%s:%d:%d\\036' {self._token} {self._seq} $?\n"
+            try:
+                self._process.stdin.write(line.encode())
+                await self._process.stdin.drain()
+                try:
+                    return await asyncio.wait_for(asyncio.shield(self._done), timeout), False
+                except asyncio.TimeoutError:
+                    self.interrupt()
+                    try:
+                        return await asyncio.wait_for(self._done, 5), True
+                    except asyncio.TimeoutError:
+                        # Ni siquiera la shell responde: se descarta la sesión
+                        await self.close()
+                        return None, True
+            except (BrokenPipeError, ConnectionResetError):
+                raise SessionError("La sesión de shell terminó")
+            finally:
+                self._sink = None
+                self._done = None
+                self.last_used = time.monotonic()
+
+    def current_directory(self) -> Optional[str]:
+        """Directorio actual de la shell, leído del sistema sin interrumpirla"""
+        import psutil
+        if not self.alive:
+            return None
+        try:
+            return psutil.Process(self._process.pid).cwd()
+        except psutil.Error:
+            return None
+
+    def interrupt(self) -> bool:
+        """Corta el comando en curso y termina sus procesos; la shell y su estado se conservan"""
+        import psutil
+        if not self.alive:
+            return False
+        try:
+            # La shell atiende la señal cuando termina el proceso que está esperando
+            os.kill(self._process.pid, signal.SIGUSR1)
+            children = psutil.Process(self._process.pid).children(recursive=True)
+        except (ProcessLookupError, psutil.NoSuchProcess):
+            return False
+        for child in children:
+            try:
+                child.terminate()
+            except psutil.NoSuchProcess:
+                pass
+        if children:
+            # Los que ignoran SIGTERM reciben SIGKILL pasado el margen
+            asyncio.get_running_loop().call_later(COMMAND_KILL_GRACE, self._kill_children, children)
+        return True
+
+    @staticmethod
+    def _kill_children(children):
+        import psutil
+        for child in children:
+            try:
+                # psutil comprueba que el PID no se haya reutilizado
+                child.kill()
+            except psutil.NoSuchProcess:
+                pass
+
+    async def close(self):
+        """Cierra la shell y el pseudo-terminal"""
+        if self._process is not None and self._process.returncode is None:
+            self.interrupt()
+            try:
+                self._process.stdin.close()
+                await asyncio.wait_for(self._process.wait(), 2)
+            except (asyncio.TimeoutError, BrokenPipeError, ConnectionResetError):
+                try:
+                    os.killpg(self._process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                await self._process.wait()
+        self._close_master()
+        self._finish(None)
+
+    def _close_master(self):
+        if self._master is not None:
+            asyncio.get_running_loop().remove_reader(self._master)
+            os.close(self._master)
+            self._master = None
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._master, 65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            # EIO: ningún proceso tiene abierta la terminal (la shell terminó)
+            data = b''
+        if not data:
+            self._close_master()
+            self._finish(None)
+            return
+        self._feed(self._decoder.decode(data))
+
+    def _feed(self, text: str):
+        """Separa la salida de los marcadores de fin de comando, aunque lleguen partidos"""
+        self._pending += text
+        while self._pending:
+            start = self._pending.find('\x1e')
+            if start == -1:
+                self._emit(self._pending)
+                self._pending = ''
+                return
+            if start:
+                self._emit(self._pending[:start])
+                self._pending = self._pending[start:]
+            match = self._marker.match(self._pending)
+            if match:
+                self._pending = self._pending[match.end():]
+                # El marcador de un comando cancelado puede llegar cuando ya corre el siguiente
+                if int(match.group(1)) == self._seq:
+                    self._finish(int(match.group(2)))
+                continue
+            if self._could_be_marker(self._pending):
+                return  # Esperar el resto del marcador
+            self._emit(self._pending[0])
+            self._pending = self._pending[1:]
+
+    def _could_be_marker(self, text: str) -> bool:
+        head = self._marker_head
+        if len(text) <= len(head):
+            return head.startswith(text)
+        rest = text[len(head):]
+        return text.startswith(head) and len(rest) < 24 and rest.replace(':', '').isdigit()
+
+    def _emit(self, text: str):
+        # La salida de procesos en segundo plano entre comandos se descarta
+        if self._sink is not None and text:
+            self._sink(text)
+
+    def _finish(self, exit_code: Optional[int]):
+        if self._done is not None and not self._done.done():
+            self._done.set_result(exit_code)
+
+class ShellSessionManager:
+    """
+    Sesiones de shell por clave (chat y usuario). Como máximo 'max_sessions' abiertas:
+    al llegar al límite se cierra la inactiva usada hace más tiempo. Las
+    sesiones sin uso durante 'idle_timeout' segundos se cierran solas.
+    """
+
+    def __init__(self, max_sessions: int = SHELL_MAX_SESSIONS, idle_timeout: float = SHELL_IDLE_TIMEOUT):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions: Dict[Any, ShellSession] = OrderedDict()
+        self._lock: Optional[asyncio.Lock] = None
+        self._reaper: Optional[asyncio.Task] = None
+        OPEN_SESSIONS.set_function(self._count_sessions)
+
+    def _count_sessions(self):
+        busy = sum(1 for session in self._sessions.values() if session.busy)
+        return {('busy',): busy, ('idle',): len(self._sessions) - busy}
+
+    def get(self, key: Any) -> Optional[ShellSession]:
+        return self._sessions.get(key)
+
+    def list_sessions(self):
+        return list(self._sessions.values())
+
+    async def acquire(self, key: Any, cwd: str) -> ShellSession:
+        """Retorna la sesión de la clave, creándola si no existe o si su shell terminó"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+            self._reaper = asyncio.create_task(self._reap())
+        async with self._lock:
+            session = self._sessions.get(key)
+            if session is not None and session.alive:
+                self._sessions.move_to_end(key)
+                return session
+            if session is not None:
+                await self._discard(key)
+            if len(self._sessions) >= self.max_sessions:
+                idle = [k for k, s in self._sessions.items() if not s.busy]
+                if not idle:
+                    raise SessionError(f"Hay {self.max_sessions} sesiones de shell ocupadas; intenta más tarde")
+                # El orden del dict es de uso: la primera inactiva es la usada hace más tiempo
+                await self._discard(idle[0])
+            session = ShellSession(key, cwd)
+            await session.start()
+            self._sessions[key] = session
+            return session
+
+    async def close(self, key: Any) -> bool:
+        if key not in self._sessions:
+            return False
+        await self._discard(key)
+        return True
+
+    async def close_all(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        for key in list(self._sessions):
+            await self._discard(key)
+
+    async def _discard(self, key: Any):
+        session = self._sessions.pop(key, None)
+        if session is not None:
+            await session.close()
+            logger.info(f"Sesión de shell de {key} cerrada tras {session.commands} comandos")
+
+    async def _reap(self):
+        while True:
+            await asyncio.sleep(min(60, self.idle_timeout))
+            now = time.monotonic()
+            for key, session in list(self._sessions.items()):
+                if not session.busy and (not session.alive or now - session.last_used > self.idle_timeout):
+                    await self._discard(key)
@@ -1,25 +1,26 @@
-import psutil
-import os
 from utils.logger import logger
-from datetime import datetime
+from models.metrics_sampler import MetricsSampler
 
 class SystemInfo:
-    @staticmethod
-    def get_system_info():
+    def __init__(self, sampler: MetricsSampler):
+        self.sampler = sampler
+
+    def get_system_info(self):
         try:
-            cpu_percent = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
-            disk = psutil.disk_usage('/')
-            
+            # Lectura O(1) de la última muestra; nunca bloquea el event loop
+            snapshot = self.sampler.get_snapshot()
+            if snapshot is None:
+                return None
+
             return {
-                'cpu_usage': f"{cpu_percent}%",
-                'memory_total': f"{memory.total / (1024**3):.2f}GB",
-                'memory_used': f"{memory.used / (1024**3):.2f}GB",
-                'memory_percent': f"{memory.percent}%",
-                'disk_total': f"{disk.total / (1024**3):.2f}GB",
-                'disk_used': f"{disk.used / (1024**3):.2f}GB",
-                'disk_percent': f"{disk.percent}%",
-                'current_dir': os.getcwd()
+                'cpu_usage': f"{snapshot.cpu_percent}%",
+                'cpu_count': snapshot.cpu_count,
+                'memory_total': f"{snapshot.memory_total / (1024**3):.2f}GB",
+                'memory_used': f"{snapshot.memory_used / (1024**3):.2f}GB",
+                'memory_percent': f"{snapshot.memory_percent}%",
+                'disk_total': f"{snapshot.disk_total / (1024**3):.2f}GB",
+                'disk_used': f"{snapshot.disk_used / (1024**3):.2f}GB",
+                'disk_percent': f"{snapshot.disk_percent}%"
             }
         except Exception as e:
             logger.error(f"Error obteniendo información del sistema: {e}")
@@ -0,0 +1,52 @@
+import asyncio
+import os
+import tempfile
+import time
+from config.config import COMMAND_KILL_GRACE
+from models.chat_sessions import ChatSession
+from models.command_executor import CommandExecutor
+from models.shell_session import ShellSessionManager
+
+def test_command_after_session_directory_removed():
+    async def scenario():
+        executor = CommandExecutor(ShellSessionManager())
+        session = ChatSession(1, 1, executor.default_directory, terminal=True)
+        try:
+            directory = tempfile.mkdtemp()
+            await executor.run(f"cd {directory}", session=session)
+            assert session.cwd == directory
+            os.rmdir(directory)
+            # Sin shell abierta, la siguiente se crea con el directorio guardado
+            await executor.sessions.close(session.key)
+
+            result = await executor.run("pwd", session=session)
+            assert result.status == 'ok'
+            assert result.output.strip() == executor.default_directory
+            assert session.cwd == executor.default_directory
+        finally:
+            await executor.close()
+
+    asyncio.run(scenario())
+
+def test_exit_resets_session_directory():
+    async def scenario():
+        executor = CommandExecutor(ShellSessionManager())
+        session = ChatSession(1, 1, executor.default_directory, terminal=True)
+        try:
+            await executor.run("cd /", session=session)
+            await executor.close_session(session)
+            assert session.cwd == executor.default_directory
+        finally:
+            await executor.close()
+
+    asyncio.run(scenario())
+
+def test_timeout_kills_command_ignoring_sigterm():
+    async def scenario():
+        executor = CommandExecutor()
+        started = time.monotonic()
+        result = await executor.run("bash -c 'trap \"\" TERM; sleep 30'", timeout=1)
+        assert result.status == 'timeout'
+        assert time.monotonic() - started < 1 + COMMAND_KILL_GRACE + 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,46 @@
+import asyncio
+import os
+import tempfile
+from models.fleet_hub import FleetHub
+from models.fleet_protocol import (
+    PROTOCOL_VERSION, HELLO, PUSH, RESPONSE, encode_frame, read_frame, open_connection, new_nonce
+)
+
+async def connect(address, name):
+    reader, writer = await open_connection(address)
+    await read_frame(reader)  # Desafío: sin token no hace falta firmarlo
+    writer.write(encode_frame({'t': HELLO, 'v': PROTOCOL_VERSION, 'name': name, 'nonce': new_nonce(), 'info': {}}))
+    await writer.drain()
+    await read_frame(reader)  # Bienvenida
+    return reader, writer
+
+def test_malformed_messages_close_the_connection():
+    async def scenario():
+        address = f"unix:{os.path.join(tempfile.mkdtemp(), 'fleet.sock')}"
+        alerts = []
+        hub = FleetHub(lambda host, items: alerts.append(items), lambda *args: None, address=address, token='')
+        await hub.start()
+        loop = asyncio.get_running_loop()
+        errors = []
+        loop.set_exception_handler(lambda loop, context: errors.append(context))
+        try:
+            for index, message in enumerate((
+                {'t': PUSH, 'm': ['no es un objeto']},
+                {'t': PUSH, 'm': [{'k': 1, 'cpu': 'alto'}]},
+                {'t': PUSH, 'm': [], 'a': {'type': 'cpu'}},
+                {'t': PUSH, 'm': [], 'a': [{'type': 'cpu', 'timestamp': 'ayer'}]},
+                {'t': RESPONSE, 'id': [1]},
+            )):
+                reader, writer = await connect(address, f"host-{index}")
+                writer.write(encode_frame(message))
+                await writer.drain()
+                # El hub rechaza el mensaje y cierra la conexión
+                assert await asyncio.wait_for(reader.read(), 5) == b''
+                writer.close()
+                assert not hub.get_host(f"host-{index}").connected
+            assert alerts == []
+            assert errors == []
+        finally:
+            await hub.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,15 @@
+from datetime import datetime
+from types import SimpleNamespace
+from models.metrics_store import MetricsStore, UNSTORED_ALERTS
+
+def test_pending_rows_bounded_without_database():
+    store = MetricsStore('/nonexistent/metrics.db')  # open() nunca se llamó
+    for index in range(UNSTORED_ALERTS * 3):
+        store.add_sample(index, {})
+        store.add_alert(SimpleNamespace(
+            timestamp=datetime.now(), type='cpu', severity='warning', source='cpu', message=str(index)
+        ))
+    store.flush()
+    assert store._pending_samples == []
+    assert len(store._pending_alerts) == UNSTORED_ALERTS
+    assert store.recent_alerts(1)[0][4] == str(UNSTORED_ALERTS * 3 - 1)
@@ -0,0 +1,28 @@
+import asyncio
+import time
+from models.send_queue import SendQueue
+
+def test_edits_and_callback_answers_skip_chat_limit():
+    async def scenario():
+        queue = SendQueue(global_rate=30, chat_rate=1, group_rate=0.5)
+        queue.start()
+        chat_id = -100
+
+        async def api_call():
+            return time.monotonic()
+
+        try:
+            # Agota la ráfaga del grupo con mensajes nuevos
+            sends = [queue.call(chat_id, api_call, method='sendMessage') for _ in range(3)]
+            await asyncio.gather(*sends)
+            started = time.monotonic()
+            await queue.call(chat_id, api_call, method='answerCallbackQuery')
+            await queue.call(chat_id, api_call, method='deleteMessage')
+            assert time.monotonic() - started < 0.5
+            # Un mensaje nuevo sí espera a la cubeta del grupo
+            sent_at = await queue.call(chat_id, api_call, method='sendMessage')
+            assert sent_at - started >= 1.5
+        finally:
+            await queue.stop()
+
+    asyncio.run(scenario())
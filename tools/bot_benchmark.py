@@ -0,0 +1,491 @@
+"""
+Benchmark de los handlers y de la evaluación de alertas.
+
+Ejecuta BotController dentro del proceso contra tools/fake_bot_api.py, con
+psutil reemplazado por un sistema simulado de valores deterministas, y mide:
+
+- Latencia de cada comando (p50/p95), desde la actualización hasta la
+  última llamada a la API
+- Rendimiento: actualizaciones por segundo con comandos simultáneos desde
+  varios chats
+- Memoria por actualización: pico y memoria retenida (tracemalloc)
+- Costo de un tick del muestreador (todos los listeners) y de la evaluación
+  de alertas (AlertSystem.process_snapshot + check_system_resources)
+
+Los límites de envío de Telegram se desactivan para medir solo el costo del bot.
+
+Uso:
+    python tools/bot_benchmark.py [--iterations 100] [--save] [--tolerance 0.3]
+
+Sin --save compara con tools/benchmark_baseline.json (si existe) y termina con
+código 1 si alguna métrica empeora más que la tolerancia. Con --save guarda los
+resultados como nueva línea base. Las líneas base solo son comparables en la
+misma máquina: si la guardada es de otra (otro host, arquitectura o versión de
+Python) se muestra la comparación pero no se falla.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import contextmanager
+from dataclasses import replace
+from http.server import ThreadingHTTPServer
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tools'))
+from fake_bot_api import FakeBotApi, make_handler  # noqa: E402
+
+import psutil  # noqa: E402
+
+BASELINE_PATH = os.path.join(ROOT, 'tools', 'benchmark_baseline.json')
+USER_ID = 424242
+
+# (nombre, texto del comando, invalidar la caché de respuestas antes de cada iteración)
+HANDLER_CASES = [
+    ('start', '/start', False),
+    ('info', '/info', True),
+    ('info_cached', '/info', False),
+    ('ps', '/ps', False),
+    ('ps_filter', '/ps mem worker 5', False),
+    ('net', '/net', True),
+    ('disk', '/disk', True),
+    ('graph', '/graph cpu 1h', False),
+    ('jobs', '/jobs', False),
+    ('alerts', '/alerts', False),
+    ('stats', '/stats', False)
+]
+THROUGHPUT_MIX = ['/info', '/ps', '/net', '/disk', '/jobs', '/start']
+THROUGHPUT_CHATS = 8
+
+# Métricas en las que un valor mayor es mejor; en el resto, menor es mejor
+HIGHER_IS_BETTER = {'throughput.updates_per_s'}
+# Los p95 se muestran pero no se comparan: con pocas iteraciones varían demasiado entre ejecuciones
+UNGATED_SUFFIXES = ('p95_ms', 'p95_us')
+
+# --- Sistema simulado ---
+
+NetIO = namedtuple('NetIO', 'bytes_sent bytes_recv packets_sent packets_recv errin errout dropin dropout')
+DiskIO = namedtuple('DiskIO', 'read_count write_count read_bytes write_bytes read_time write_time busy_time')
+Memory = namedtuple('Memory', 'total available percent used free')
+DiskUsage = namedtuple('DiskUsage', 'total used free percent')
+NicStats = namedtuple('NicStats', 'isup duplex speed mtu flags')
+NicAddress = namedtuple('NicAddress', 'family address netmask broadcast ptp')
+Partition = namedtuple('Partition', 'device mountpoint fstype opts')
+ProcessIO = namedtuple('ProcessIO', 'read_count write_count read_bytes write_bytes')
+
+CPU_PATTERN = (35.0, 42.0, 88.0, 91.0, 95.0, 60.0, 30.0, 25.0)  # Cruza el umbral de CPU y se recupera
+NICS = {'eth0': 1000, 'wlan0': 0, 'lo': 0}
+DISKS = ('mmcblk0', 'sda')
+MOUNTPOINTS = (('/dev/mmcblk0p2', '/', 'ext4'), ('/dev/mmcblk0p1', '/boot', 'vfat'), ('/dev/sda1', '/mnt/datos', 'ext4'))
+GB = 1024 ** 3
+
+class FakeProcess:
+    def __init__(self, system: 'FakeSystem', pid: int):
+        self._system = system
+        self.pid = pid
+
+    @contextmanager
+    def oneshot(self):
+        yield
+
+    def name(self):
+        return f"worker{self.pid % 20}"
+
+    def cmdline(self):
+        return ['python3', f'/opt/app/worker{self.pid % 20}.py', '--id', str(self.pid)]
+
+    def status(self):
+        return 'running' if self.pid % 3 else 'sleeping'
+
+    def cpu_percent(self, interval=None):
+        return (self.pid * 7 + self._system.tick * 3) % 100 / 4
+
+    def memory_percent(self):
+        return (self.pid % 13) / 2
+
+    def num_threads(self):
+        return 1 + self.pid % 8
+
+    def io_counters(self):
+        total = int(self._system.elapsed() * self.pid * 100)
+        return ProcessIO(self._system.tick, self._system.tick, total, total // 2)
+
+class FakeSystem:
+    """
+    Máquina simulada. Los valores instantáneos dependen del número de tick y
+    los contadores crecen con el tiempo real a tasas fijas, para que las tasas
+    calculadas por el bot sean realistas aunque los ticks sean seguidos.
+    """
+
+    def __init__(self, processes: int = 150):
+        self.tick = 0
+        self._pids = list(range(100, 100 + processes))
+        self._started = time.monotonic()
+
+    def advance(self):
+        self.tick += 1
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started
+
+    def cpu_percent(self, interval=None, percpu=False):
+        return CPU_PATTERN[self.tick % len(CPU_PATTERN)]
+
+    def virtual_memory(self):
+        used = (2.0 + (self.tick % 5) * 0.3) * GB
+        return Memory(4 * GB, 4 * GB - used, used / (4 * GB) * 100, used, 4 * GB - used)
+
+    def disk_usage(self, path):
+        return DiskUsage(32 * GB, 20 * GB, 12 * GB, 62.5)
+
+    def net_io_counters(self, pernic=False, nowrap=True):
+        counters = {
+            nic: NetIO(*(int(self.elapsed() * (index + 1) * rate) for rate in (150_000, 900_000, 120, 700, 0, 0, 0, 1)))
+            for index, nic in enumerate(NICS)
+        }
+        if pernic:
+            return counters
+        return NetIO(*(sum(values) for values in zip(*counters.values())))
+
+    def net_if_stats(self):
+        return {nic: NicStats(True, 2, speed, 1500, 'up') for nic, speed in NICS.items()}
+
+    def net_if_addrs(self):
+        return {
+            nic: [NicAddress(socket.AF_INET, f"192.168.1.{10 + index}", '255.255.255.0', None, None)]
+            for index, nic in enumerate(NICS)
+        }
+
+    def disk_io_counters(self, perdisk=False, nowrap=True):
+        return {
+            disk: DiskIO(*(int(self.elapsed() * (index + 1) * rate) for rate in (40, 25, 2_000_000, 1_000_000, 90, 60, 400)))
+            for index, disk in enumerate(DISKS)
+        }
+
+    def disk_partitions(self, all=False):
+        return [Partition(device, mountpoint, fstype, 'rw') for device, mountpoint, fstype in MOUNTPOINTS]
+
+    def pids(self):
+        # Cada 10 ticks termina un proceso y aparece otro
+        return self._pids[self.tick // 10:] + [1000 + self.tick // 10]
+
+    def statvfs(self, mountpoint):
+        return {
+            'total': 32 * GB, 'used': 20 * GB, 'free': 12 * GB, 'percent': 62.5,
+            'inodes_total': 2_000_000, 'inodes_used': 400_000, 'inodes_percent': 20.0
+        }
+
+    def patch(self):
+        """Reemplaza las funciones de psutil que usa el bot"""
+        from models.disk_monitor import DiskMonitor
+        patches = mock.patch.multiple(
+            psutil,
+            cpu_percent=self.cpu_percent,
+            cpu_count=lambda logical=True: 4,
+            virtual_memory=self.virtual_memory,
+            disk_usage=self.disk_usage,
+            net_io_counters=self.net_io_counters,
+            net_if_stats=self.net_if_stats,
+            net_if_addrs=self.net_if_addrs,
+            disk_io_counters=self.disk_io_counters,
+            disk_partitions=self.disk_partitions,
+            getloadavg=lambda: (0.42, 0.35, 0.30),
+            boot_time=lambda: time.time() - 86400,
+            pids=self.pids,
+            Process=lambda pid: FakeProcess(self, pid)
+        )
+        statvfs = mock.patch.object(DiskMonitor, '_statvfs', staticmethod(self.statvfs))
+        return patches, statvfs
+
+# --- Entorno del bot ---
+
+def configure_environment(api_url: str, directory: str):
+    """Variables que config/config.py lee al importarse"""
+    os.environ.update(
+        TELEGRAM_TOKEN='123:benchmark',
+        TELEGRAM_ADMIN=str(USER_ID),
+        TELEGRAM_API_URL=api_url,
+        METRICS_DB_PATH=os.path.join(directory, 'metrics.db')
+    )
+    for name in ('WEBHOOK_URL', 'METRICS_PORT', 'LOOP_WATCHDOG_ALERT'):
+        os.environ.pop(name, None)
+
+def command_update(update_id: int, text: str, chat_id: int = USER_ID) -> dict:
+    chat = {'id': chat_id, 'type': 'private' if chat_id == USER_ID else 'group', 'first_name': 'Admin'}
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': chat,
+            'from': {'id': USER_ID, 'is_bot': False, 'first_name': 'Admin', 'username': 'admin'},
+            'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        }
+    }
+
+class BotHarness:
+    """BotController y Application reales, con el muestreo avanzado a mano"""
+
+    def __init__(self, system: FakeSystem):
+        self.system = system
+        self._update_ids = iter(range(1, 10 ** 9))
+
+    async def start(self):
+        from telegram import Update
+        from main import build_application, register_handlers
+        from controllers.bot_controller import BotController
+        from models.metrics_sampler import MetricsSampler
+        from models.send_queue import SendQueue
+
+        self._update_cls = Update
+        self.controller = BotController()
+        # Sin límites de envío: se mide el costo del bot, no la espera impuesta por Telegram
+        self.controller.send_queue = SendQueue(global_rate=1e6, chat_rate=1e6, group_rate=1e6)
+        self.application = build_application()
+        register_handlers(self.application, self.controller)
+        await self.application.initialize()
+        self.controller.send_queue.start()
+        self.controller.loop_monitor.start()
+        await self.controller.job_scheduler.start()
+        # El hilo del muestreador no se inicia: cada tick se ejecuta con tick()
+        with mock.patch.object(MetricsSampler, 'start'):
+            await self.controller.start_monitoring()
+        for _ in range(3):
+            snapshot = self.tick()
+        # Una hora de historial para que /graph dibuje una serie completa
+        now = time.time()
+        for i in range(720):
+            self.controller.metrics_history.add_snapshot(replace(
+                snapshot, timestamp=now - 3600 + i * 5, cpu_percent=CPU_PATTERN[i % len(CPU_PATTERN)]
+            ))
+
+    async def stop(self):
+        await self.controller.job_scheduler.stop()
+        await self.controller.send_queue.stop()
+        await self.controller.loop_monitor.stop()
+        self.controller.stop_monitoring()
+        await self.application.shutdown()
+
+    def tick(self):
+        self.system.advance()
+        return self.controller.metrics_sampler.sample_now()
+
+    async def send(self, text: str, chat_id: int = USER_ID):
+        data = command_update(next(self._update_ids), text, chat_id)
+        await self.application.process_update(self._update_cls.de_json(data, self.application.bot))
+
+# --- Mediciones ---
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))]
+
+async def measure_handlers(harness: BotHarness, iterations: int, rounds: int = 5) -> dict:
+    """
+    Los casos se alternan en varias rondas y el p50 es la mediana de la mejor
+    ronda: así una racha de ruido de la máquina no afecta a un solo comando.
+    """
+    timings = {name: [[] for _ in range(rounds)] for name, _, _ in HANDLER_CASES}
+    for name, text, _ in HANDLER_CASES:
+        await harness.send(text)  # Calentamiento
+    for round_index in range(rounds):
+        for name, text, invalidate in HANDLER_CASES:
+            for _ in range(max(1, iterations // rounds)):
+                if invalidate:
+                    harness.controller.response_cache.invalidate()
+                started = time.perf_counter()
+                await harness.send(text)
+                timings[name][round_index].append(time.perf_counter() - started)
+    return {
+        name: {
+            'p50_ms': round(min(statistics.median(values) for values in per_round) * 1000, 3),
+            'p95_ms': round(percentile([value for values in per_round for value in values], 0.95) * 1000, 3)
+        }
+        for name, per_round in timings.items()
+    }
+
+async def measure_throughput(harness: BotHarness, iterations: int) -> dict:
+    texts = [THROUGHPUT_MIX[i % len(THROUGHPUT_MIX)] for i in range(iterations * 2)]
+    chats = [USER_ID] + [-(1000 + i) for i in range(THROUGHPUT_CHATS - 1)]
+    started = time.perf_counter()
+    await asyncio.gather(*(harness.send(text, chats[i % len(chats)]) for i, text in enumerate(texts)))
+    elapsed = time.perf_counter() - started
+    return {'updates_per_s': round(len(texts) / elapsed, 1)}
+
+async def measure_memory(harness: BotHarness, iterations: int) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        peaks = []
+        for i in range(iterations):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            await harness.send(THROUGHPUT_MIX[i % len(THROUGHPUT_MIX)])
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'peak_kb_per_update': round(statistics.median(peaks) / 1024, 1),
+        'retained_bytes_per_update': round(max(0, current - baseline) / iterations)
+    }
+
+def measure_alerts(harness: BotHarness, iterations: int, rounds: int = 5) -> dict:
+    """Como en los handlers, los p50 son la mediana de la mejor ronda"""
+    alert_system = harness.controller.alert_system
+    ticks = [[] for _ in range(rounds)]
+    evaluations = [[] for _ in range(rounds)]
+    for round_index in range(rounds):
+        gc.collect()
+        for _ in range(max(1, iterations // rounds)):
+            started = time.perf_counter()
+            snapshot = harness.tick()  # Todos los listeners, incluida la evaluación de alertas
+            ticks[round_index].append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            alert_system.process_snapshot(snapshot)
+            alert_system.check_system_resources()
+            evaluations[round_index].append(time.perf_counter() - started)
+    return {
+        'tick_p50_us': round(min(statistics.median(values) for values in ticks) * 1e6, 1),
+        'evaluation_p50_us': round(min(statistics.median(values) for values in evaluations) * 1e6, 1),
+        'evaluation_p95_us': round(percentile([value for values in evaluations for value in values], 0.95) * 1e6, 1)
+    }
+
+async def run_benchmarks(iterations: int) -> dict:
+    system = FakeSystem()
+    psutil_patch, statvfs_patch = system.patch()
+    harness = BotHarness(system)
+    with psutil_patch, statvfs_patch:
+        await harness.start()
+        try:
+            results = {
+                'handlers': await measure_handlers(harness, iterations),
+                'throughput': await measure_throughput(harness, iterations),
+                'memory': await measure_memory(harness, iterations),
+                'alerts': measure_alerts(harness, iterations * 5)
+            }
+        finally:
+            await harness.stop()
+    results['environment'] = environment(iterations)
+    return results
+
+# --- Línea base ---
+
+def environment(iterations: int) -> dict:
+    return {
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'iterations': iterations
+    }
+
+def same_machine(results: dict, baseline: dict) -> bool:
+    """La línea base se tomó en esta máquina y con las mismas iteraciones"""
+    current, base = results.get('environment', {}), baseline.get('environment', {})
+    return all(current.get(key) == base.get(key) for key in ('host', 'python', 'machine', 'cpus', 'iterations'))
+
+def flatten(results: dict, prefix: str = '') -> dict:
+    values = {}
+    for key, value in results.items():
+        if key == 'environment':
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{name}."))
+        else:
+            values[name] = value
+    return values
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Retorna las métricas que empeoraron más que la tolerancia: (nombre, base, actual, cambio)"""
+    regressions = []
+    current = flatten(results)
+    for name, base in flatten(baseline).items():
+        value = current.get(name)
+        if value is None or not base or name.endswith(UNGATED_SUFFIXES):
+            continue
+        change = (value - base) / base
+        worse = -change if name in HIGHER_IS_BETTER else change
+        if worse > tolerance:
+            regressions.append((name, base, value, change))
+    return regressions
+
+def print_results(results: dict, baseline: dict = None):
+    base = flatten(baseline) if baseline else {}
+    for name, value in flatten(results).items():
+        line = f"  {name:42} {value:>12}"
+        if name in base and base[name]:
+            line += f"   (base {base[name]}, {(value - base[name]) / base[name]:+.0%})"
+        print(line)
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de handlers y alertas del bot")
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--save', action='store_true', help="Guardar los resultados como línea base")
+    parser.add_argument('--tolerance', type=float, default=0.3,
+                        help="Empeoramiento relativo permitido frente a la línea base (0.3 = 30%%)")
+    args = parser.parse_args()
+
+    port = free_port()
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(FakeBotApi(USER_ID, quiet=True)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            configure_environment(f"http://127.0.0.1:{port}", directory)
+            from utils.logger import logger
+            logger.setLevel(logging.WARNING)
+            results = asyncio.run(run_benchmarks(args.iterations))
+    finally:
+        server.shutdown()
+
+    baseline = None
+    if not args.save and os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.save:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f"Línea base guardada en {os.path.relpath(BASELINE_PATH, ROOT)}")
+        return
+
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for name, base, value, change in regressions:
+            print(f"❌ {name}: {base} → {value} ({change:+.0%})")
+        if not same_machine(results, baseline):
+            print("⚠️ La línea base es de otra máquina o configuración: no se usa para fallar. "
+                  "Regenérala aquí con --save")
+            return
+        if regressions:
+            sys.exit(1)
+        print(f"✅ Sin regresiones mayores al {args.tolerance:.0%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""
+Servidor local que imita la API de Bot de Telegram para probar el bot sin
+conexión, tanto en modo polling como en modo webhook.
+
+Uso:
+    python tools/fake_bot_api.py --user-id 123456 [--port 8081] [--retry-after-every 5]
+
+Luego iniciar el bot con:
+    TELEGRAM_API_URL=http://127.0.0.1:8081 TELEGRAM_ADMIN=123456 TELEGRAM_TOKEN=test python main.py
+
+Cada línea escrita en la consola se envía al bot como un mensaje del usuario;
+'!cb <datos>' pulsa un botón (callback_query) sobre el último mensaje del bot.
+Los mensajes que el bot envía o edita se muestran en la consola. También se
+pueden inyectar actualizaciones con POST /inject {"text": "/info"} o
+{"callback_data": "page_1_1"}.
+"""
+import argparse
+import email
+import itertools
+import json
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Bot de pruebas', 'username': 'fake_bot'}
+
+class FakeBotApi:
+    """Estado compartido: actualizaciones pendientes, mensajes enviados y webhook"""
+
+    def __init__(self, user_id: int, retry_after_every: int = 0, quiet: bool = False):
+        self.quiet = quiet
+        self.user = {'id': user_id, 'is_bot': False, 'first_name': 'Admin', 'username': 'admin'}
+        self.chat = {'id': user_id, 'type': 'private', 'first_name': 'Admin'}
+        self.retry_after_every = retry_after_every
+        self._condition = threading.Condition()
+        self._updates = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._calls = itertools.count(1)
+        self.last_bot_message = None
+        self.webhook_url = None
+        self.webhook_secret = None
+
+    # --- Actualizaciones hacia el bot ---
+
+    def inject_text(self, text: str):
+        message = self._message(text, self.user)
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        self._deliver({'update_id': next(self._update_ids), 'message': message})
+
+    def inject_callback(self, data: str):
+        if self.last_bot_message is None:
+            print("⚠️  El bot aún no envió ningún mensaje")
+            return
+        self._deliver({
+            'update_id': next(self._update_ids),
+            'callback_query': {
+                'id': str(next(self._update_ids)),
+                'from': self.user,
+                'chat_instance': str(self.chat['id']),
+                'message': self.last_bot_message,
+                'data': data
+            }
+        })
+
+    def _deliver(self, update: dict):
+        if self.webhook_url:
+            request = urllib.request.Request(
+                self.webhook_url, data=json.dumps(update).encode(),
+                headers={'Content-Type': 'application/json'}
+            )
+            if self.webhook_secret:
+                request.add_header('X-Telegram-Bot-Api-Secret-Token', self.webhook_secret)
+            try:
+                urllib.request.urlopen(request, timeout=10).close()
+            except OSError as e:
+                print(f"⚠️  Error entregando al webhook: {e}")
+            return
+        with self._condition:
+            self._updates.append(update)
+            self._condition.notify_all()
+
+    def get_updates(self, offset: int, timeout: float, limit: int) -> list:
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                self._updates = [update for update in self._updates if update['update_id'] >= offset]
+                if self._updates or time.monotonic() >= deadline:
+                    return self._updates[:limit]
+                self._condition.wait(deadline - time.monotonic())
+
+    # --- Métodos de la API ---
+
+    def call(self, method: str, params: dict):
+        """Retorna (resultado, None) o (None, (código, descripción, parámetros))"""
+        method = method.lower()
+        if self.retry_after_every and method in ('sendmessage', 'editmessagetext', 'senddocument'):
+            if next(self._calls) % self.retry_after_every == 0:
+                return None, (429, 'Too Many Requests: retry after 2', {'retry_after': 2})
+
+        if method == 'getme':
+            return BOT_USER, None
+        if method == 'getupdates':
+            return self.get_updates(
+                int(params.get('offset', 0)), float(params.get('timeout', 0)), int(params.get('limit', 100))
+            ), None
+        if method == 'setwebhook':
+            self.webhook_url = params.get('url') or None
+            self.webhook_secret = params.get('secret_token')
+            print(f"🔗 Webhook: {self.webhook_url}")
+            return True, None
+        if method == 'deletewebhook':
+            self.webhook_url = None
+            return True, None
+        if method == 'getwebhookinfo':
+            return {'url': self.webhook_url or '', 'has_custom_certificate': False, 'pending_update_count': 0}, None
+        if method == 'sendmessage':
+            message = self._message(params.get('text', ''), BOT_USER, params.get('reply_markup'), params.get('chat_id'))
+            self._show('💬', message['text'], params.get('reply_markup'))
+            self.last_bot_message = message
+            return message, None
+        if method == 'editmessagetext':
+            message = self._message(params.get('text', ''), BOT_USER, params.get('reply_markup'), params.get('chat_id'))
+            message['message_id'] = int(params.get('message_id', 0))
+            message['edit_date'] = int(time.time())
+            self._show(f"✏️  #{message['message_id']}", message['text'], params.get('reply_markup'))
+            self.last_bot_message = message
+            return message, None
+        if method == 'senddocument':
+            message = self._message(None, BOT_USER, chat_id=params.get('chat_id'))
+            name = params.get('document_name', 'documento')
+            message['document'] = {'file_id': name, 'file_unique_id': name, 'file_name': name}
+            self._show('📎', f"{name} ({params.get('document_size', 0)} bytes)")
+            return message, None
+        if method in ('deletemessage', 'answercallbackquery', 'sendchataction', 'setmycommands', 'close', 'logout'):
+            return True, None
+        return None, (404, f'Not Found: method {method} not found', None)
+
+    def _message(self, text, sender: dict, reply_markup=None, chat_id=None) -> dict:
+        # Las respuestas van al chat indicado por el bot (otros chats además del privado)
+        chat = self.chat if chat_id is None or int(chat_id) == self.chat['id'] else {
+            'id': int(chat_id), 'type': 'group' if int(chat_id) < 0 else 'private', 'title': f"Chat {chat_id}"
+        }
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': chat,
+            'from': sender
+        }
+        if text is not None:
+            message['text'] = text
+        if reply_markup:
+            message['reply_markup'] = json.loads(reply_markup) if isinstance(reply_markup, str) else reply_markup
+        return message
+
+    def _show(self, prefix: str, text: str, reply_markup=None):
+        if self.quiet:
+            return
+        print(f"{prefix} {text}")
+        if reply_markup:
+            markup = json.loads(reply_markup) if isinstance(reply_markup, str) else reply_markup
+            buttons = [
+                f"[{button['text']} → {button.get('callback_data', '')}]"
+                for row in markup.get('inline_keyboard', []) for button in row
+            ]
+            print('   ' + ' '.join(buttons))
+
+def make_handler(api: FakeBotApi):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            self._handle({})
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            self._handle(self._parse_body(body))
+
+        def _handle(self, params: dict):
+            path = self.path.split('?', 1)[0].strip('/')
+            if path == 'inject':
+                if 'callback_data' in params:
+                    api.inject_callback(params['callback_data'])
+                else:
+                    api.inject_text(params.get('text', ''))
+                return self._reply(200, {'ok': True, 'result': True})
+
+            # Rutas de la API: /bot<token>/<método>
+            parts = path.split('/')
+            if len(parts) != 2 or not parts[0].startswith('bot'):
+                return self._reply(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+            result, error = api.call(parts[1], params)
+            if error:
+                code, description, parameters = error
+                payload = {'ok': False, 'error_code': code, 'description': description}
+                if parameters:
+                    payload['parameters'] = parameters
+                return self._reply(code, payload)
+            self._reply(200, {'ok': True, 'result': result})
+
+        def _parse_body(self, body: bytes) -> dict:
+            content_type = self.headers.get('Content-Type', '')
+            if content_type.startswith('application/json'):
+                return json.loads(body or b'{}')
+            if content_type.startswith('multipart/form-data'):
+                # Los archivos no se guardan: solo se registran su nombre y tamaño
+                message = email.message_from_bytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+                params = {}
+                for part in message.get_payload():
+                    name = part.get_param('name', header='content-disposition')
+                    payload = part.get_payload(decode=True) or b''
+                    filename = part.get_filename()
+                    if filename:
+                        params[f'{name}_name'] = filename
+                        params[f'{name}_size'] = len(payload)
+                    else:
+                        params[name] = payload.decode('utf-8', errors='replace')
+                return params
+            return dict(parse_qsl(body.decode('utf-8')))
+
+        def _reply(self, status: int, payload: dict):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API de Bot de Telegram")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--user-id', type=int, required=True, help="ID del usuario que escribe al bot (TELEGRAM_ADMIN)")
+    parser.add_argument('--retry-after-every', type=int, default=0,
+                        help="Responder 429 a uno de cada N envíos para probar la cola de salida")
+    args = parser.parse_args()
+
+    api = FakeBotApi(args.user_id, args.retry_after_every)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(api))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"API de pruebas en http://{args.host}:{args.port} (Ctrl+D para salir)")
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('!cb '):
+            api.inject_callback(line[4:].strip())
+        else:
+            api.inject_text(line)
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
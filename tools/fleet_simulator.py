@@ -0,0 +1,108 @@
+"""
+Simula una flota de agentes en una sola máquina.
+
+Lanza N agentes en un mismo proceso (comparten el muestreo real de esta
+máquina, cada uno con su nombre y su conexión) contra un hub. Sin --hub
+inicia también un hub en el proceso y, al terminar, muestra lo que recibió:
+bytes por agente y por muestra, y prueba un /ps remoto a cada agente.
+
+Uso:
+    python tools/fleet_simulator.py [--agents 50] [--duration 60] [--push-interval 2]
+    python tools/fleet_simulator.py --hub unix:/tmp/fleet.sock --agents 5   # Contra el bot (FLEET_LISTEN)
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Simulador de agentes de la flota")
+    parser.add_argument('--agents', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=60, help="Segundos de simulación")
+    parser.add_argument('--push-interval', type=float, default=2, help="Segundos entre envíos de cada agente")
+    parser.add_argument('--sample-interval', type=float, default=1, help="Segundos entre muestras")
+    parser.add_argument('--hub', help="Dirección de un hub existente; sin ella se inicia uno local")
+    parser.add_argument('--prefix', default='sim', help="Prefijo del nombre de los agentes")
+    return parser.parse_args()
+
+async def simulate(args):
+    from agent import build_agent
+    from models.fleet_agent import FleetAgent
+    from models.fleet_hub import FleetHub
+    from config.config import FLEET_TOKEN
+
+    hub = None
+    address = args.hub
+    token = FLEET_TOKEN
+    if address is None:
+        address = f"unix:{os.path.join(tempfile.mkdtemp(), 'fleet.sock')}"
+        # El hub propio usa un token al azar si no hay uno configurado, para medir también la autenticación
+        token = token or secrets.token_hex(16)
+        hub = FleetHub(
+            lambda host, alerts: print(f"🚨 {host}: {len(alerts)} alertas"),
+            lambda host, online, _: print(f"{'✅' if online else '🔌'} {host}"),
+            address=address, token=token
+        )
+        await hub.start()
+
+    # Un único muestreo real; los demás agentes reutilizan sus monitores
+    sampler, first = build_agent(
+        args.sample_interval, name=f"{args.prefix}-01", hub=address, token=token, push_interval=args.push_interval
+    )
+    agents = [first] + [
+        FleetAgent(
+            sampler, first.process_table, first.net_monitor, first.disk_monitor, first.alert_system,
+            first.executor, name=f"{args.prefix}-{index:02d}", hub=address, token=token,
+            push_interval=args.push_interval
+        )
+        for index in range(2, args.agents + 1)
+    ]
+    sampler.start()
+    for agent in agents:
+        agent.start()
+
+    started = time.monotonic()
+    try:
+        await asyncio.sleep(args.duration)
+    finally:
+        elapsed = time.monotonic() - started
+        sent = sum(agent.bytes_sent for agent in agents)
+        frames = sum(agent.frames_sent for agent in agents)
+        print(f"{len(agents)} agentes, {elapsed:.0f}s: {frames} mensajes, {sent} bytes "
+              f"({sent / len(agents) / elapsed * 60:.0f} B/min por agente)")
+
+        if hub is not None:
+            hosts = hub.list_hosts()
+            samples = sum(host.samples for host in hosts)
+            received = sum(host.bytes_received for host in hosts)
+            print(f"Hub: {sum(host.connected for host in hosts)}/{len(hosts)} conectados, "
+                  f"{samples} muestras, {received / max(samples, 1):.0f} B por muestra")
+            timings = []
+            for host in hosts:
+                request_started = time.perf_counter()
+                await hub.request(host.name, 'ps', sort='cpu', limit=5)
+                timings.append(time.perf_counter() - request_started)
+            timings.sort()
+            print(f"/ps remoto: mediana {timings[len(timings) // 2] * 1000:.1f} ms, máx {timings[-1] * 1000:.1f} ms")
+
+        for agent in agents:
+            await agent.stop()
+        sampler.stop()
+        if hub is not None:
+            await hub.stop()
+
+def main():
+    args = parse_args()
+    from utils.logger import logger
+    import logging
+    logger.setLevel(logging.WARNING)
+    asyncio.run(simulate(args))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Mide el arranque del bot.
+
+1. Importaciones: ejecuta 'python -X importtime -c "import main"' y muestra el
+   tiempo total y los módulos que main importa directamente, por costo.
+2. Arranque completo: inicia main.py contra tools/fake_bot_api.py y mide el
+   tiempo hasta que el bot empieza a recibir actualizaciones (el mensaje
+   "Recibiendo actualizaciones" del log).
+
+Uso:
+    python tools/startup_benchmark.py [--runs 5] [--top 15]
+"""
+import argparse
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'tools'))
+from fake_bot_api import FakeBotApi, make_handler  # noqa: E402
+
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+READY_LINE = re.compile(r'Recibiendo actualizaciones a los (\d+) ms')
+USER_ID = 424242
+
+def base_env(**extra) -> dict:
+    env = dict(os.environ, TELEGRAM_TOKEN='123:benchmark', TELEGRAM_ADMIN=str(USER_ID), PYTHONDONTWRITEBYTECODE='1')
+    env.pop('WEBHOOK_URL', None)
+    env.update(extra)
+    return env
+
+def measure_imports():
+    """Retorna (ms de 'import main', [(ms acumulados, módulo)] importados directamente por main)"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main'],
+        cwd=ROOT, env=base_env(), capture_output=True, text=True, check=True
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            _, cumulative, indent, module = match.groups()
+            entries.append((len(indent), int(cumulative) / 1000, module))
+    # importtime lista cada módulo después de sus dependencias, con dos espacios más de sangría
+    depth, total = next((depth, cumulative) for depth, cumulative, module in entries if module == 'main')
+    children = [(cumulative, module) for level, cumulative, module in entries if level == depth + 2]
+    return total, sorted(children, reverse=True)
+
+def measure_start(api_url: str, db_path: str, timeout: float = 30) -> tuple:
+    """Retorna (ms medidos por el bot, ms de reloj desde el lanzamiento del proceso)"""
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, 'main.py'], cwd=ROOT,
+        env=base_env(TELEGRAM_API_URL=api_url, METRICS_DB_PATH=db_path),
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    try:
+        deadline = started + timeout
+        for line in process.stderr:
+            match = READY_LINE.search(line)
+            if match:
+                return int(match.group(1)), (time.perf_counter() - started) * 1000
+            if time.perf_counter() > deadline:
+                break
+        raise RuntimeError("El bot no llegó a recibir actualizaciones")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque del bot")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    imports = [measure_imports() for _ in range(args.runs)]
+    totals = [total for total, _ in imports]
+    print(f"Importaciones de main: mediana {statistics.median(totals):.1f} ms (mín {min(totals):.1f}, máx {max(totals):.1f})")
+    for cumulative, module in imports[-1][1][:args.top]:
+        print(f"  {cumulative:8.1f} ms  {module}")
+
+    port = free_port()
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(FakeBotApi(USER_ID, quiet=True)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            runs = [
+                measure_start(f"http://127.0.0.1:{port}", os.path.join(directory, 'metrics.db'))
+                for _ in range(args.runs)
+            ]
+    finally:
+        server.shutdown()
+
+    internal = [ms for ms, _ in runs]
+    wall = [ms for _, ms in runs]
+    print(f"Hasta recibir actualizaciones: mediana {statistics.median(internal):.0f} ms desde main.py, "
+          f"{statistics.median(wall):.0f} ms desde el lanzamiento del proceso")
+
+if __name__ == '__main__':
+    main()
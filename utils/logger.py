@@ -1,5 +1,4 @@
 import logging
-from rich.console import Console
 
 class ColoredFormatter(logging.Formatter):
     grey = "\x1b[38;21m"
@@ -40,4 +39,3 @@ def setup_logger():
 
 # Inicializar el logger
 logger = setup_logger()
-console = Console()
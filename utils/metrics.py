@@ -0,0 +1,256 @@
+import asyncio
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from config.config import STATS_WINDOW
+
+# Límites por defecto de los histogramas (segundos)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if value == float('-inf'):
+        return '-Inf'
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _escape_help(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n')
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+class _Metric:
+    """Base de las métricas: nombre, ayuda y valores por combinación de etiquetas"""
+
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._function: Optional[Callable[[], Union[float, Dict[LabelValues, float]]]] = None
+
+    def set_function(self, function: Callable[[], Union[float, Dict[LabelValues, float]]]):
+        """
+        Calcula el valor en cada lectura. La función debe leer datos ya
+        calculados (p. ej. la última muestra) y retornar un número, o un dict
+        {tupla de etiquetas: valor} si la métrica tiene etiquetas.
+        """
+        self._function = function
+
+    def _label_values(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} espera las etiquetas {self.labelnames}, no {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _function_samples(self) -> List[Sample]:
+        values = self._function()
+        if values is None:
+            return []
+        if not isinstance(values, dict):
+            return [(self.name, {}, values)]
+        return [
+            (self.name, dict(zip(self.labelnames, label_values)), value)
+            for label_values, value in values.items() if value is not None
+        ]
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+class _ValueMetric(_Metric):
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def samples(self) -> List[Sample]:
+        if self._function is not None:
+            return self._function_samples()
+        with self._lock:
+            values = list(self._values.items())
+        return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in values]
+
+class Counter(_ValueMetric):
+    """Contador que solo crece"""
+
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0)
+
+class Gauge(_ValueMetric):
+    """Valor que sube y baja"""
+
+    type = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    """
+    Distribución de observaciones en cubetas acumuladas, con suma y cantidad.
+    Con 'window' conserva además las últimas observaciones de cada combinación
+    de etiquetas para calcular percentiles exactos recientes.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, window: int = 0):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.window = window
+        # Por etiquetas: [conteos por cubeta (+ la de +Inf), suma, últimas observaciones o None]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._label_values(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                recent = deque(maxlen=self.window) if self.window else None
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, recent]
+            entry[0][index] += 1
+            entry[1] += value
+            if entry[2] is not None:
+                entry[2].append(value)
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observa la duración del bloque, incluso si termina con una excepción"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def percentiles(self, quantiles: Sequence[float] = (0.5, 0.95, 0.99)) -> List[Tuple[Dict[str, str], int, List[float]]]:
+        """
+        Por cada combinación de etiquetas: (etiquetas, observaciones totales,
+        percentiles de la ventana reciente). Requiere 'window'.
+        """
+        with self._lock:
+            values = [(key, sum(counts), sorted(recent)) for key, (counts, _, recent) in self._values.items() if recent]
+        result = []
+        for key, count, recent in values:
+            # Percentil por rango más cercano
+            points = [recent[min(len(recent) - 1, max(0, int(q * len(recent) + 0.5) - 1))] for q in quantiles]
+            result.append((dict(zip(self.labelnames, key)), count, points))
+        return result
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total, _) in self._values.items()]
+        result = []
+        for key, counts, total in values:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                result.append((f'{self.name}_bucket', dict(labels, le=_format_value(bound)), cumulative))
+            result.append((f'{self.name}_sum', labels, total))
+            result.append((f'{self.name}_count', labels, cumulative))
+        return result
+
+class MetricsRegistry:
+    """Conjunto de métricas del proceso, exportables en formato de texto de Prometheus"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS, window: int = 0) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets, window=window)
+
+    def _register(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        # Registrar dos veces el mismo nombre retorna la métrica existente
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"La métrica {name} ya existe con otro tipo")
+            return metric
+
+    def render(self) -> str:
+        """Texto de exposición (versión 0.0.4) de todas las métricas"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                # Una métrica calculada que falla no debe romper el resto de la exportación
+                lines.append(f"# {metric.name}: error al leer el valor ({_escape_help(e)})")
+                continue
+            lines.append(f"# HELP {metric.name} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+# Registro global del bot
+REGISTRY = MetricsRegistry()
+
+EXECUTOR_WAIT = REGISTRY.histogram(
+    'bot_executor_wait_seconds', 'Espera de las tareas bloqueantes hasta obtener un hilo libre', ('task',),
+    window=STATS_WINDOW
+)
+EXECUTOR_RUN = REGISTRY.histogram(
+    'bot_executor_run_seconds', 'Duración de las tareas bloqueantes en el pool de hilos', ('task',),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30), window=STATS_WINDOW
+)
+
+async def run_blocking(task: str, func: Callable[..., Any], *args) -> Any:
+    """Ejecuta 'func' en el pool de hilos del event loop registrando la espera en cola y la duración"""
+    submitted = time.perf_counter()
+
+    def run():
+        started = time.perf_counter()
+        EXECUTOR_WAIT.observe(started - submitted, task=task)
+        try:
+            return func(*args)
+        finally:
+            EXECUTOR_RUN.observe(time.perf_counter() - started, task=task)
+
+    return await asyncio.get_running_loop().run_in_executor(None, run)